@@ -35,6 +35,9 @@ gdown https://drive.google.com/uc?id=1IduG0xl544V_A_jv3tHXC0kyFi7PnyBu; # items_
 gdown https://drive.google.com/uc?id=14Kb5SPBk_jfdLZ_CDBNitW98QLDlKR5O # items_human_ins
 cd ..
 
+# Preprocess the products into the binary catalog the shop loads at startup
+python -m open_apps.apps.onlineshop_app.engine.catalog
+
 # Download spaCy large NLP model
 python -m spacy download en_core_web_lg
 
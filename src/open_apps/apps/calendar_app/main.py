@@ -11,15 +11,19 @@ from fasthtml.common import (
     , Textarea, Select, Option, Label, Script, Link, Style, Table, Thead, Tbody, Tr, Th, Td,
     Ul, Li, Hr, Article, Button, RedirectResponse, Container, MarkdownJS,
     HighlightJS, database, dataclass)
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import calendar
 import os
 import logging
 import yaml, json
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
 from feedgen.feed import FeedGenerator
 from starlette.responses import Response
 from typing import Optional, List
 from src.open_apps.apps.start_page.helper import create_logo_header
+from open_apps.apps.storage import get_database, get_readonly_database, is_memory
+from open_apps.apps.calendar_app.recurrence import RecurrenceIndex
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -201,6 +205,16 @@ app, rt = fast_app(
 )
 
 
+# Recurring-event index and get_events_for_month results (as tuples, so
+# callers get their own list), rebuilt lazily and dropped by
+# invalidate_event_caches() whenever events change
+_recurrence_index = None
+_month_cache = {}
+_cache_generation = 0
+# Serialized RSS feed, see get_rss_feed()
+_rss_cache = None
+
+
 @dataclass
 class Event:
     id: int
@@ -221,12 +235,17 @@ def set_environment(config):
     # Update the styles from config
     styles = Style(generate_styles_from_config(config))
     
-    db = database(config.calendar.database_path)
+    memory = is_memory(config.calendar)
+    db = get_database(config.calendar.database_path, memory=memory)
     # create new events
-    global events
+    global events, events_readonly
     events = db.create(Event, pk="id")
+    events.create_index(["date"], if_not_exists=True)
+    events.create_index(["recurring"], if_not_exists=True)
+    events_readonly = get_readonly_database(config.calendar.database_path, memory=memory).t.event
     # add events from hydra config
     update_db_from_hydra()
+    invalidate_event_caches()
     # init logo title container
     logo_title_container = create_logo_header(
         app_config=config.start_page.apps.calendar,
@@ -276,10 +295,50 @@ def generate_rss_feed():
         fe.title(event.title)
         fe.description(event.description)
         fe.link(href=f"https://example.com/calendar/event/{event.id}")
-        fe.pubDate(datetime.strptime(event.date, "%Y-%m-%d"))
+        # feedgen requires timezone-aware datetimes
+        fe.pubDate(datetime.strptime(event.date, "%Y-%m-%d").replace(tzinfo=timezone.utc))
 
     return fg.rss_str(pretty=True)
 
+
+def get_rss_feed():
+    """Return the serialized feed with its ETag and Last-Modified headers.
+
+    The feed only depends on the events and today's date, so it is kept
+    until an event changes (invalidate_event_caches) or the date rolls over.
+    """
+    global _rss_cache
+    cached = _rss_cache
+    today = datetime.now().date()
+    if cached is None or cached["date"] != today:
+        generation = _cache_generation
+        body = generate_rss_feed()
+        cached = {
+            "date": today,
+            "body": body,
+            "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+            "last_modified": formatdate(usegmt=True),
+        }
+        if generation == _cache_generation:
+            _rss_cache = cached
+    return cached
+
+
+def is_not_modified(req, feed):
+    """Whether a conditional GET can be answered with 304 Not Modified"""
+    if_none_match = req.headers.get("if-none-match")
+    if if_none_match is not None:
+        etags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in etags or feed["etag"] in etags
+    if_modified_since = req.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+            return since >= parsedate_to_datetime(feed["last_modified"])
+        except (TypeError, ValueError):
+            return False
+    return False
+
 def create_footer(hide_add_button=False):
     # Add event button
     add_button = (
@@ -310,93 +369,42 @@ def get_all_locations():
     return list(set(event.location for event in events()))
 
 
+def get_recurrence_index():
+    global _recurrence_index
+    index = _recurrence_index
+    if index is None:
+        generation = _cache_generation
+        index = RecurrenceIndex(events("recurring IS NOT NULL AND recurring != ''"))
+        if generation == _cache_generation:
+            _recurrence_index = index
+    return index
+
+
+def invalidate_event_caches():
+    """Drop the recurrence index and per-month results after events change"""
+    global _recurrence_index, _cache_generation, _rss_cache
+    _cache_generation += 1
+    _recurrence_index = None
+    _month_cache.clear()
+    _rss_cache = None
+
+
 def get_events_for_month(year, month):
+    cached = _month_cache.get((year, month))
+    if cached is not None:
+        return list(cached)
+    generation = _cache_generation
+
     # First, get events that directly fall in this month
     start_date = f"{year}-{month:02d}-01"
     end_date = f"{year}-{month:02d}-31"
-    direct_month_events = events(f"date >= '{start_date}' AND date <= '{end_date}'")
-    
-    # Create a list to hold all events including recurring ones
-    all_month_events = list(direct_month_events)
-    
-    # Now handle recurring events
-    all_events = events()
-    month_days = calendar.monthrange(year, month)[1]  # Get number of days in month
-    
-    for event in all_events:
-        if not event.recurring:
-            continue
-            
-        # Parse the original event date
-        event_date = datetime.strptime(event.date, "%Y-%m-%d").date()
-        
-        # If the original event is in this month, it's already included
-        if event_date.year == year and event_date.month == month:
-            continue
-            
-        # Handle different recurrence types
-        if event.recurring == "yearly":
-            # Only include if the month and day match
-            if event_date.month == month:
-                # Create a new event instance for this year
-                recurring_date = f"{year}-{event_date.month:02d}-{event_date.day:02d}"
-                
-                # Skip if the recurring date is invalid (e.g., Feb 29 in non-leap years)
-                try:
-                    datetime.strptime(recurring_date, "%Y-%m-%d")
-                    recurring_event = Event(
-                        id=event.id,  # Keep same ID as original
-                        title=event.title,
-                        date=recurring_date,
-                        description=event.description,
-                        url=event.url,
-                        location=event.location,
-                        invitees=event.invitees,
-                        recurring=event.recurring
-                    )
-                    all_month_events.append(recurring_event)
-                except ValueError:
-                    pass
-                
-        elif event.recurring == "monthly":
-            # Include if the day of month is valid for this month
-            if event_date.day <= month_days:
-                recurring_date = f"{year}-{month:02d}-{event_date.day:02d}"
-                recurring_event = Event(
-                    id=event.id,
-                    title=event.title,
-                    date=recurring_date,
-                    description=event.description,
-                    url=event.url,
-                    location=event.location,
-                    invitees=event.invitees,
-                    recurring=event.recurring
-                )
-                all_month_events.append(recurring_event)
-                
-        elif event.recurring == "weekly":
-            # Get the weekday of the original event
-            event_weekday = event_date.weekday()
-            
-            # Check each day in this month
-            for day in range(1, month_days + 1):
-                check_date = datetime(year, month, day).date()
-                
-                # If it's the same weekday, add a recurring instance
-                if check_date.weekday() == event_weekday:
-                    recurring_date = f"{year}-{month:02d}-{day:02d}"
-                    recurring_event = Event(
-                        id=event.id,
-                        title=event.title,
-                        date=recurring_date,
-                        description=event.description,
-                        url=event.url,
-                        location=event.location,
-                        invitees=event.invitees,
-                        recurring=event.recurring
-                    )
-                    all_month_events.append(recurring_event)
-    
+    all_month_events = events("date >= ? AND date <= ?", [start_date, end_date])
+    # Then add the instances of recurring events from other months
+    all_month_events += get_recurrence_index().events_for_month(year, month)
+
+    # Don't cache a result computed while events were being changed
+    if generation == _cache_generation:
+        _month_cache[(year, month)] = tuple(all_month_events)
     return all_month_events
 
 
@@ -407,63 +415,10 @@ def get_upcoming_events(start_date=None, end_date=None):
         end_date = start_date + timedelta(days=30)
 
     # Get direct events in the date range
-    direct_events = events(f"date >= '{start_date}' AND date <= '{end_date}'")
-    
-    # Create a list to hold all events including recurring ones
-    all_events = list(direct_events)
-    
-    # Now handle recurring events
-    all_stored_events = events()
-    
-    for event in all_stored_events:
-        if not event.recurring:
-            continue
-            
-        # Parse the original event date
-        event_date = datetime.strptime(event.date, "%Y-%m-%d").date()
-        
-        # Get the date range to check
-        current_date = start_date
-        while current_date <= end_date:
-            include_event = False
-            recurring_date = None
-            
-            if event.recurring == "yearly" and event_date.month == current_date.month and event_date.day == current_date.day:
-                # Yearly recurring event matching the month and day
-                include_event = True
-                recurring_date = f"{current_date.year}-{current_date.month:02d}-{current_date.day:02d}"
-                
-            elif event.recurring == "monthly" and event_date.day == current_date.day:
-                # Monthly recurring event matching the day of month
-                include_event = True
-                recurring_date = f"{current_date.year}-{current_date.month:02d}-{current_date.day:02d}"
-                
-            elif event.recurring == "weekly" and event_date.weekday() == current_date.weekday():
-                # Weekly recurring event matching the weekday
-                include_event = True
-                recurring_date = f"{current_date.year}-{current_date.month:02d}-{current_date.day:02d}"
-            
-            if include_event and recurring_date:
-                # Skip the original event date if it's already in the direct events
-                if event_date == current_date:
-                    current_date += timedelta(days=1)
-                    continue
-                
-                # Create a recurring instance
-                recurring_event = Event(
-                    id=event.id,
-                    title=event.title,
-                    date=recurring_date,
-                    description=event.description,
-                    url=event.url,
-                    location=event.location,
-                    invitees=event.invitees,
-                    recurring=event.recurring
-                )
-                all_events.append(recurring_event)
-            
-            current_date += timedelta(days=1)
-    
+    all_events = events("date >= ? AND date <= ?", [str(start_date), str(end_date)])
+    # Add the instances of recurring events in the range
+    all_events += get_recurrence_index().events_between(start_date, end_date)
+
     return sorted(all_events, key=lambda e: e.date)  # Sort events by date
 
 
@@ -600,9 +555,12 @@ def get(req):
 
 
 @rt("/calendar/rss")
-def get():
-    rss_feed = generate_rss_feed()
-    return Response(content=rss_feed, media_type="application/rss+xml")
+def get(req):
+    feed = get_rss_feed()
+    headers = {"ETag": feed["etag"], "Last-Modified": feed["last_modified"]}
+    if is_not_modified(req, feed):
+        return Response(status_code=304, headers=headers)
+    return Response(content=feed["body"], media_type="application/rss+xml", headers=headers)
 
 
 
@@ -728,6 +686,7 @@ async def delete_event(id: int):
         # Delete from database
         event = events[id]
         events.delete(id)
+        invalidate_event_caches()
         logger.info(f"Successfully deleted event: {event.title} on {event.date}")
         return RedirectResponse(url="/calendar", status_code=303)
 
@@ -852,6 +811,7 @@ async def save_text(request):  # Add async here
 
         # Save the event to the database
         events.insert(event)
+        invalidate_event_caches()
 
         # Redirect to calendar view
         return RedirectResponse(url="/calendar", status_code=303)
@@ -866,7 +826,7 @@ def get_calendar_routes():
 @app.get("/calendar_all")
 def get_all():
     """Used for rewards"""
-    event_list: List[dict] = [event.__dict__ for event in events()]
+    event_list: List[dict] = events_readonly()
     return Response(json.dumps(event_list), headers={"Content-Type": "application/json"})
 
 if __name__ == "__main__":
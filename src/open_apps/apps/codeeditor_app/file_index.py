@@ -0,0 +1,268 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+
+In-memory index of the code editor's file tree.
+
+The editor used to walk its directory and read every file on each page
+render (the sidebar) and reward probe. ``FileTreeIndex``
+walks the directory once (names, sizes and mtimes only) and is then
+kept in sync by the create_folder/save/rename/delete routes. File
+contents are read lazily on first use and cached, so rendering the
+sidebar does no file I/O at all. Manifests hash files in chunks without
+keeping their contents; only the SHA-1 digests are cached, by path and
+(mtime_ns, size), and they survive rebuilds.
+
+Every update bumps ``generation`` and stamps the files it touched, and
+deleted paths are remembered with the generation they went away in, so
+``changes_since`` can report just what changed after a given point.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Union
+
+
+__all__ = ["FileNode", "FolderNode", "FileTreeIndex"]
+
+
+# Bytes read at a time when hashing a file
+HASH_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class FileNode:
+    name: str
+    path: str  # relative to the editor root
+    size: int
+    mtime: float
+    mtime_ns: int = 0
+    content: Optional[str] = None  # loaded lazily
+    generation: int = 0  # index generation the file last changed in
+
+
+@dataclass
+class FolderNode:
+    name: str
+    children: Dict[str, Union["FolderNode", FileNode]] = field(default_factory=dict)
+
+
+class FileTreeIndex:
+    """Mirror of the directory tree under ``root``."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.RLock()
+        self.generation = 0
+        self._deleted: Dict[str, int] = {}
+        # path -> (mtime_ns, size, SHA-1) of the file when it was hashed
+        self._digests: Dict[str, tuple] = {}
+        self._tree = FolderNode(name=os.path.basename(root))
+        self.rebuild()
+
+    def rebuild(self, root: Optional[str] = None) -> None:
+        """Re-read the whole tree from disk (names and stats only).
+
+        The generation keeps counting up, so a ``changes_since`` query
+        from before the rebuild (e.g. across an app reset) still sees
+        every file as changed or deleted.
+        """
+        with self._lock:
+            old_paths = [node.path for node in self.files()]
+            self.generation += 1
+            if root is not None:
+                self.root = root
+            self._tree = self._scan(self.root)
+            for path in old_paths:
+                self._deleted[path] = self.generation
+
+    def _scan(self, path: str) -> FolderNode:
+        folder = FolderNode(name=os.path.basename(path))
+        try:
+            for item in sorted(os.listdir(path)):
+                item_path = os.path.join(path, item)
+                if os.path.isdir(item_path):
+                    folder.children[item] = self._scan(item_path)
+                else:
+                    folder.children[item] = self._file_node(item_path)
+        except OSError:
+            pass
+        return folder
+
+    def _file_node(self, full_path: str) -> FileNode:
+        stat = os.stat(full_path)
+        return FileNode(
+            name=os.path.basename(full_path),
+            path=os.path.relpath(full_path, self.root),
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            mtime_ns=stat.st_mtime_ns,
+            generation=self.generation,
+        )
+
+    def _parts(self, path: str) -> list:
+        rel = os.path.relpath(os.path.join(self.root, path), self.root)
+        return [] if rel == "." else rel.split(os.sep)
+
+    def _folder(self, parts: list, create: bool = False) -> Optional[FolderNode]:
+        folder = self._tree
+        for part in parts:
+            child = folder.children.get(part)
+            if child is None and create:
+                child = folder.children[part] = FolderNode(name=part)
+            if not isinstance(child, FolderNode):
+                return None
+            folder = child
+        return folder
+
+    def get(self, path: str) -> Optional[Union[FolderNode, FileNode]]:
+        """The node at ``path`` (relative to the root), or None."""
+        parts = self._parts(path)
+        with self._lock:
+            if not parts:
+                return self._tree
+            parent = self._folder(parts[:-1])
+            return parent.children.get(parts[-1]) if parent else None
+
+    def content(self, node: FileNode) -> str:
+        """A file's content, read from disk on first access."""
+        with self._lock:
+            if node.content is None:
+                with open(os.path.join(self.root, node.path)) as f:
+                    node.content = f.read()
+            return node.content
+
+    def file_hash(self, node: FileNode) -> str:
+        """SHA-1 of a file's bytes, hashed once per (mtime_ns, size)."""
+        key = (node.mtime_ns, node.size)
+        with self._lock:
+            cached = self._digests.get(node.path)
+            if cached is not None and cached[:2] == key:
+                return cached[2]
+        digest = hashlib.sha1()
+        with open(os.path.join(self.root, node.path), "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._digests[node.path] = key + (digest.hexdigest(),)
+        return digest.hexdigest()
+
+    def files(self, folder: Optional[FolderNode] = None):
+        """All file nodes (under ``folder``, default the root), in path order."""
+        with self._lock:
+            stack = [folder or self._tree]
+            found = []
+            while stack:
+                folder = stack.pop()
+                for child in folder.children.values():
+                    if isinstance(child, FolderNode):
+                        stack.append(child)
+                    else:
+                        found.append(child)
+            return sorted(found, key=lambda node: node.path)
+
+    def describe(self, node: FileNode) -> dict:
+        """Manifest entry for a file: path, size, mtime and content hash."""
+        return {
+            "path": node.path,
+            "size": node.size,
+            "mtime": node.mtime,
+            "hash": self.file_hash(node),
+        }
+
+    def tree(self, with_content: bool = True, manifest: bool = False) -> dict:
+        """The tree in the ``get_file_tree`` format (children sorted by name).
+
+        With ``manifest=True`` files carry size, mtime and hash instead of
+        their content.
+        """
+        with self._lock:
+            return self._to_dict(self._tree, with_content, manifest)
+
+    def _to_dict(self, folder: FolderNode, with_content: bool, manifest: bool) -> dict:
+        children = []
+        for name in sorted(folder.children):
+            child = folder.children[name]
+            if isinstance(child, FolderNode):
+                children.append(self._to_dict(child, with_content, manifest))
+            else:
+                item = {"type": "file", "name": child.name, "path": child.path}
+                if manifest:
+                    item.update(self.describe(child))
+                elif with_content:
+                    item["content"] = self.content(child)
+                children.append(item)
+        return {"type": "folder", "name": folder.name, "children": children}
+
+    def changes_since(self, generation: int) -> dict:
+        """Files changed and paths deleted after ``generation``."""
+        with self._lock:
+            changed = [
+                self.describe(node)
+                for node in self.files()
+                if node.generation > generation
+            ]
+            deleted = sorted(
+                path
+                for path, deleted_in in self._deleted.items()
+                if deleted_in > generation and self.get(path) is None
+            )
+            return {
+                "generation": self.generation,
+                "changed": changed,
+                "deleted": deleted,
+            }
+
+    # Updates, called by the routes after they changed the filesystem
+
+    def add_folder(self, path: str) -> None:
+        with self._lock:
+            self.generation += 1
+            self._folder(self._parts(path), create=True)
+
+    def write_file(self, path: str, content: str) -> None:
+        parts = self._parts(path)
+        with self._lock:
+            self.generation += 1
+            parent = self._folder(parts[:-1], create=True)
+            node = self._file_node(os.path.join(self.root, *parts))
+            node.content = content
+            parent.children[parts[-1]] = node
+
+    def move(self, old_path: str, new_path: str) -> None:
+        new_parts = self._parts(new_path)
+        with self._lock:
+            old_node = self.get(old_path)
+            self.remove(old_path)  # bumps the generation
+            parent = self._folder(new_parts[:-1], create=True)
+            full_path = os.path.join(self.root, *new_parts)
+            if os.path.isdir(full_path):
+                # every path below a moved folder changes, so rescan it
+                node = self._scan(full_path)
+            else:
+                node = self._file_node(full_path)
+                if isinstance(old_node, FileNode):
+                    node.content = old_node.content
+                    if old_node.path in self._digests:
+                        self._digests[node.path] = self._digests[old_node.path]
+            parent.children[new_parts[-1]] = node
+
+    def remove(self, path: str) -> None:
+        parts = self._parts(path)
+        with self._lock:
+            self.generation += 1
+            parent = self._folder(parts[:-1])
+            node = parent.children.pop(parts[-1], None) if parent is not None else None
+            if isinstance(node, FolderNode):
+                removed = self.files(node)
+            else:
+                removed = [node] if node is not None else []
+            for file_node in removed:
+                self._deleted[file_node.path] = self.generation
+                self._digests.pop(file_node.path, None)
@@ -11,6 +11,9 @@ from typing import Dict
 import json
 from starlette.responses import Response
 from src.open_apps.apps.start_page.helper import create_logo_header
+from open_apps.apps.storage import filesystem_root, is_memory
+from open_apps.apps.codeeditor_app.file_index import FileNode, FileTreeIndex
+from open_apps.apps.codeeditor_app.workspace import detach, seed_workspace
 
 # Global variables
 _base_hdrs_no_highlight = (
@@ -30,6 +33,8 @@ current_dir = None
 list_of_modes, list_of_themes = [], []
 _base_hdrs = _base_hdrs_no_highlight
 opened_files = {}
+# In-memory mirror of the file tree under current_dir, see file_index.py
+file_index = None
 logo_title_container = None
 
 # Initialize app with default headers
@@ -61,18 +66,28 @@ def create_file_system(base_path, file_system):
             print(f"Invalid type: {item['type']}")
 
 
+def load_file_index(root):
+    """(Re)build the file tree index for the directory at `root`"""
+    if file_index is None:
+        return FileTreeIndex(root)
+    file_index.rebuild(root)
+    return file_index
+
+
 def update_db_from_hydra(config):
     file_system = config.code_editor.filesystem
-    create_file_system(current_dir, file_system)
+    # links in a cached copy of the tree, see workspace.py
+    seed_workspace(current_dir, file_system, create_file_system)
 
 def set_environment(config):
     """Set environment variables for the code editor app"""
     # Create styles with environment variables
-    global app, _base_hdrs, list_of_modes, list_of_themes, current_dir, logo_title_container
+    global app, _base_hdrs, list_of_modes, list_of_themes, current_dir, logo_title_container, file_index
     if getattr(config.code_editor, 'no_css', False):
         app.hdrs = ()
         app.config = config
-        current_dir = config.code_editor.database_path + '/'
+        current_dir = filesystem_root(config.code_editor.database_path, is_memory(config.code_editor)) + '/'
+        file_index = load_file_index(current_dir)
         logo_title_container = create_logo_header(
             app_config=config.start_page.apps.codeeditor,
             base_url="/codeeditor",
@@ -81,14 +96,16 @@ def set_environment(config):
         return
     list_of_modes = config.code_editor.list_of_modes
     list_of_themes = config.code_editor.list_of_themes
-    current_dir = config.code_editor.database_path + '/'
+    current_dir = filesystem_root(config.code_editor.database_path, is_memory(config.code_editor)) + '/'
     if os.path.exists(current_dir):
         # alert the user
         print("- Code editor folder already exists. This is undesired!!! Please double check.")
         print("######## ########")
+        file_index = load_file_index(current_dir)
         return
     os.makedirs(current_dir, exist_ok=True)
     update_db_from_hydra(config)
+    file_index = load_file_index(current_dir)
     print(f"- Code editor filesystem created under {current_dir}")
     _base_hdrs_with_highlight = (
         picolink,
@@ -201,34 +218,10 @@ def newfile_index(current_path):
         i += 1
     return i
 
-def get_file_tree(path: str) -> Dict:
-    """Recursively build a file tree structure"""
-    # base_path = os.path.join(current_dir, "files")
-    base_path = current_dir
-    tree = {'type': 'folder', 'name': os.path.basename(path), 'children': []}
-    try:
-        for item in sorted(os.listdir(path)):
-            item_path = os.path.join(path, item)
-            if os.path.isdir(item_path):
-                tree['children'].append(get_file_tree(item_path))
-            else:
-                # Remove the 'files/' prefix from the path
-                relative_path = os.path.relpath(item_path, base_path)
-                tree['children'].append({
-                    'type': 'file',
-                    'name': item,
-                    'path': relative_path,
-                    'content': open(item_path).read()
-                })
-    except OSError:
-        pass
-    return tree
-
 def create_sidebar(current_path: str = None) -> Div:
     """Create the sidebar with file tree"""
     # files_root = os.path.join(current_dir, "files")
-    files_root = current_dir
-    file_tree = get_file_tree(files_root)
+    file_tree = file_index.tree(with_content=False)
 
     def render_tree_item(item, path=''):
         if item['type'] == 'file':
@@ -410,9 +403,6 @@ def create_sidebar(current_path: str = None) -> Div:
 @app.get("/codeeditor/")
 def index():
     side_bar = create_sidebar()
-    # files_root = f"{current_dir}/files/"
-    files_root = current_dir
-    file_tree = get_file_tree(files_root)
     # by default, the main screen should display an empty code editor
     main_screen = Div(cls="w-5/6")(
         Div(cls="main-content p-4 rounded-lg styled-content")(
@@ -623,18 +613,12 @@ def get_folder(folder: str):
     return Div(logo_title_container, page)
 
 def get_file(file: str):
-    side_bar = create_sidebar(file)
     # read the content of the file and display it in the editor
+    node = file_index.get(file)
     try:
-        # file_path = os.path.join(current_dir, "files", file)
-        file_path = os.path.join(current_dir, file)
-        with open(file_path, "r") as f:
-            content = f.read()
+        content = file_index.content(node) if isinstance(node, FileNode) else ""
     except FileNotFoundError:
         content = ""
-    # files_root = f"{current_dir}/files/"
-    files_root = current_dir
-    file_tree = get_file_tree(files_root)
     # same layout and sidebar as the main screen
     side_bar = create_sidebar(file)
     tab_bar = Div(cls="flex overflow-x-auto bg-gray-800 border-b border-gray-700")(
@@ -960,6 +944,7 @@ def create_folder(folder: str):
             return {"success": False, "error": "Name already occupied."}
 
         os.makedirs(folder_path, exist_ok=True)
+        file_index.add_folder(folder)
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -974,8 +959,11 @@ def save_file(file: str, content: dict):
             return {"success": False, "error": "Invalid file path."}
         # check if the parent directory exists: if not, create it
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # don't write through a link shared with the seed template
+        detach(file_path)
         with open(file_path, "w") as f:
             f.write(content["content"])
+        file_index.write_file(file, content["content"])
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -997,6 +985,7 @@ def rename_file(old_file: str, new_file: str):
             return {"success": False, "error": "File already exists."}
         os.makedirs(os.path.dirname(new_path), exist_ok=True)
         shutil.move(old_path, new_path)
+        file_index.move(old_file, new_file)
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -1017,6 +1006,7 @@ def delete_file(file: str):
             os.remove(path)
         else:
             return {"success": False, "error": "File not found. Are you trying to delete an unsaved file?"}
+        file_index.remove(file)
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -1034,16 +1024,38 @@ async def update_config(request):
         return {"success": False, "error": str(e)}
 
 @app.get("/codeeditor_all")
-def get_all():
-    """Used for rewards"""
+def get_all(mode: str = None, since: int = None):
+    """Used for rewards.
+
+    By default the whole file tree with contents. `mode=manifest` returns
+    the tree with size, mtime and content hash per file instead, and
+    `since=<generation>` only the files changed/deleted after that
+    generation. Contents of chosen files come from /codeeditor_contents.
+    """
+    if since is not None:
+        return Response(content=json.dumps(file_index.changes_since(since)),
+                        headers={"Content-Type": "application/json"})
+    if mode == "manifest":
+        manifest = file_index.tree(manifest=True)
+        manifest["generation"] = file_index.generation
+        return Response(content=json.dumps(manifest), headers={"Content-Type": "application/json"})
     # return the file tree of the code editor
-    files_root = current_dir
-    file_tree = get_file_tree(files_root)
+    file_tree = file_index.tree()
     # convert the file tree to a JSON object
     file_tree_json = json.dumps(file_tree, indent=4)
     # return the file tree as a JSON object
     return Response(content=file_tree_json, headers={"Content-Type": "application/json"})
 
+
+@app.get("/codeeditor_contents")
+def get_contents(req):
+    """Contents of the files given as `path` query parameters (null if missing)"""
+    contents = {}
+    for path in req.query_params.getlist("path"):
+        node = file_index.get(path)
+        contents[path] = file_index.content(node) if isinstance(node, FileNode) else None
+    return Response(content=json.dumps(contents), headers={"Content-Type": "application/json"})
+
 def get_codeeditor_routes():
     return app.routes
 
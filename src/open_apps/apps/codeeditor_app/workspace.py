@@ -0,0 +1,147 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+
+Copy-on-write seeding of the code editor workspace.
+
+Seeding used to write the configured ``filesystem`` tree file by file on
+every reset. Instead, each distinct ``filesystem`` config is materialized
+once into a template directory, next to the workspace so both are on the
+same filesystem, and reused on later resets:
+
+  - ``seed_workspace`` hardlinks the template's files into the
+    workspace, which costs one link per file no matter how big the files
+    are. If linking isn't possible (e.g. no hardlink support) it falls
+    back to copying.
+  - workspace files stay writable. The save route calls ``detach`` to
+    replace a linked file with a private one before writing it, but
+    anything else may still write through a link. So the template
+    records the (mtime_ns, size) of each of its files when it is built,
+    and a template whose files no longer match is rebuilt before it is
+    linked again.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Callable
+
+from omegaconf import OmegaConf
+
+
+__all__ = ["template_dir_for", "seed_workspace", "detach"]
+
+
+TEMPLATES_DIRNAME = ".codeeditor_templates"
+
+
+def template_dir_for(workspace: str, file_system) -> str:
+    """Cache path of the template for ``file_system`` (keyed by its content)."""
+    if OmegaConf.is_config(file_system):
+        file_system = OmegaConf.to_container(file_system, resolve=True)
+    digest = hashlib.sha1(
+        json.dumps(file_system, sort_keys=True).encode()
+    ).hexdigest()[:16]
+    parent = os.path.dirname(os.path.normpath(workspace))
+    return os.path.join(parent, TEMPLATES_DIRNAME, digest)
+
+
+def _stamps(template: str) -> dict:
+    """Relative path -> [mtime_ns, size] of every file under ``template``."""
+    stamps = {}
+    for dirpath, _, filenames in os.walk(template):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            stat = os.stat(path)
+            stamps[os.path.relpath(path, template)] = [stat.st_mtime_ns, stat.st_size]
+    return stamps
+
+
+def _is_intact(template: str) -> bool:
+    """Whether ``template`` exists and no file in it was written since it was built."""
+    try:
+        with open(f"{template}.json") as f:
+            return json.load(f) == _stamps(template)
+    except (OSError, ValueError):
+        return False
+
+
+def _materialize(template: str, file_system, create: Callable) -> None:
+    # Build next to the final path and rename into place, so a template
+    # is either complete or absent, even with concurrent resets. The
+    # stamps are written last: a template without them is rebuilt.
+    staging = f"{template}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    create(staging, file_system)
+    stamps = _stamps(staging)
+    if os.path.isdir(template):
+        # set aside rather than delete in place, links already made stay valid
+        stale = f"{template}.stale-{os.getpid()}"
+        try:
+            os.rename(template, stale)
+        except OSError:
+            pass
+        shutil.rmtree(stale, ignore_errors=True)
+    try:
+        os.rename(staging, template)
+    except OSError:
+        # someone else finished first
+        shutil.rmtree(staging, ignore_errors=True)
+        return
+    with open(f"{staging}.json", "w") as f:
+        json.dump(stamps, f)
+    os.replace(f"{staging}.json", f"{template}.json")
+
+
+def seed_workspace(workspace: str, file_system, create: Callable) -> None:
+    """Populate ``workspace`` with the ``file_system`` tree.
+
+    Args:
+        workspace: Directory to seed (created if missing).
+        file_system: The code editor's ``filesystem`` config.
+        create: ``create(base_path, file_system)`` writing the tree, used
+            to build the template the first time.
+    """
+    os.makedirs(workspace, exist_ok=True)
+    if file_system is None:
+        return
+    template = template_dir_for(workspace, file_system)
+    if not _is_intact(template):
+        os.makedirs(os.path.dirname(template), exist_ok=True)
+        _materialize(template, file_system, create)
+
+    link = os.link
+    for dirpath, dirnames, filenames in os.walk(template):
+        target_dir = os.path.join(workspace, os.path.relpath(dirpath, template))
+        for name in dirnames:
+            os.makedirs(os.path.join(target_dir, name), exist_ok=True)
+        for name in filenames:
+            source, target = os.path.join(dirpath, name), os.path.join(target_dir, name)
+            try:
+                link(source, target)
+            except OSError:
+                link = _copy
+                _copy(source, target)
+
+
+def _copy(source: str, target: str) -> None:
+    shutil.copyfile(source, target)
+
+
+def detach(path: str) -> None:
+    """Make ``path`` a private file before it is written (copy-on-write).
+
+    A file still hardlinked to the template is unlinked; the caller then
+    writes a fresh file in its place, and the template stays intact.
+    """
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,250 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+
+Offline geocoding for ``/maps/where``.
+
+The endpoint used to call nominatim.openstreetmap.org, blocking the
+event loop for the length of the request and failing outright without
+internet access. ``Gazetteer`` instead searches a bundled list of places
+(``data/gazetteer.json``, plus the configured saved places):
+
+  - names are normalized (case and accents folded), and a sorted key
+    list answers prefix queries with a binary search, both for the
+    whole name and from the start of any word in it;
+  - a trigram index finds misspelled names, ranked by trigram overlap.
+
+``Geocoder`` puts an LRU cache and an async interface on top. A remote
+Nominatim-compatible service can be configured as a fallback for
+queries the gazetteer has no match for; it is called in a worker
+thread, so other requests keep being served meanwhile.
+
+Results use Nominatim's JSON shape (``osm_id``, ``display_name``, and
+``lat`` and ``lon`` as strings). The map page itself still searches
+Nominatim from the browser.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+
+__all__ = ["Place", "Gazetteer", "NominatimClient", "Geocoder", "load_gazetteer"]
+
+
+BUNDLED_GAZETTEER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.json"
+)
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    lat: float
+    lon: float
+    type: str = "place"
+    context: str = ""  # e.g. "Manhattan, New York, United States"
+    osm_id: Optional[int] = None  # only known for remote results
+
+    @property
+    def display_name(self) -> str:
+        return f"{self.name}, {self.context}" if self.context else self.name
+
+    def to_json(self) -> dict:
+        return {
+            "osm_id": self.osm_id,
+            "name": self.name,
+            "display_name": self.display_name,
+            "lat": str(self.lat),
+            "lon": str(self.lon),
+            "type": self.type,
+        }
+
+
+def normalize(text: str) -> str:
+    """Case- and accent-folded text with punctuation collapsed to spaces."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _distance_km(lat1, lon1, lat2, lon2) -> float:
+    # equirectangular approximation, plenty to spot duplicate places
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371.0 * math.hypot(x, y)
+
+
+class Gazetteer:
+    """Name index over a list of places."""
+
+    def __init__(self, places: Iterable[Place]):
+        self.places: List[Place] = []
+        self._keys: List[tuple] = []  # (normalized key, place index, from word start)
+        self._trigram_index: Dict[str, List[int]] = defaultdict(list)
+        self._trigram_counts: List[int] = []
+        seen = defaultdict(list)  # key -> places, to drop duplicates
+        for place in places:
+            key = normalize(place.name)
+            if not key or any(
+                _distance_km(place.lat, place.lon, other.lat, other.lon) < 1.0
+                for other in seen[key]
+            ):
+                continue
+            seen[key].append(place)
+            index = len(self.places)
+            self.places.append(place)
+            grams = _trigrams(key)
+            self._trigram_counts.append(len(grams))
+            words = key.split(" ")
+            for i in range(len(words)):
+                self._keys.append((" ".join(words[i:]), index, i > 0))
+            for gram in grams:
+                self._trigram_index[gram].append(index)
+        self._keys.sort()
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def search(self, query: str, limit: int = 10) -> List[Place]:
+        """Best matches for ``query``: exact, then prefix, then fuzzy."""
+        query = normalize(query)
+        if not query:
+            return []
+        scores: Dict[int, float] = {}
+
+        start = bisect.bisect_left(self._keys, (query,))
+        for key, index, from_word in self._keys[start:]:
+            if not key.startswith(query):
+                break
+            if key == query and not from_word:
+                score = 3.0
+            else:
+                # whole-name prefix beats a match further into the name;
+                # shorter names (closer to the query) rank higher
+                score = (1.5 if from_word else 2.0) + len(query) / len(key) / 2
+            scores[index] = max(scores.get(index, 0.0), score)
+
+        if len(scores) < limit:
+            grams = _trigrams(query)
+            overlap: Dict[int, int] = defaultdict(int)
+            for gram in grams:
+                for index in self._trigram_index.get(gram, ()):
+                    overlap[index] += 1
+            for index, shared in overlap.items():
+                # Dice coefficient of the two trigram sets
+                similarity = 2 * shared / (len(grams) + self._trigram_counts[index])
+                if similarity >= 0.4 and index not in scores:
+                    scores[index] = similarity
+
+        ranked = sorted(scores, key=lambda index: (-scores[index], index))
+        return [self.places[index] for index in ranked[:limit]]
+
+
+def load_gazetteer(path: Optional[str] = None, extra: Iterable[dict] = ()) -> Gazetteer:
+    """Gazetteer from a JSON list of ``{name, lat, lon[, type, context]}``.
+
+    Args:
+        path: Gazetteer file, default the bundled one.
+        extra: More places as ``{name, lat, lng}`` dicts, e.g. the
+            configured ``saved_places``.
+    """
+    with open(path or BUNDLED_GAZETTEER, encoding="utf-8") as f:
+        entries = json.load(f)
+    places = [
+        Place(
+            name=entry["name"],
+            lat=float(entry["lat"]),
+            lon=float(entry["lon"]),
+            type=entry.get("type", "place"),
+            context=entry.get("context", ""),
+        )
+        for entry in entries
+    ]
+    places.extend(
+        Place(name=item["name"], lat=float(item["lat"]), lon=float(item["lng"]))
+        for item in extra
+    )
+    return Gazetteer(places)
+
+
+class NominatimClient:
+    """Blocking client for a Nominatim-compatible search API."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "open-apps-maps"
+
+    def search(self, query: str, limit: int) -> List[Place]:
+        response = self.session.get(
+            f"{self.url}/search",
+            params={"q": query, "format": "json", "limit": limit},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return [
+            Place(
+                name=item.get("name") or item["display_name"].split(",")[0],
+                lat=float(item["lat"]),
+                lon=float(item["lon"]),
+                type=item.get("type", "place"),
+                context=item["display_name"].split(",", 1)[1].strip()
+                if "," in item["display_name"]
+                else "",
+                osm_id=item.get("osm_id"),
+            )
+            for item in response.json()
+        ]
+
+
+class Geocoder:
+    """Cached async place search: the gazetteer, then the optional remote."""
+
+    def __init__(
+        self,
+        gazetteer: Gazetteer,
+        remote: Optional[NominatimClient] = None,
+        cache_size: int = 1024,
+    ):
+        self.gazetteer = gazetteer
+        self.remote = remote
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+
+    async def search(self, query: str, limit: int = 10) -> List[Place]:
+        key = (normalize(query), limit)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        results = self.gazetteer.search(query, limit)
+        if not results and self.remote is not None:
+            try:
+                results = await asyncio.to_thread(self.remote.search, query, limit)
+            except requests.exceptions.RequestException:
+                return []  # not cached, the remote may come back
+
+        self._cache[key] = results
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return results
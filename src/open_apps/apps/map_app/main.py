@@ -17,6 +17,12 @@ import json
 from datetime import datetime, timezone
 import subprocess
 import time
+from typing import Optional
+from open_apps.apps.storage import get_database, get_readonly_database, is_memory
+from open_apps.apps.map_app.spatial import LandmarkGrid, cluster, parse_bbox, serialize_landmark
+from open_apps.apps.map_app.geocoder import Geocoder, NominatimClient, load_gazetteer
+from open_apps.apps.map_app.routing import LocalRouter, load_transit_network
+import asyncio
 
 
 @dataclass
@@ -32,6 +38,11 @@ class Landmark:
 current_dir = os.path.dirname(os.path.abspath(__file__))
 app = FastAPI()
 landmarks = None
+landmarks_readonly = None
+landmark_grid = LandmarkGrid()
+geocoder = None
+router = None
+otp_session = requests.Session()  # reused across /maps/route calls to OTP
 otp_process = None # Added: To store the OTP process
 OTP_SERVER_DIR = current_dir
 OTP_JAR_NAME = "otp-2.6.0-shaded.jar"
@@ -64,17 +75,32 @@ def stop_otp_server(): # Added
         otp_process = None
 
 def set_environment(config):
-    global app, landmarks, otp_process, OTP_STARTUP_COMMAND_LIST, OTP_SERVER_DIR
+    global app, landmarks, landmarks_readonly, landmark_grid, geocoder, router, otp_process, OTP_STARTUP_COMMAND_LIST, OTP_SERVER_DIR
     app.config = config
-    db = database(config.maps.database_path)
+    memory = is_memory(config.maps)
+    db = get_database(config.maps.database_path, memory=memory)
     landmarks = db.create(Landmark, pk="name")
+    landmarks_readonly = get_readonly_database(config.maps.database_path, memory=memory).t.landmark
     # populate landmarks from config
     for landmark in config.maps.saved_places:
         landmarks.insert(Landmark(**landmark))
+    landmark_grid = LandmarkGrid(landmarks_readonly())
+    fallback_url = getattr(config.maps, "geocoder_fallback_url", None)
+    geocoder = Geocoder(
+        load_gazetteer(
+            getattr(config.maps, "gazetteer_path", None), config.maps.saved_places
+        ),
+        remote=NominatimClient(fallback_url) if fallback_url else None,
+    )
+
+    if routing_backend() == "local":
+        router = LocalRouter(
+            load_transit_network(getattr(config.maps, "transit_network_path", None))
+        )
 
     if hasattr(app, 'config') and hasattr(app.config, 'maps') and app.config.maps.allow_planning:
         try:
-            print(f"- map planning is not supported yet; the calculate route button is a dummy...")
+            print(f"- map planning uses the {routing_backend()} routing backend")
         except Exception as e:
             print(f"Failed to start OTP server: {e}")
             if otp_process: 
@@ -84,6 +110,11 @@ def set_environment(config):
 
 
 
+def routing_backend():
+    # "local": in-process planner (routing.py); "otp": OpenTripPlanner at otp_url
+    return getattr(app.config.maps, "routing_backend", "local")
+
+
 templates = Jinja2Templates(directory=os.path.join(current_dir, "templates"))
 
 @app.on_event("startup") # Added
@@ -122,6 +153,8 @@ async def map_page(request: Request):
             "calculate_button_hover_color": getattr(app.config.maps, "calculate_button_hover_color", "#2980b9"),
             "sidebar_background_color": getattr(app.config.maps, "sidebar_background_color", "#f8f9fa"),
             "allow_planning": app.config.maps.allow_planning,
+            # above this many landmarks the page loads them per viewport
+            "viewport_loading": len(landmark_grid) > max_markers(),
         },
     )
 
@@ -129,42 +162,57 @@ async def map_page(request: Request):
 @app.get("/maps/where")
 async def where(q: str):
     """
-    This function takes a query string `q` and returns the OSM ID of the location.
+    This function takes a query string `q` and returns the best matching
+    location: its OSM ID (when it came from the remote geocoder), name and
+    coordinates.
     """
     try:
-        # Use the Nominatim API to geocode the location
-        response = requests.get(
-            f"https://nominatim.openstreetmap.org/search?q={q}&format=json&limit=1"
-        )
-        response.raise_for_status()  # Raise an exception for bad status codes
-        data = response.json()
-
-        if data:
-            # Extract the OSM ID from the response
-            osm_id = data[0].get("osm_id")
-            return {"osm_id": osm_id}
+        results = await geocoder.search(q, limit=1)
+        if results:
+            return results[0].to_json()
         else:
             return {"error": "Location not found"}
-    except requests.exceptions.RequestException as e:
-        return {"error": f"API request failed: {e}"}
     except Exception as e:
         return {"error": f"An error occurred: {e}"}
 
 
+def max_markers():
+    return getattr(app.config.maps, "max_markers", 500)
+
+
 @app.get("/maps/landmarks")
-def get_landmarks():
-    return Response(
-        json.dumps(
-            [
-                {
-                    "name": l.name,
-                    "coords": [l.lat, l.lng],
-                    "markerStyle": {"icon": l.icon, "color": l.color},
-                }
-                for l in landmarks()
-            ]
-        ),
-        media_type="application/json",
+def get_landmarks(bbox: Optional[str] = None, zoom: Optional[int] = None):
+    """
+    All landmarks, or with ``bbox=west,south,east,north`` only those in the box.
+    If ``zoom`` is given and the box holds more than ``max_markers``
+    landmarks, nearby ones are merged into cluster entries.
+    """
+    if bbox is None:
+        # the full list is the reward state: read it from the table
+        items = [serialize_landmark(l) for l in landmarks_readonly()]
+    else:
+        try:
+            items = landmark_grid.query(parse_bbox(bbox))
+        except ValueError as e:
+            return Response(
+                json.dumps({"error": f"Invalid bbox: {e}"}),
+                status_code=400,
+                media_type="application/json",
+            )
+        if zoom is not None and len(items) > max_markers():
+            items = cluster(items, zoom)
+    return Response(json.dumps(items), media_type="application/json")
+
+
+def landmark_from_request(data):
+    # markerStyle may be missing or null
+    marker_style = data.get("markerStyle") or {}
+    return Landmark(
+        name=data["name"],
+        lat=data["coords"][0],
+        lng=data["coords"][1],
+        icon=marker_style.get("icon", "map-marker"),
+        color=marker_style.get("color", "blue"),
     )
 
 
@@ -187,15 +235,9 @@ async def add_landmark(request: Request):
         marker_style = data.get("markerStyle", {})
         if marker_style is None:
             marker_style = {}
-        landmarks.insert(
-            Landmark(
-                name=data["name"],
-                lat=data["coords"][0],
-                lng=data["coords"][1],
-                icon=marker_style.get("icon", "map-marker"),
-                color=marker_style.get("color", "blue"),
-            )
-        )
+        landmark = landmark_from_request(data)
+        landmarks.insert(landmark)
+        landmark_grid.add(asdict(landmark))
         return Response(
             json.dumps(
                 {
@@ -214,10 +256,69 @@ async def add_landmark(request: Request):
         )
 
 
+@app.post("/maps/landmarks/bulk")
+async def add_landmarks_bulk(request: Request):
+    """
+    Add a JSON list of landmarks (same shape as ``/maps/add_landmarks``) in
+    one transaction. Names that already exist, or repeat within the
+    request, are skipped rather than failing the batch.
+    """
+    try:
+        data = await request.json()
+        new_landmarks, seen, skipped = [], set(), []
+        for item in data:
+            if item["name"] in landmark_grid or item["name"] in seen:
+                skipped.append(item["name"])
+            else:
+                seen.add(item["name"])
+                new_landmarks.append(landmark_from_request(item))
+        if new_landmarks:
+            landmarks.insert_all([asdict(l) for l in new_landmarks])
+        for landmark in new_landmarks:
+            landmark_grid.add(asdict(landmark))
+        return Response(
+            json.dumps(
+                {"added": [l.name for l in new_landmarks], "skipped": skipped}
+            ),
+            media_type="application/json",
+        )
+    except Exception as e:
+        return Response(
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            media_type="application/json",
+        )
+
+
+@app.post("/maps/landmarks/bulk_delete")
+async def delete_landmarks_bulk(request: Request):
+    """
+    Delete landmarks by name, from a JSON body ``{"names": [...]}``.
+    """
+    try:
+        names = (await request.json())["names"]
+        for start in range(0, len(names), 500):
+            chunk = names[start : start + 500]
+            landmarks.delete_where(
+                f"name in ({', '.join('?' * len(chunk))})", chunk
+            )
+        deleted = [name for name in names if landmark_grid.remove(name)]
+        return Response(
+            json.dumps({"deleted": deleted}), media_type="application/json"
+        )
+    except Exception as e:
+        return Response(
+            json.dumps({"error": str(e)}),
+            status_code=400,
+            media_type="application/json",
+        )
+
+
 @app.delete("/maps/landmarks/{name}")
 def delete_landmark(name: str):
     try:
         landmarks.delete(name)
+        landmark_grid.remove(name)
         return Response(status_code=204)
     except Exception as e:
         return Response(
@@ -237,7 +338,7 @@ async def get_route(
     mode: str = "SUBWAY,WALK"
 ):
     """
-    Get a route between two points using OpenTripPlanner
+    Get a route between two points, with the local planner or OpenTripPlanner
     """
     otp_graphql_url = f"{app.config.maps.otp_url}/otp/gtfs/v1"
     
@@ -267,6 +368,20 @@ async def get_route(
     # dateTime_str = f"{date}T{time}"
     dateTime_str = f"{date_str}T{time_str}Z"
 
+    if routing_backend() == "local":
+        try:
+            departure = datetime.fromisoformat(f"{date_str}T{time_str}+00:00")
+        except ValueError as e:
+            return {"error": f"Invalid date or time: {e}"}
+        # A* over the graph is CPU bound: keep it off the event loop
+        return await asyncio.to_thread(
+            router.plan,
+            (from_lat, from_lon),
+            (to_lat, to_lon),
+            int(departure.timestamp() * 1000),
+            modes=mode,
+        )
+
     graphql_query = """
     query PlanConnectionQuery(
         $dateTime: OffsetDateTime!, 
@@ -333,10 +448,12 @@ async def get_route(
     }
     
     try:
-        response = requests.post(
+        response = await asyncio.to_thread(
+            otp_session.post,
             otp_graphql_url,
             json={"query": graphql_query, "variables": variables},
-            headers={"Content-Type": "application/json"}
+            headers={"Content-Type": "application/json"},
+            timeout=60,
         )
         response.raise_for_status()
         # debug print
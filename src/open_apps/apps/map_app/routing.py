@@ -0,0 +1,308 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+
+In-process route planner for the maps app.
+
+Route planning used to need an OpenTripPlanner server (a JVM with 8 GB
+of heap), so it was switched off on any node without Java 21.
+``LocalRouter`` is a small stand-in: an A* search over a bundled subway
+network (``data/transit.json``: a handful of approximate NYC lines) with
+walking connections to, from and between stations. Walking follows the
+straight line, lengthened by a detour factor for the street grid.
+
+It answers with the same JSON as the OTP ``planConnection`` query the
+endpoint used to make, so the page draws its itineraries unchanged:
+the fastest one, plus a walking-only alternative when the fastest uses
+the subway.
+
+Searches are cached by their endpoints rounded to about 10 m; a cached
+plan is re-stamped with each request's departure time.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+__all__ = ["LocalRouter", "encode_polyline", "load_transit_network"]
+
+
+BUNDLED_NETWORK = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "transit.json"
+)
+
+WALK_SPEED = 1.3  # m/s
+WALK_DETOUR = 1.25  # street distance per straight-line metre
+SUBWAY_SPEED = 9.0  # m/s between stations, average
+DWELL_SECONDS = 30  # per intermediate stop
+BOARDING_WAIT = 180  # seconds, average wait for a train
+MAX_ACCESS_WALK = 1500  # metres walked to or from a station
+MAX_TRANSFER_WALK = 300  # metres walked between lines
+TRANSIT_MODES = {"TRANSIT", "SUBWAY", "RAIL"}
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi, d_lambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+
+def encode_polyline(points) -> str:
+    """Google encoded polyline (precision 5) of ``(lat, lon)`` points."""
+    encoded, last_lat, last_lon = [], 0, 0
+    for lat, lon in points:
+        lat, lon = round(lat * 1e5), round(lon * 1e5)
+        for delta in (lat - last_lat, lon - last_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        last_lat, last_lon = lat, lon
+    return "".join(encoded)
+
+
+@dataclass(frozen=True)
+class Stop:
+    name: str
+    lat: float
+    lon: float
+    line: Optional[int] = None  # index into the network's lines; None for origin/destination
+
+
+@dataclass(frozen=True)
+class Edge:
+    target: int
+    seconds: float  # moving time
+    meters: float
+    line: Optional[int] = None  # None for walking
+    wait: float = 0  # waiting before the move (boarding)
+
+
+def load_transit_network(path: Optional[str] = None) -> List[dict]:
+    """Lines of a transit network file (default the bundled one)."""
+    with open(path or BUNDLED_NETWORK, encoding="utf-8") as f:
+        return json.load(f)["lines"]
+
+
+def _walk_edge(target: int, meters: float, boarding: bool) -> Edge:
+    meters *= WALK_DETOUR
+    return Edge(target, meters / WALK_SPEED, meters, wait=BOARDING_WAIT if boarding else 0)
+
+
+class LocalRouter:
+    """A* planner over a transit network plus walking."""
+
+    def __init__(self, lines: List[dict], cache_size: int = 512):
+        self.lines = lines
+        # one stop per (line, station), so changing lines is an explicit edge
+        self.stops: List[Stop] = []
+        self.edges: List[List[Edge]] = []
+        for line_index, line in enumerate(lines):
+            first = len(self.stops)
+            for name, lat, lon in line["stations"]:
+                self.stops.append(Stop(name, lat, lon, line_index))
+                self.edges.append([])
+            for i in range(first, len(self.stops) - 1):
+                a, b = self.stops[i], self.stops[i + 1]
+                meters = distance_m(a.lat, a.lon, b.lat, b.lon)
+                seconds = meters / SUBWAY_SPEED + DWELL_SECONDS
+                # lines run both ways
+                self.edges[i].append(Edge(i + 1, seconds, meters, line_index))
+                self.edges[i + 1].append(Edge(i, seconds, meters, line_index))
+        for i, a in enumerate(self.stops):
+            for j, b in enumerate(self.stops):
+                if a.line != b.line:
+                    meters = distance_m(a.lat, a.lon, b.lat, b.lon)
+                    if meters <= MAX_TRANSFER_WALK:
+                        self.edges[i].append(_walk_edge(j, meters, boarding=True))
+
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        departure_ms: int,
+        modes: str = "WALK,SUBWAY",
+    ) -> dict:
+        """Itineraries from ``origin`` to ``destination``, OTP-shaped."""
+        use_transit = bool(TRANSIT_MODES & {m.strip().upper() for m in modes.split(",")})
+        key = (
+            round(origin[0], 4),
+            round(origin[1], 4),
+            round(destination[0], 4),
+            round(destination[1], 4),
+            use_transit,
+        )
+        with self._lock:
+            plans = self._cache.get(key)
+            if plans is not None:
+                self._cache.move_to_end(key)
+        if plans is None:
+            plans = self._search(origin, destination, use_transit)
+            with self._lock:
+                self._cache[key] = plans
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return {
+            "data": {
+                "planConnection": {
+                    "edges": [
+                        {"node": {"legs": self._stamp(legs, departure_ms)}}
+                        for legs in plans
+                    ]
+                }
+            }
+        }
+
+    def _search(self, origin, destination, use_transit: bool) -> List[list]:
+        """Leg lists with times relative to departure, fastest first."""
+        start = Stop("Origin", *origin)
+        end = Stop("Destination", *destination)
+        walk_only = [self._walk_leg(start, end, 0)]
+        if not use_transit:
+            return [walk_only]
+
+        path = self._astar(start, end)
+        if path is None or all(edge.line is None for _, edge in path):
+            return [walk_only]
+        return [self._legs(start, end, path), walk_only]
+
+    def _astar(self, start: Stop, end: Stop):
+        # node ids: stops are 0..n-1, the origin is n and the destination n+1
+        n = len(self.stops)
+        origin_id, destination_id = n, n + 1
+        to_end = [distance_m(s.lat, s.lon, end.lat, end.lon) for s in self.stops]
+
+        def neighbours(node):
+            if node == origin_id:
+                for j, stop in enumerate(self.stops):
+                    meters = distance_m(start.lat, start.lon, stop.lat, stop.lon)
+                    if meters <= MAX_ACCESS_WALK:
+                        yield _walk_edge(j, meters, boarding=True)
+                yield _walk_edge(
+                    destination_id,
+                    distance_m(start.lat, start.lon, end.lat, end.lon),
+                    boarding=False,
+                )
+                return
+            yield from self.edges[node]
+            if to_end[node] <= MAX_ACCESS_WALK:
+                yield _walk_edge(destination_id, to_end[node], boarding=False)
+
+        def heuristic(node):
+            # the fastest possible way there: straight line at train speed
+            if node == destination_id:
+                return 0.0
+            if node == origin_id:
+                return distance_m(start.lat, start.lon, end.lat, end.lon) / SUBWAY_SPEED
+            return to_end[node] / SUBWAY_SPEED
+
+        best = {origin_id: 0.0}
+        came_from = {}
+        queue = [(heuristic(origin_id), 0.0, origin_id)]
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == destination_id:
+                path = []
+                while node != origin_id:
+                    previous, edge = came_from[node]
+                    path.append((previous, edge))
+                    node = previous
+                return path[::-1]
+            if cost > best.get(node, math.inf):
+                continue
+            for edge in neighbours(node):
+                new_cost = cost + edge.wait + edge.seconds
+                if new_cost < best.get(edge.target, math.inf):
+                    best[edge.target] = new_cost
+                    came_from[edge.target] = (node, edge)
+                    heapq.heappush(queue, (new_cost + heuristic(edge.target), new_cost, edge.target))
+        return None
+
+    def _stop(self, node: int, start: Stop, end: Stop) -> Stop:
+        n = len(self.stops)
+        return start if node == n else end if node == n + 1 else self.stops[node]
+
+    def _legs(self, start: Stop, end: Stop, path) -> list:
+        legs, clock = [], 0.0
+        i = 0
+        while i < len(path):
+            node, edge = path[i]
+            if edge.line is None:
+                leg = self._walk_leg(self._stop(node, start, end), self._stop(edge.target, start, end), clock)
+                legs.append(leg)
+                clock = leg["_end"] + edge.wait
+                i += 1
+                continue
+            # consecutive hops on one line form a single ride
+            stops = [self._stop(node, start, end)]
+            seconds = meters = 0.0
+            while i < len(path) and path[i][1].line == edge.line:
+                seconds += path[i][1].seconds
+                meters += path[i][1].meters
+                stops.append(self._stop(path[i][1].target, start, end))
+                i += 1
+            line = self.lines[edge.line]
+            legs.append(
+                self._leg(
+                    "SUBWAY",
+                    stops,
+                    clock,
+                    seconds,
+                    meters,
+                    route={
+                        "shortName": line["shortName"],
+                        "longName": line["longName"],
+                        "color": line["color"],
+                        "textColor": line["textColor"],
+                    },
+                )
+            )
+            clock += seconds
+        return legs
+
+    def _walk_leg(self, a: Stop, b: Stop, clock: float) -> dict:
+        meters = distance_m(a.lat, a.lon, b.lat, b.lon) * WALK_DETOUR
+        return self._leg("WALK", [a, b], clock, meters / WALK_SPEED, meters)
+
+    @staticmethod
+    def _leg(mode, stops, clock, seconds, meters, route=None) -> dict:
+        first, last = stops[0], stops[-1]
+        return {
+            "mode": mode,
+            "_start": clock,
+            "_end": clock + seconds,
+            "duration": round(seconds),
+            "distance": round(meters, 1),
+            "from": {"name": first.name, "lat": first.lat, "lon": first.lon},
+            "to": {"name": last.name, "lat": last.lat, "lon": last.lon},
+            "legGeometry": {"points": encode_polyline((s.lat, s.lon) for s in stops)},
+            "route": route,
+        }
+
+    @staticmethod
+    def _stamp(legs: list, departure_ms: int) -> list:
+        stamped = []
+        for leg in legs:
+            leg = dict(leg)
+            leg["startTime"] = departure_ms + round(leg.pop("_start") * 1000)
+            leg["endTime"] = departure_ms + round(leg.pop("_end") * 1000)
+            stamped.append(leg)
+        return stamped
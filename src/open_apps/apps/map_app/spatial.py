@@ -0,0 +1,190 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+
+In-memory spatial index of the map's saved landmarks.
+
+Without a bounding box ``/maps/landmarks`` serializes the whole landmark
+table, which is what rewards are computed from. Viewport queries go to
+``LandmarkGrid`` instead: it keeps each landmark's serialized form in a
+fixed grid of lat/lng cells, so a bounding-box query only visits the
+cells the box overlaps. At low zoom a viewport can still hold thousands of
+landmarks; ``cluster`` then merges them into one marker per screen-sized
+cell, which keeps the number of markers the page draws bounded.
+
+Landmarks are returned in insertion order, the order the table itself
+lists them in.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+__all__ = ["LandmarkGrid", "cluster", "parse_bbox", "serialize_landmark"]
+
+
+BBox = Tuple[float, float, float, float]  # west, south, east, north
+
+
+def serialize_landmark(landmark: dict) -> dict:
+    """The ``/maps/landmarks`` JSON shape of a landmark row."""
+    return {
+        "name": landmark["name"],
+        "coords": [landmark["lat"], landmark["lng"]],
+        "markerStyle": {"icon": landmark["icon"], "color": landmark["color"]},
+    }
+
+
+def parse_bbox(bbox: str) -> BBox:
+    """Parse ``west,south,east,north`` (Leaflet's ``toBBoxString``)."""
+    west, south, east, north = (float(value) for value in bbox.split(","))
+    if south > north:
+        raise ValueError("bbox south is above north")
+    return west, south, east, north
+
+
+class LandmarkGrid:
+    """Grid index over landmarks, keyed by name.
+
+    Args:
+        cell_size: Cell edge in degrees. A city-sized map fits in a few
+            cells at the default, a world map in a few thousand.
+    """
+
+    def __init__(self, landmarks: Iterable[dict] = (), cell_size: float = 0.05):
+        self.cell_size = cell_size
+        self._lock = threading.Lock()
+        self._cells: Dict[Tuple[int, int], Dict[str, int]] = defaultdict(dict)
+        self._entries: Dict[str, Tuple[int, Tuple[int, int], dict]] = {}
+        self._counter = 0
+        for landmark in landmarks:
+            self.add(landmark)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def add(self, landmark: dict) -> None:
+        """Index a landmark row (replacing one of the same name)."""
+        with self._lock:
+            self._remove(landmark["name"])
+            cell = self._cell(landmark["lat"], landmark["lng"])
+            self._counter += 1
+            self._cells[cell][landmark["name"]] = self._counter
+            self._entries[landmark["name"]] = (
+                self._counter,
+                cell,
+                serialize_landmark(landmark),
+            )
+
+    def remove(self, name: str) -> bool:
+        """Drop ``name`` from the index; False if it wasn't indexed."""
+        with self._lock:
+            return self._remove(name)
+
+    def _remove(self, name: str) -> bool:
+        entry = self._entries.pop(name, None)
+        if entry is None:
+            return False
+        _, cell, _ = entry
+        del self._cells[cell][name]
+        if not self._cells[cell]:
+            del self._cells[cell]
+        return True
+
+    def query(self, bbox: Optional[BBox] = None) -> List[dict]:
+        """Serialized landmarks inside ``bbox`` (all of them without one).
+
+        A box whose west edge is east of its east edge crosses the
+        antimeridian.
+        """
+        with self._lock:
+            if bbox is None:
+                found = list(self._entries.values())
+            else:
+                found = [
+                    self._entries[name]
+                    for west, east in _lng_ranges(bbox)
+                    for name in self._names_in(bbox[1], west, bbox[3], east)
+                ]
+        found.sort(key=lambda entry: entry[0])
+        return [item for _, _, item in found]
+
+    def _names_in(self, south: float, west: float, north: float, east: float):
+        min_row, min_col = self._cell(south, west)
+        max_row, max_col = self._cell(north, east)
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            # box covers more cells than exist: scan the occupied ones
+            cells = [
+                cell
+                for cell in self._cells
+                if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+            ]
+        else:
+            cells = [
+                (row, col)
+                for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)
+                if (row, col) in self._cells
+            ]
+        for cell in cells:
+            inner = min_row < cell[0] < max_row and min_col < cell[1] < max_col
+            for name in self._cells[cell]:
+                if inner:
+                    yield name
+                    continue
+                lat, lng = self._entries[name][2]["coords"]
+                if south <= lat <= north and west <= lng <= east:
+                    yield name
+
+
+def _lng_ranges(bbox: BBox):
+    west, _, east, _ = bbox
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def cluster(items: List[dict], zoom: int, radius: int = 60) -> List[dict]:
+    """Merge landmarks closer than ``radius`` pixels at ``zoom``.
+
+    Landmarks are grouped by a screen-aligned grid whose cells are
+    ``radius`` pixels wide at the given zoom (256 px tiles). A cell with
+    a single landmark keeps it as is; otherwise it becomes a cluster
+    entry ``{"cluster": True, "count", "coords", "bounds"}`` at the
+    centroid of its members, in the position of its first member.
+    """
+    cell = 360.0 / (256 * 2 ** zoom) * radius
+    groups: Dict[Tuple[int, int], List[dict]] = {}
+    for item in items:
+        lat, lng = item["coords"]
+        key = (math.floor(lat / cell), math.floor(lng / cell))
+        groups.setdefault(key, []).append(item)
+
+    clustered = []
+    for members in groups.values():
+        if len(members) == 1:
+            clustered.append(members[0])
+            continue
+        lats = [member["coords"][0] for member in members]
+        lngs = [member["coords"][1] for member in members]
+        clustered.append(
+            {
+                "cluster": True,
+                "count": len(members),
+                "coords": [sum(lats) / len(lats), sum(lngs) / len(lngs)],
+                "bounds": [[min(lats), min(lngs)], [max(lats), max(lngs)]],
+            }
+        )
+    return clustered
@@ -7,18 +7,41 @@ LICENSE file in the root directory of this source tree.
 from fasthtml.common import *
 from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
 import random
-import ast
 import json
+import threading
 from src.open_apps.apps.start_page.helper import create_logo_header
+from open_apps.apps.storage import get_database, get_readonly_database, is_memory
 
 
 @dataclass
-class Messages:
+class Conversation:
     user: str
-    messages: list[str]
-    senders: list[str]
-    timestamps: list[str]
+    count: int  # number of messages, i.e. the next message's seq
+    # summary of the latest message, kept up to date by every append
+    last_message: Optional[str] = None
+    last_sender: Optional[str] = None
+    last_timestamp: Optional[str] = None
+
+
+@dataclass
+class Message:
+    id: int
+    conversation: str
+    seq: int  # position of the message in its conversation
+    message: str
+    sender: str
+    timestamp: str
+
+
+# Serializes appends so two sends to one conversation never get the same seq
+_append_lock = threading.Lock()
+# Search results listed at most per query (the count covers all matches)
+SEARCH_RESULT_LIMIT = 50
+# Rendered /messages rows, user -> (message count, row): a row only changes
+# when a message is appended, which replaces it. Cleared by set_environment.
+_conversation_row_cache = {}
 
 logo_title_container = None
 
@@ -67,12 +90,28 @@ _base_chat_script = (
         }
     }
     
-    // Initial load scroll
-    document.addEventListener('DOMContentLoaded', scrollToBottom);
+    // Initial load scroll: to the focused message if the page was opened
+    // from a search result, otherwise to the latest message. Older/newer
+    // pages only start loading on scroll once this has happened.
+    window.chatHistoryReady = false;
+    document.addEventListener('DOMContentLoaded', function() {
+        const chatlist = document.getElementById('chatlist');
+        const focus = chatlist ? chatlist.dataset.focus : null;
+        if (focus) {
+            scrollToMessage(`msg-${focus}`);
+        } else {
+            scrollToBottom();
+        }
+        setTimeout(() => { window.chatHistoryReady = true; }, 1000);
+    });
     
-    // Watch for DOM changes in the chat container
+    // Watch for DOM changes in the chat container, except for lazily
+    // loaded history pages, which must keep the current scroll position
     const observer = new MutationObserver(function(mutations) {
-        scrollToBottom();
+        const isHistoryPage = node => node.nodeType !== 1 || node.closest('.chat-history-page');
+        if (mutations.some(m => !Array.from(m.addedNodes).every(isHistoryPage))) {
+            scrollToBottom();
+        }
     });
     
     document.addEventListener('DOMContentLoaded', function() {
@@ -123,114 +162,33 @@ _base_chat_script = (
         }
     });
     
-    // Search functionality
-    function searchMessages() {
-        const searchTerm = document.getElementById('search-input').value.toLowerCase();
-        if (searchTerm === '') {
-            clearSearch();
-            return;
+    // Keep the visible messages in place when an older page is inserted
+    // above them
+    document.body.addEventListener('htmx:beforeSwap', function(evt) {
+        if (evt.detail.target.classList.contains('chat-history-older')) {
+            const container = document.querySelector('#chat-container');
+            window.chatScrollFromBottom = container.scrollHeight - container.scrollTop;
         }
-        
-        const chatMessages = document.querySelectorAll('.chat');
-        let matchCount = 0;
-        let searchResults = [];
-        
-        // First clear all message IDs and highlights
-        chatMessages.forEach((message, index) => {
-            message.id = `msg-${index}`;  // Assign IDs to all messages for later reference
-            message.classList.remove('search-highlight');
-        });
-        
-        chatMessages.forEach((chatMessage, index) => {
-            const bubble = chatMessage.querySelector('.chat-bubble');
-            const messageText = bubble.textContent.toLowerCase();
-            const isUser = chatMessage.classList.contains('chat-end');
-            
-            // Get the sender name from the chat-header
-            const headerText = chatMessage.querySelector('.chat-header').textContent;
-            const sender = isUser ? 'You' : headerText.trim();
-            
-            // Include the timestamp in search results (now with date)
-            const timestamp = chatMessage.querySelector('.chat-footer').textContent;
-            
-            if (messageText.includes(searchTerm)) {
-                // Show and highlight matching messages
-                chatMessage.style.display = '';
-                chatMessage.classList.add('search-highlight');
-                
-                // Add to search results
-                matchCount++;
-                
-                // Create preview text with highlighting
-                let previewText = messageText;
-                if (previewText.length > 40) {
-                    // Find position of search term
-                    const pos = previewText.indexOf(searchTerm);
-                    // Create snippet with context around the match
-                    const start = Math.max(0, pos - 15);
-                    const end = Math.min(previewText.length, pos + searchTerm.length + 15);
-                    previewText = (start > 0 ? '...' : '') + 
-                                previewText.substring(start, end) + 
-                                (end < previewText.length ? '...' : '');
-                }
-                
-                // Add to search results array
-                searchResults.push({
-                    messageId: `msg-${index}`,
-                    sender: sender,
-                    preview: previewText,
-                    timestamp: timestamp,
-                    text: messageText
-                });
-            } else {
-                // Hide non-matching messages
-                chatMessage.style.display = 'none';
-            }
-        });
-        
-        // The rest of the function remains the same
-        document.getElementById('search-results').textContent = 
-            matchCount > 0 ? `${matchCount} result${matchCount !== 1 ? 's' : ''} for "${searchTerm}"` : `No results for "${searchTerm}"`;
-        
-        const searchResultsContainer = document.getElementById('search-results-container');
-        searchResultsContainer.innerHTML = '';
-        
-        if (searchResults.length > 0) {
-            searchResults.forEach(result => {
-                const resultItem = document.createElement('div');
-                resultItem.className = 'search-result-item p-2 hover:bg-base-300 rounded cursor-pointer flex flex-col';
-                resultItem.setAttribute('onclick', `window.handleSearchResultClick('${result.messageId}')`);
-                
-                const headerEl = document.createElement('div');
-                headerEl.className = 'font-bold text-sm flex justify-between';
-                
-                const senderEl = document.createElement('span');
-                senderEl.textContent = result.sender;
-                
-                const timeEl = document.createElement('span');
-                timeEl.className = 'text-xs opacity-70';
-                timeEl.textContent = result.timestamp;
-                
-                headerEl.appendChild(senderEl);
-                headerEl.appendChild(timeEl);
-                
-                const previewEl = document.createElement('div');
-                previewEl.className = 'text-sm';
-                previewEl.textContent = result.preview;
-                
-                resultItem.appendChild(headerEl);
-                resultItem.appendChild(previewEl);
-                searchResultsContainer.appendChild(resultItem);
-            });
+    });
+    
+    document.body.addEventListener('htmx:afterSettle', function(evt) {
+        if (window.chatScrollFromBottom !== undefined) {
+            const container = document.querySelector('#chat-container');
+            container.style.scrollBehavior = 'auto';
+            container.scrollTop = container.scrollHeight - window.chatScrollFromBottom;
+            container.style.scrollBehavior = '';
+            window.chatScrollFromBottom = undefined;
         }
-        
-        if (searchTerm === '') {
-            clearSearch();
-        } else if (matchCount > 0) {
-            const firstHighlight = document.querySelector('.search-highlight');
-            if (firstHighlight) {
-                firstHighlight.scrollIntoView({ behavior: 'smooth', block: 'center' });
-            }
+    });
+    
+    // Search results come from the server (/messages/{user}/search). A
+    // result whose message is not loaded yet reopens the conversation
+    // around that message.
+    function openSearchResult(seq) {
+        if (document.getElementById(`msg-${seq}`)) {
+            window.handleSearchResultClick(`msg-${seq}`);
+        } else {
+            window.location.search = `?focus=${seq}`;
         }
     }
     
@@ -271,7 +229,7 @@ app = FastHTML(hdrs=_base_hdrs, cls="p-4 max-w-lg mx-auto")
 
 def set_environment(config):
     """Set environment variables for the messenger app"""
-    global app, logo_title_container, message_history_db, user_logo, group_logo
+    global app, logo_title_container, messages_db, conversations, message_table, messages_readonly_db, user_logo, group_logo
     # if getattr(config.messenger, 'no_css', False):
     #     app.hdrs = ()
     #     app.config = config
@@ -360,9 +318,17 @@ def set_environment(config):
     app.hdrs = (*_base_hdrs, env_styles)
     app.config = config
     # create database
-    db = database(app.config.messenger.database_path)
-    message_history_db = db.create(Messages, pk="user")
-    populate_database(config, message_history_db)
+    memory = is_memory(app.config.messenger)
+    db = get_database(app.config.messenger.database_path, memory=memory)
+    messages_db = db
+    conversations = db.create(Conversation, pk="user")
+    message_table = db.create(Message, pk="id")
+    message_table.create_index(["conversation", "seq"], unique=True, if_not_exists=True)
+    # trigram FTS index backing the in-conversation search (substring matches)
+    message_table.enable_fts(["message"], create_triggers=True, tokenize="trigram", replace=True)
+    messages_readonly_db = get_readonly_database(app.config.messenger.database_path, memory=memory)
+    populate_database(config)
+    _conversation_row_cache.clear()
     user_logo_url, group_logo_url = app.config.start_page.apps.messages.user_icon, app.config.start_page.apps.messages.group_icon
     user_logo = Img(src=user_logo_url, cls="h-10 mr-3")
     group_logo = Img(src=group_logo_url, cls="h-10 mr-3")
@@ -373,35 +339,85 @@ def set_environment(config):
         current_file_path=__file__
     )
 
-def populate_database(config, db):
+def populate_database(config):
     """Adds chat history to database"""
     chat_history = config.messenger.chat_history
     for user in chat_history:
         print("adding ", user, " to db")
         user_chat = chat_history[user]
-        messages = [m[0] for m in user_chat]
-        senders = [m[2] for m in user_chat]
-        timestamps = [m[3] for m in user_chat]
-        messages = Messages(user=user, messages=messages, senders=senders, timestamps=timestamps)
-        db.insert(messages)
+        last = user_chat[-1] if user_chat else (None, None, None, None)
+        with messages_db.conn:
+            conversations.insert(Conversation(
+                user=user, count=len(user_chat),
+                last_message=last[0], last_sender=last[2], last_timestamp=last[3],
+            ))
+            message_table.insert_all([
+                dict(conversation=user, seq=seq, message=m[0], sender=m[2], timestamp=m[3])
+                for seq, m in enumerate(user_chat)
+            ])
 
 
 def add_new_message_to_history(user, message, sender, timestamp):
-    """Adds a new message to the database"""
-    chat_history = message_history_db[user]
-    messages = ast.literal_eval(chat_history.messages)
-    messages.append(message)
-    senders = ast.literal_eval(chat_history.senders)
-    senders.append(sender)
-    timestamps = ast.literal_eval(chat_history.timestamps)
-    timestamps.append(timestamp)
-    chat_history.messages = messages
-    chat_history.senders = senders
-    chat_history.timestamps = timestamps
-    message_history_db.update(chat_history)
+    """Appends a message to a conversation in the database"""
+    with _append_lock, messages_db.conn:
+        rows = messages_db.q(
+            "UPDATE conversation SET count = count + 1, last_message = ?, last_sender = ?, "
+            "last_timestamp = ? WHERE user = ? RETURNING count",
+            [message, sender, timestamp, user],
+        )
+        if not rows:
+            raise NotFoundError(f"No conversation with {user}")
+        seq = rows[0]["count"] - 1
+        message_table.insert(dict(
+            conversation=user, seq=seq,
+            message=message, sender=sender, timestamp=timestamp,
+        ))
+    return seq
+
+
+def get_messages(user, limit=None, before=None, after=None):
+    """Messages of a conversation in order.
+
+    With `limit`, only the `limit` latest messages before seq `before`,
+    or the `limit` earliest after seq `after`.
+    """
+    where, args = "conversation = ?", [user]
+    if before is not None:
+        where += " AND seq < ?"
+        args.append(before)
+    if after is not None:
+        where += " AND seq > ?"
+        args.append(after)
+    if limit is None or after is not None:
+        return message_table(where, args, order_by="seq", limit=limit)
+    return message_table(where, args, order_by="seq DESC", limit=limit)[::-1]
+
+
+def search_messages(user, query, limit=SEARCH_RESULT_LIMIT):
+    """Case-insensitive substring search in a conversation.
+
+    Returns (number of matches, first `limit` matching messages). The
+    trigram index needs at least 3 characters; shorter queries fall back
+    to a LIKE scan of the conversation.
+    """
+    if len(query) >= 3:
+        match = '"' + query.replace('"', '""') + '"'
+        source = "message_fts f JOIN message m ON m.rowid = f.rowid"
+        where = "f.message MATCH ? AND m.conversation = ?"
+        args = [match, user]
+    else:
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        source = "message m"
+        where = "m.conversation = ? AND m.message LIKE ? ESCAPE '\\'"
+        args = [user, f"%{escaped}%"]
+    count = messages_db.q(f"SELECT count(*) AS n FROM {source} WHERE {where}", args)[0]["n"]
+    rows = messages_db.q(
+        f"SELECT m.* FROM {source} WHERE {where} ORDER BY m.seq LIMIT ?", args + [limit]
+    )
+    return count, [Message(**row) for row in rows]
 
 # Chat message component (renders a chat bubble)
-def ChatMessage(message, sender, timestamp=None):
+def ChatMessage(message, sender, timestamp=None, seq=None):
     if sender == "you":
         bubble_class = "chat-bubble-primary custom-primary-bubble bg-[var(--chat-primary-bubble-color)] text-[var(--chat-font-color)]"
         chat_class = "chat-end"
@@ -410,7 +426,7 @@ def ChatMessage(message, sender, timestamp=None):
         chat_class = "chat-start"
     if timestamp is None:
         timestamp = datetime.now().strftime("%b %d, %I:%M %p")  # Format: Apr 16, 10:30 AM
-    return Div(cls=f"chat {chat_class}")(
+    return Div(cls=f"chat {chat_class}", id=f"msg-{seq}" if seq is not None else None)(
         Div(sender, cls="chat-header"),
         Div(message, cls=f"chat-bubble {bubble_class}"),
         Div(timestamp, cls="chat-footer opacity-70 text-xs"),
@@ -428,8 +444,34 @@ def ChatInput():
         hx_swap_oob="true",
     )
 
+# Placeholder that loads the next page of older (or newer) messages when
+# clicked or scrolled into view, replacing itself with that page
+def HistoryPageLoader(user_id, before=None, after=None):
+    query = f"before={before}" if before is not None else f"after={after}"
+    return Div(
+        cls=f"chat-history-page chat-history-{'older' if before is not None else 'newer'} text-center",
+        hx_get=f"/messages/{user_id}/history?{query}",
+        hx_trigger="click, intersect[window.chatHistoryReady]",
+        hx_swap="outerHTML",
+    )(
+        Button(
+            "Load earlier messages" if before is not None else "Load newer messages",
+            cls="btn btn-ghost btn-xs", type="button",
+        )
+    )
+
+
+# A window of messages with loaders for whatever lies before and after it
+def ChatWindow(user_id, history, count):
+    return (
+        HistoryPageLoader(user_id, before=history[0].seq) if history and history[0].seq > 0 else "",
+        *[ChatMessage(m.message, m.sender, m.timestamp, m.seq) for m in history],
+        HistoryPageLoader(user_id, after=history[-1].seq) if history and history[-1].seq < count - 1 else "",
+    )
+
+
 # Search bar component with results area
-def SearchBar():
+def SearchBar(user_id):
     return Div(
         id="search-bar",
         cls="hidden flex-col gap-2 p-2 bg-base-200 border-b animate-fade-in"
@@ -437,9 +479,12 @@ def SearchBar():
         Div(cls="flex items-center gap-2")(
             Input(
                 id="search-input",
+                name="q",
                 placeholder="Search messages...",
                 cls="input input-bordered w-full",
-                onkeyup="searchMessages()"
+                hx_get=f"/messages/{user_id}/search",
+                hx_trigger="keyup changed delay:200ms",
+                hx_target="#search-results-container",
             ),
             Button(
                 I(cls="fas fa-times"),
@@ -455,60 +500,55 @@ def SearchBar():
         )
     )
 
-# the main screen, create a page that displays a list of users. Each user can be clicked on to display the detailed messages
-@app.get("/messages")
-def index():
-    chats = []
-    for history in message_history_db():
-        messages = ast.literal_eval(history.messages)
-        timestamps = ast.literal_eval(history.timestamps)
-        senders = ast.literal_eval(history.senders)
-        if messages:
-            last_sender = senders[-1] if senders else ""
-            last_message = messages[-1]
-            
-            # Add prefix to the last message
-            if last_sender == "you":
-                message_preview = f"You: {last_message}"
-            else:
-                message_preview = f"{last_message}" if "group" not in history.user.lower() else f"{last_sender}: {last_message}"
-
-            chats.append({
-                "user": history.user,
-                "last_message": message_preview,
-                "last_timestamp": timestamps[-1] if timestamps else ""
-            })
+# A conversation's row in the /messages list, rendered from its summary
+def ConversationRow(conversation):
+    if conversation.count:
+        last_sender = conversation.last_sender
+        last_message = conversation.last_message
+
+        # Add prefix to the last message
+        if last_sender == "you":
+            message_preview = f"You: {last_message}"
         else:
-            chats.append({
-                "user": history.user,
-                "last_message": "No messages yet",
-                "last_timestamp": ""
-            })
-    userlist = [
-        A(
-                # Avatar
-                # Use logo from icons
+            message_preview = f"{last_message}" if "group" not in conversation.user.lower() else f"{last_sender}: {last_message}"
+        last_timestamp = conversation.last_timestamp
+    else:
+        message_preview = "No messages yet"
+        last_timestamp = ""
+    return A(
+            # Avatar
+            # Use logo from icons
+            Div(
                 Div(
-                    Div(
-                        user_logo if 'group' not in chat['user'].lower() else group_logo,
-                    ),
-                # Chat info
+                    user_logo if 'group' not in conversation.user.lower() else group_logo,
+                ),
+            # Chat info
+            Div(
                 Div(
-                    Div(
-                        H3(chat['user'], cls="text-base text-black"),
-                        P(chat['last_timestamp'], cls="text-xs text-gray-500"),
-                        cls="flex justify-between items-center w-full"
-                    ),
-                    P(f"{chat['last_message']:.35}{'...' if len(chat['last_message']) > 35 else ''}", cls="text-xs text-gray-600"),
-                    cls="ml-4 flex-grow border-b border-base-200 pb-3",
+                    H3(conversation.user, cls="text-base text-black"),
+                    P(last_timestamp, cls="text-xs text-gray-500"),
+                    cls="flex justify-between items-center w-full"
                 ),
-                cls="flex items-center p-2 hover:bg-base-200 rounded-lg transition-colors w-full",
+                P(f"{message_preview:.35}{'...' if len(message_preview) > 35 else ''}", cls="text-xs text-gray-600"),
+                cls="ml-4 flex-grow border-b border-base-200 pb-3",
             ),
-            href=f"/messages/{chat['user']}",
-            cls="no-underline text-current",
-        )
-        for chat in chats
-    ]
+            cls="flex items-center p-2 hover:bg-base-200 rounded-lg transition-colors w-full",
+        ),
+        href=f"/messages/{conversation.user}",
+        cls="no-underline text-current",
+    )
+
+
+# the main screen, create a page that displays a list of users. Each user can be clicked on to display the detailed messages
+@app.get("/messages")
+def index():
+    userlist = []
+    for conversation in conversations():
+        cached = _conversation_row_cache.get(conversation.user)
+        if cached is None or cached[0] != conversation.count:
+            cached = (conversation.count, NotStr(to_xml(ConversationRow(conversation))))
+            _conversation_row_cache[conversation.user] = cached
+        userlist.append(cached[1])
 
     # Replace Container with Main for better structure
     page = Main(
@@ -528,11 +568,15 @@ def index():
     )
 
 @app.get("/messages/{user_id}/")
-def index(user_id: str):
-    chat_history: Messages = message_history_db[user_id]
-    messages = ast.literal_eval(chat_history.messages)
-    senders = ast.literal_eval(chat_history.senders)
-    timestamps = ast.literal_eval(chat_history.timestamps)
+def index(user_id: str, focus: int = None):
+    conversation = conversations[user_id]
+    page_size = getattr(app.config.messenger, "page_size", 50)
+    if focus is None:
+        # the latest page
+        history = get_messages(user_id, limit=page_size)
+    else:
+        # a page centered on the message opened from the search results
+        history = get_messages(user_id, limit=page_size, before=focus + page_size // 2 + 1)
 
     page = Main(cls="h-[80vh] flex flex-col bg-base-200")(
         # Header with return button and search icon
@@ -551,18 +595,16 @@ def index(user_id: str):
             )
         ),
         # Search Bar
-        SearchBar(),
+        SearchBar(user_id),
         # Chat container with background
         Div(id="chat-container", cls="flex-1 overflow-y-auto scroll-smooth chat-bg")(
             # Messages container
             Div(
                 id="chatlist",
                 cls="p-4 flex flex-col gap-2",
+                data_focus=focus,
             )(
-                *[
-                    ChatMessage(message, sender, timestamp)
-                    for message, sender, timestamp in zip(messages, senders, timestamps)
-                ]
+                *ChatWindow(user_id, history, conversation.count)
             ),
         ),
         # Input form
@@ -634,6 +676,59 @@ def index(user_id: str):
     )
 
 
+@app.get("/messages/{user_id}/history")
+def history_page(user_id: str, before: int = None, after: int = None):
+    """A page of older (`before`) or newer (`after`) messages, see HistoryPageLoader"""
+    conversation = conversations[user_id]
+    page_size = getattr(app.config.messenger, "page_size", 50)
+    history = get_messages(user_id, limit=page_size, before=before, after=after)
+    if before is not None:
+        loader = HistoryPageLoader(user_id, before=history[0].seq) if history and history[0].seq > 0 else ""
+        content = (loader, *[ChatMessage(m.message, m.sender, m.timestamp, m.seq) for m in history])
+    else:
+        loader = HistoryPageLoader(user_id, after=history[-1].seq) if history and history[-1].seq < conversation.count - 1 else ""
+        content = (*[ChatMessage(m.message, m.sender, m.timestamp, m.seq) for m in history], loader)
+    return Div(*content, cls="chat-history-page flex flex-col gap-2")
+
+
+def search_preview(text, query):
+    """Lowercased snippet of `text` around the first match of `query`"""
+    text, query = text.lower(), query.lower()
+    if len(text) <= 40:
+        return text
+    pos = text.find(query)
+    start = max(0, pos - 15)
+    end = min(len(text), pos + len(query) + 15)
+    return ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+
+
+@app.get("/messages/{user_id}/search")
+def search(user_id: str, q: str = ""):
+    """Search results for the search bar; the result count is swapped in out of band"""
+    query = q.strip()
+    if not query:
+        return Div(id="search-results", hx_swap_oob="true", cls="text-sm text-info font-bold mt-1")
+    count, matches = search_messages(user_id, query)
+    summary = f'{count} result{"s" if count != 1 else ""} for "{query}"' if count else f'No results for "{query}"'
+    results = [
+        Div(
+            cls="search-result-item p-2 hover:bg-base-300 rounded cursor-pointer flex flex-col",
+            onclick=f"openSearchResult({m.seq})",
+        )(
+            Div(cls="font-bold text-sm flex justify-between")(
+                Span("You" if m.sender == "you" else m.sender),
+                Span(m.timestamp, cls="text-xs opacity-70"),
+            ),
+            Div(search_preview(m.message, query), cls="text-sm"),
+        )
+        for m in matches
+    ]
+    return (
+        *results,
+        Div(summary, id="search-results", hx_swap_oob="true", cls="text-sm text-info font-bold mt-1"),
+    )
+
+
 # Handle the form submission
 @app.post("/messages/send")
 def send(msg: str, interlocutor: str, messages: list[str] = None):
@@ -641,7 +736,7 @@ def send(msg: str, interlocutor: str, messages: list[str] = None):
         messages = []
     messages.append(msg.rstrip())
     current_time = datetime.now().strftime("%b %d, %I:%M %p")
-    add_new_message_to_history(interlocutor, msg.rstrip(), "you", current_time)
+    seq = add_new_message_to_history(interlocutor, msg.rstrip(), "you", current_time)
 
     if interlocutor == 'Bob':
         r = "Yes, let's play on Saturday!"
@@ -649,11 +744,11 @@ def send(msg: str, interlocutor: str, messages: list[str] = None):
         r = "Yes, I want to play badminton!"
     else:
         r = random.choice(["I'm a bot!", "I'm a human!", "What's up?", "The stock market is crazy today!"])
-    add_new_message_to_history(interlocutor, r, interlocutor, current_time)
+    reply_seq = add_new_message_to_history(interlocutor, r, interlocutor, current_time)
     return (
         Div(
-            ChatMessage(msg, "you", current_time),
-            ChatMessage(r.rstrip(), interlocutor, current_time),
+            ChatMessage(msg, "you", current_time, seq),
+            ChatMessage(r.rstrip(), interlocutor, current_time, reply_seq),
             _="on load call scrollToBottom()",
         ),
         ChatInput(),
@@ -667,18 +762,16 @@ def get_message_routes():
 @app.get("/messages_all")
 def get_all():
     """Used for rewards"""
-    entries = []
-
-    for history in message_history_db():
-        history_dict = history.__dict__
-        new_dict = {"user": history_dict["user"]}
-        
-        history_dict["messages"] = ast.literal_eval(history_dict["messages"])
-        history_dict["senders"] = ast.literal_eval(history_dict["senders"])
-        history_dict["timestamps"] = ast.literal_eval(history_dict["timestamps"])
-
-        new_dict["messages"] = list(zip(history_dict["messages"], history_dict["senders"], history_dict["timestamps"]))
-        entries.append(new_dict)
+    entries = {}
+    rows = messages_readonly_db.q(
+        "SELECT c.user, m.message, m.sender, m.timestamp FROM conversation c "
+        "LEFT JOIN message m ON m.conversation = c.user ORDER BY c.rowid, m.seq"
+    )
+    for row in rows:
+        entry = entries.setdefault(row["user"], {"user": row["user"], "messages": []})
+        if row["message"] is not None:
+            entry["messages"].append((row["message"], row["sender"], row["timestamp"]))
+    entries = list(entries.values())
     try:
         json_entries = json.dumps(entries)
     except Exception as e:
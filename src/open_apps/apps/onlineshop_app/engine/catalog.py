@@ -0,0 +1,487 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+"""
+Preprocessed product catalog.
+
+`load_products` parses the raw scraped JSON files, regex-parses every price
+and rebuilds the options of every product, on every start of the shop.
+`build_catalog` runs it once, offline, and saves the result as one binary
+file that `load_catalog` maps into memory in milliseconds:
+
+    header      magic, format version, product count, metadata length
+    metadata    JSON: build parameters, source file signatures and the
+                sorted attribute, category and query values
+    asins       fixed-width ASIN table, in catalog order
+    sorted      the same ASINs sorted, for binary search
+    positions   uint32 catalog position of each sorted ASIN
+    prices      two float64 columns: low and high price (NaN for one price)
+    offsets     uint64 offset of every record, plus the end of the last one
+    postings    uint64 offset of the posting list of every attribute, then
+                every category, then every query, plus the end; then the
+                lists: sorted uint32 catalog positions
+    records     one JSON object per product, as returned by `load_products`
+
+Sections start at 8-byte boundaries.
+
+The file is mapped read-only, so every shop process on a node shares one
+copy of it in the page cache. A process only keeps what the mapping cannot
+hold: its price draws (8 bytes a product), the metadata, and a bounded
+cache of decoded product records. Lookups by ASIN binary-search the sorted
+table in place.
+
+Rebuild the catalog after changing the product files:
+
+    python -m open_apps.apps.onlineshop_app.engine.catalog
+
+`ensure_catalog` does so automatically when the catalog is missing or out
+of date; processes starting together build it only once.
+"""
+import argparse
+import bisect
+import fcntl
+import json
+import math
+import mmap
+import os
+import random
+import struct
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping, Sequence
+from os.path import join
+
+from .engine import (
+    BASE_DIR,
+    DEFAULT_ATTR_PATH,
+    DEFAULT_FILE_PATH,
+    HUMAN_ATTR_PATH,
+    ProductIndex,
+    load_products,
+)
+
+DEFAULT_CATALOG_PATH = join(BASE_DIR, '../data/catalog.bin')
+
+MAGIC = b'OACATLG\x00'
+CATALOG_VERSION = 3
+POSTING_FIELDS = ('attribute', 'category', 'query')
+ASIN_WIDTH = 10  # load_products drops longer ASINs
+PRODUCT_CACHE_SIZE = 4096  # decoded product records kept per process
+_HEADER = struct.Struct('<8sIIQ')  # magic, version, count, metadata length
+
+
+class CatalogError(Exception):
+    """The catalog file is missing, malformed or out of date."""
+
+
+def align(offset):
+    """`offset` rounded up to the next section boundary (8 bytes)."""
+    return (offset + 7) & ~7
+
+
+def source_signature(paths):
+    """Size and modification time of each source file, by file name."""
+    signature = {}
+    for path in paths:
+        stat = os.stat(path)
+        signature[os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def build_catalog(
+        output=DEFAULT_CATALOG_PATH,
+        filepath=DEFAULT_FILE_PATH,
+        num_products=None,
+        human_goals=True,
+        attr_path=DEFAULT_ATTR_PATH,
+        human_attr_path=HUMAN_ATTR_PATH,
+    ):
+    """Write the catalog of the products in `filepath` to `output`.
+
+    Returns the number of products written.
+    """
+    all_products, _, _, attribute_to_asins = load_products(
+        filepath,
+        num_products=num_products,
+        human_goals=human_goals,
+        attr_path=attr_path,
+        human_attr_path=human_attr_path,
+    )
+    count = len(all_products)
+    asins = [product['asin'] for product in all_products]
+    for asin in asins:
+        if len(asin.encode()) > ASIN_WIDTH:
+            raise CatalogError(f'ASIN {asin!r} is longer than {ASIN_WIDTH} bytes')
+    position = {asin: i for i, asin in enumerate(asins)}
+    postings_by_field = {field: defaultdict(list) for field in POSTING_FIELDS}
+    for attribute, attribute_asins in attribute_to_asins.items():
+        postings_by_field['attribute'][attribute] = sorted(position[a] for a in attribute_asins)
+    for i, product in enumerate(all_products):
+        for field in ('category', 'query'):
+            # values that are not strings can never match a filter
+            if isinstance(product[field], str):
+                postings_by_field[field][product[field]].append(i)
+    keys = {field: sorted(postings_by_field[field]) for field in POSTING_FIELDS}
+
+    sources = [filepath, attr_path] + ([human_attr_path] if human_goals else [])
+    metadata = json.dumps({
+        'num_products': num_products,
+        'human_goals': human_goals,
+        'sources': source_signature(sources),
+        'keys': keys,
+    }).encode()
+
+    records, offsets = [], [0]
+    for product in all_products:
+        record = json.dumps(product, separators=(',', ':')).encode()
+        records.append(record)
+        offsets.append(offsets[-1] + len(record))
+    postings, posting_offsets = array('I'), [0]
+    for field in POSTING_FIELDS:
+        for key in keys[field]:
+            postings.extend(postings_by_field[field][key])
+            posting_offsets.append(len(postings) * 4)
+    pricing = [product['pricing'] for product in all_products]
+
+    def table(values):
+        return b''.join(value.encode().ljust(ASIN_WIDTH, b'\x00') for value in values)
+
+    def pad(f):
+        f.write(b'\x00' * (align(f.tell()) - f.tell()))
+
+    tmp_path = f'{output}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, CATALOG_VERSION, count, len(metadata)))
+        f.write(metadata)
+        pad(f)
+        f.write(table(asins))
+        pad(f)
+        by_asin = sorted(range(count), key=asins.__getitem__)
+        f.write(table(asins[i] for i in by_asin))
+        pad(f)
+        f.write(array('I', by_asin).tobytes())
+        pad(f)
+        f.write(array('d', [p[0] for p in pricing]).tobytes())
+        f.write(array('d', [p[1] if len(p) > 1 else math.nan for p in pricing]).tobytes())
+        f.write(array('Q', offsets).tobytes())
+        f.write(array('Q', posting_offsets).tobytes())
+        f.write(postings.tobytes())
+        pad(f)
+        for record in records:
+            f.write(record)
+    os.replace(tmp_path, output)
+    return count
+
+
+class AsinTable(Sequence):
+    """A fixed-width ASIN table inside a mapped file (the catalog, or the
+    BM25 index of engine/search.py)."""
+
+    def __init__(self, buf, offset, count):
+        self._buf, self._offset, self._count = buf, offset, count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(self._count)[i]]
+        i = range(self._count)[i]
+        start = self._offset + i * ASIN_WIDTH
+        return self._buf[start:start + ASIN_WIDTH].rstrip(b'\x00').decode()
+
+
+class Catalog:
+    """Read-only view of a catalog file."""
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH, cache_size=PRODUCT_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._views = []
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise CatalogError(f'{path} is empty')
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _view(self, offset, count, fmt):
+        view = memoryview(self._mmap)[offset:offset + count * struct.calcsize(fmt)].cast(fmt)
+        self._views.append(view)
+        return view
+
+    def _parse(self):
+        buf = self._mmap
+        if len(buf) < _HEADER.size:
+            raise CatalogError(f'{self.path} is not a product catalog')
+        magic, version, count, metadata_length = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise CatalogError(f'{self.path} is not a product catalog')
+        if version != CATALOG_VERSION:
+            raise CatalogError(
+                f'{self.path} has catalog format {version}, expected {CATALOG_VERSION}'
+            )
+        offset = _HEADER.size
+        self.metadata = json.loads(buf[offset:offset + metadata_length])
+        self.keys = self.metadata['keys']
+        self._key_base, key_count = {}, 0
+        for field in POSTING_FIELDS:
+            self._key_base[field] = key_count
+            key_count += len(self.keys[field])
+        offset = align(offset + metadata_length)
+
+        self.asins = AsinTable(buf, offset, count)
+        offset = align(offset + count * ASIN_WIDTH)
+        self._sorted_asins = AsinTable(buf, offset, count)
+        offset = align(offset + count * ASIN_WIDTH)
+        self._sorted_positions = self._view(offset, count, 'I')
+        offset = align(offset + count * 4)
+        self._low = self._view(offset, count, 'd')
+        self._high = self._view(offset + count * 8, count, 'd')
+        offset += count * 16
+        self._offsets = self._view(offset, count + 1, 'Q')
+        offset += (count + 1) * 8
+        self._posting_offsets = self._view(offset, key_count + 1, 'Q')
+        self._postings_start = offset + (key_count + 1) * 8
+        self._records_start = align(self._postings_start + self._posting_offsets[-1])
+        if self._records_start + self._offsets[-1] > len(buf):
+            raise CatalogError(f'{self.path} is truncated')
+
+    def __len__(self):
+        return len(self.asins)
+
+    def position(self, asin):
+        """Catalog position of `asin`; KeyError if it is not in the catalog."""
+        i = bisect.bisect_left(self._sorted_asins, asin)
+        if i == len(self) or self._sorted_asins[i] != asin:
+            raise KeyError(asin)
+        return self._sorted_positions[i]
+
+    def pricing(self, i):
+        high = self._high[i]
+        return [self._low[i]] if math.isnan(high) else [self._low[i], high]
+
+    def record_bytes(self, i):
+        """The i-th product record, undecoded."""
+        start = self._records_start + self._offsets[i]
+        return self._mmap[start:self._records_start + self._offsets[i + 1]]
+
+    def product(self, i):
+        """The i-th product record, decoded on first access."""
+        with self._lock:
+            product = self._cache.get(i)
+            if product is not None:
+                self._cache.move_to_end(i)
+                return product
+        product = json.loads(self.record_bytes(i))
+        with self._lock:
+            # keep the copy another thread may have stored meanwhile
+            product = self._cache.setdefault(i, product)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return product
+
+    def positions(self, field, value):
+        """Sorted catalog positions of the products whose `field` (attribute,
+        category or query) is, or for attributes includes, `value`."""
+        keys = self.keys[field]
+        i = bisect.bisect_left(keys, value)
+        if i == len(keys) or keys[i] != value:
+            return array('I')
+        i += self._key_base[field]
+        start = self._postings_start + self._posting_offsets[i]
+        end = self._postings_start + self._posting_offsets[i + 1]
+        return array('I', self._mmap[start:end])
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+
+class CatalogProducts(Sequence):
+    """`all_products` backed by a catalog."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.catalog.product(i) for i in range(len(self.catalog))[index]]
+        return self.catalog.product(range(len(self.catalog))[index])
+
+
+class CatalogProductDict(Mapping):
+    """`product_item_dict` backed by a catalog."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __getitem__(self, asin):
+        return self.catalog.product(self.catalog.position(asin))
+
+    def __contains__(self, asin):
+        try:
+            self.catalog.position(asin)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.catalog.asins)
+
+    def __len__(self):
+        return len(self.catalog)
+
+
+class CatalogPrices(Mapping):
+    """`product_prices` backed by a catalog: this process's price draws."""
+
+    def __init__(self, catalog, prices):
+        self.catalog = catalog
+        self.prices = prices
+
+    def __getitem__(self, asin):
+        return self.prices[self.catalog.position(asin)]
+
+    def __iter__(self):
+        return iter(self.catalog.asins)
+
+    def __len__(self):
+        return len(self.catalog)
+
+
+class CatalogAttributes(Mapping):
+    """`attribute_to_asins` backed by a catalog.
+
+    Like the defaultdict it replaces, unknown attributes map to no ASINs.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __getitem__(self, attribute):
+        asins = self.catalog.asins
+        return {asins[i] for i in self.catalog.positions('attribute', attribute)}
+
+    def __contains__(self, attribute):
+        return len(self.catalog.positions('attribute', attribute)) > 0
+
+    def __iter__(self):
+        return iter(self.catalog.keys['attribute'])
+
+    def __len__(self):
+        return len(self.catalog.keys['attribute'])
+
+
+class CatalogProductIndex(ProductIndex):
+    """`ProductIndex` over a catalog: the postings are in the mapped file."""
+
+    def __init__(self, catalog, product_prices):
+        self.asins = catalog.asins
+        self.catalog = catalog
+        self._prices = product_prices.prices
+        self._by_price = None
+
+    def positions(self, field, value):
+        return self.catalog.positions(field, value)
+
+
+def load_catalog(
+        path=DEFAULT_CATALOG_PATH,
+        num_products=None,
+        human_goals=True,
+        sources=(DEFAULT_FILE_PATH, DEFAULT_ATTR_PATH, HUMAN_ATTR_PATH),
+    ):
+    """Drop-in replacement for `load_products` reading a prebuilt catalog.
+
+    Raises CatalogError if the catalog was built with other parameters or
+    from a different version of any of the `sources` that exist.
+    """
+    catalog = Catalog(path)
+    try:
+        metadata = catalog.metadata
+        if (metadata['num_products'], metadata['human_goals']) != (num_products, human_goals):
+            raise CatalogError(
+                f"{path} holds num_products={metadata['num_products']}, "
+                f"human_goals={metadata['human_goals']}"
+            )
+        for source in sources:
+            name = os.path.basename(source)
+            if name in metadata['sources'] and os.path.exists(source):
+                if source_signature([source])[name] != metadata['sources'][name]:
+                    raise CatalogError(f'{path} is older than {source}, rebuild it')
+    except Exception:
+        catalog.close()
+        raise
+
+    # same draws, in the same order, as generate_product_prices
+    prices = array('d')
+    for i in range(len(catalog)):
+        pricing = catalog.pricing(i)
+        prices.append(pricing[0] if len(pricing) == 1 else random.uniform(*pricing))
+    return (
+        CatalogProducts(catalog),
+        CatalogProductDict(catalog),
+        CatalogPrices(catalog, prices),
+        CatalogAttributes(catalog),
+    )
+
+
+def ensure_catalog(
+        path=DEFAULT_CATALOG_PATH,
+        filepath=DEFAULT_FILE_PATH,
+        num_products=None,
+        human_goals=True,
+        attr_path=DEFAULT_ATTR_PATH,
+        human_attr_path=HUMAN_ATTR_PATH,
+    ):
+    """`load_catalog`, building the catalog first if it is missing or stale.
+
+    The build holds an exclusive lock on `<path>.lock`: processes that find
+    the catalog out of date at the same time wait for the first one to
+    rebuild it, then map the new file.
+    """
+    sources = (filepath, attr_path, human_attr_path)
+    try:
+        return load_catalog(path, num_products, human_goals, sources)
+    except (FileNotFoundError, CatalogError):
+        pass
+    with open(f'{path}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                return load_catalog(path, num_products, human_goals, sources)
+            except (FileNotFoundError, CatalogError):
+                pass
+            build_catalog(path, filepath, num_products, human_goals, attr_path, human_attr_path)
+            return load_catalog(path, num_products, human_goals, sources)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the onlineshop product catalog.')
+    parser.add_argument('--source', default=DEFAULT_FILE_PATH, help='products JSON file')
+    parser.add_argument('--output', default=DEFAULT_CATALOG_PATH)
+    parser.add_argument('--num-products', type=int, default=None)
+    args = parser.parse_args()
+    count = build_catalog(args.output, args.source, num_products=args.num_products)
+    print(f'Wrote {count} products to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -15,10 +15,11 @@ from ast import literal_eval
 from decimal import Decimal
 import sys
 
-from tqdm import tqdm
 import bisect
 import hashlib
 import logging
+import threading
+from collections import OrderedDict
 from os.path import dirname, abspath, join
 
 # Add the project root to Python path
@@ -41,6 +42,7 @@ HUMAN_ATTR_PATH = join(BASE_DIR, '../data/items_human_ins.json')
 
 SEARCH_RETURN_N = 50
 PRODUCT_WINDOW = 10
+SEARCH_CACHE_SIZE = 256  # queries whose ranked results are kept
 TOP_K_ATTR = 10
 
 END_BUTTON = 'Buy Now'
@@ -56,15 +58,113 @@ ACTION_TO_TEMPLATE = {
 }
 
 
+# filter markers of search queries, e.g. `<c>,beauty,<a>,fresh scent,<p>,10,50`
+FILTERS = {'<a>': 'attribute', '<c>': 'category', '<q>': 'query', '<p>': 'price'}
+
+
+def _price_bound(token):
+    try:
+        return float(token)
+    except ValueError:
+        return None  # '' or '*': unbounded
+
+
+def parse_filters(keywords):
+    """[(field, value)] of the filters in a query; a price value is a
+    (low, high) pair with None for no bound."""
+    segments = []
+    for token in keywords:
+        if token in FILTERS:
+            segments.append((FILTERS[token], []))
+        elif segments:
+            segments[-1][1].append(token)
+    filters = []
+    for field, tokens in segments:
+        if field == 'price':
+            bounds = [_price_bound(token.strip()) for token in tokens[:2]]
+            value = tuple(bounds + [None] * (2 - len(bounds)))
+        elif field == 'category':
+            value = tokens[0].strip() if tokens else ''
+        else:
+            value = ' '.join(tokens).strip()
+        filters.append((field, value))
+    return filters
+
+
+class ProductIndex:
+    """Inverted indexes over `all_products`, for filtered searches.
+
+    Postings are sorted positions in `all_products`, per attribute,
+    category and query, so a filtered search costs the size of its result
+    instead of a scan of the catalog. Several filters intersect, smallest
+    first. Positions by price are sorted on the first price filter.
+    """
+
+    def __init__(self, all_products, product_prices):
+        self.asins = [p['asin'] for p in all_products]
+        self._postings = {field: defaultdict(list) for field in ('attribute', 'category', 'query')}
+        for i, p in enumerate(all_products):
+            self._postings['category'][p['category']].append(i)
+            self._postings['query'][p['query']].append(i)
+            for attribute in set(p['Attributes']):
+                self._postings['attribute'][attribute].append(i)
+        self._prices = [product_prices[asin] for asin in self.asins]
+        self._by_price = None
+
+    def positions(self, field, value):
+        return self._postings[field].get(value, [])
+
+    def price_range(self, low=None, high=None):
+        """Sorted positions of the products priced from `low` to `high`."""
+        if self._by_price is None:
+            order = sorted(range(len(self._prices)), key=self._prices.__getitem__)
+            self._by_price = (order, [self._prices[i] for i in order])
+        order, prices = self._by_price
+        start = 0 if low is None else bisect.bisect_left(prices, low)
+        end = len(prices) if high is None else bisect.bisect_right(prices, high)
+        return sorted(order[start:end])
+
+    def filter(self, filters):
+        """Sorted positions of the products that pass all `filters`."""
+        if not filters:
+            return []
+        postings = [
+            self.price_range(*value) if field == 'price' else self.positions(field, value)
+            for field, value in filters
+        ]
+        postings.sort(key=len)
+        result = list(postings[0])
+        for other in postings[1:]:
+            result = [i for i in result if _contains(other, i)]
+        return result
+
+
+def _contains(sorted_positions, i):
+    j = bisect.bisect_left(sorted_positions, i)
+    return j < len(sorted_positions) and sorted_positions[j] == i
+
+
+def build_product_index(all_products, product_prices):
+    """The `ProductIndex` of products from `load_products` or `load_catalog`."""
+    catalog = getattr(all_products, 'catalog', None)
+    if catalog is not None:
+        from .catalog import CatalogProductIndex
+        return CatalogProductIndex(catalog, product_prices)
+    return ProductIndex(all_products, product_prices)
+
+
 def get_top_n_product_from_keywords(
         keywords,
         search_engine,
         all_products,
         product_item_dict,
         attribute_to_asins=None,
+        product_index=None,
     ):
-    if keywords[0] == '<r>':
-        top_n_products = random.sample(all_products, k=SEARCH_RETURN_N)
+    if product_index is not None and keywords[0] in FILTERS:
+        top_n_products = [all_products[i] for i in product_index.filter(parse_filters(keywords))]
+    elif keywords[0] == '<r>':
+        top_n_products = random.sample(all_products, k=min(SEARCH_RETURN_N, len(all_products)))
     elif keywords[0] == '<a>':
         attribute = ' '.join(keywords[1:]).strip()
         asins = attribute_to_asins[attribute]
@@ -77,9 +177,7 @@ def get_top_n_product_from_keywords(
         top_n_products = [p for p in all_products if p['query'] == query]
     else:
         keywords = ' '.join(keywords)
-        hits = search_engine.search(keywords, k=SEARCH_RETURN_N)
-        docs = [search_engine.doc(hit.docid) for hit in hits]
-        top_n_asins = [json.loads(doc.raw())['id'] for doc in docs]
+        top_n_asins = search_engine.search_asins(keywords, k=SEARCH_RETURN_N)
         top_n_products = [product_item_dict[asin] for asin in top_n_asins if asin in product_item_dict]
     return top_n_products
 
@@ -88,6 +186,65 @@ def get_product_per_page(top_n_products, page):
     return top_n_products[(page - 1) * PRODUCT_WINDOW:page * PRODUCT_WINDOW]
 
 
+def search_cache_key(keywords):
+    """Queries that search the same: the filters compare exactly, free text
+    is lowercased and whitespace-collapsed like the search analyzer sees it."""
+    if keywords[0] in FILTERS:
+        return tuple(keywords)
+    return ' '.join(' '.join(keywords).lower().split())
+
+
+class SearchResultCache:
+    """LRU of the ranked ASINs of recent queries.
+
+    All result pages of a query are slices of one cached list, so paging
+    through results runs the search once. Random (`<r>`) results are never
+    cached.
+    """
+
+    def __init__(self, maxsize=SEARCH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ranked_asins(
+            self,
+            keywords,
+            search_engine,
+            all_products,
+            product_item_dict,
+            attribute_to_asins=None,
+            product_index=None,
+        ):
+        if keywords[0] == '<r>':
+            key = None
+        else:
+            key = search_cache_key(keywords)
+            with self._lock:
+                asins = self._results.get(key)
+                if asins is not None:
+                    self._results.move_to_end(key)
+                    return asins
+        if product_index is not None and keywords[0] in FILTERS:
+            # no need to look the products up
+            positions = product_index.filter(parse_filters(keywords))
+            asins = tuple(product_index.asins[i] for i in positions)
+        else:
+            asins = tuple(p['asin'] for p in get_top_n_product_from_keywords(
+                keywords, search_engine, all_products, product_item_dict, attribute_to_asins
+            ))
+        if key is not None:
+            with self._lock:
+                self._results[key] = asins
+                if len(self._results) > self.maxsize:
+                    self._results.popitem(last=False)
+        return asins
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
 def generate_product_prices(all_products):
     product_prices = dict()
     for product in all_products:
@@ -103,7 +260,8 @@ def generate_product_prices(all_products):
     return product_prices
 
 
-def init_search_engine(num_products=None):
+def init_search_engine(num_products=None, backend='lucene'):
+    """The search backend ('lucene' or 'bm25') over the index for `num_products`."""
     if num_products == 100:
         indexes = 'indexes_100'
     elif num_products == 1000:
@@ -114,9 +272,12 @@ def init_search_engine(num_products=None):
         indexes = 'indexes'
     else:
         raise NotImplementedError(f'num_products being {num_products} is not supported yet.')
-    from pyserini.search.lucene import LuceneSearcher
-    search_engine = LuceneSearcher(os.path.join(BASE_DIR, f'../search_engine/{indexes}'))
-    return search_engine
+    from .search import BM25Backend, LuceneBackend
+    if backend == 'bm25':
+        return BM25Backend(os.path.join(BASE_DIR, f'../search_engine/{indexes}_bm25.bin'))
+    if backend == 'lucene':
+        return LuceneBackend(os.path.join(BASE_DIR, f'../search_engine/{indexes}'))
+    raise ValueError(f"Unknown search backend {backend!r}, expected 'lucene' or 'bm25'")
 
 
 def clean_product_keys(products):
@@ -138,8 +299,15 @@ def clean_product_keys(products):
     return products
 
 
-def load_products(filepath, num_products=None, human_goals=True):
-    # TODO: move to preprocessing step -> enforce single source of truth
+def load_products(
+        filepath,
+        num_products=None,
+        human_goals=True,
+        attr_path=DEFAULT_ATTR_PATH,
+        human_attr_path=HUMAN_ATTR_PATH,
+    ):
+    # engine/catalog.py runs this once offline and saves the result; the
+    # app only calls it directly when no up-to-date catalog exists
     with open(filepath) as f:
         products = json.load(f)
     products = clean_product_keys(products)
@@ -153,12 +321,10 @@ def load_products(filepath, num_products=None, human_goals=True):
     #     all_ratings[r['asin']] = r['average_rating']
 
     if human_goals:
-        with open(HUMAN_ATTR_PATH) as f:
+        with open(human_attr_path) as f:
             human_attributes = json.load(f)
-    with open(DEFAULT_ATTR_PATH) as f:
+    with open(attr_path) as f:
         attributes = json.load(f)
-    with open(HUMAN_ATTR_PATH) as f:
-        human_attributes = json.load(f)
 
     asins = set()
     all_products = []
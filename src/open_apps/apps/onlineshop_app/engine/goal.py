@@ -7,11 +7,16 @@ LICENSE file in the root directory of this source tree.
 """
 Functions for specifying goals and reward calculations.
 """
+import bisect
 import itertools
+import math
 import os
 import sys
 import random
-from collections import defaultdict
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Sequence
+from functools import lru_cache
 from thefuzz import fuzz
 src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../'))
 if src_path not in sys.path:
@@ -20,6 +25,10 @@ if src_path not in sys.path:
 from open_apps.apps.onlineshop_app.engine.normalize import normalize_color
 
 PRICE_RANGE = [10.0 * i for i in range(1, 100)]
+NOUN_POS = ('PNOUN', 'NOUN', 'PROPN')
+NOUN_CACHE_SIZE = 100000  # parsed product and goal names, per spaCy pipeline
+FUZZ_CACHE_SIZE = 100000  # scored (product attribute, goal attribute) pairs
+TEXT_CACHE_SIZE = 10000  # lowercased product text fields
 
 def get_goals(all_products, product_prices, human_goals=True):
     if human_goals:
@@ -73,66 +82,182 @@ def get_human_goals(all_products, product_prices):
     return goals
 
 
-def get_synthetic_goals(all_products, product_prices):
-    goals = []
-    cnt_atts = defaultdict(int)
-    for product in all_products:
-        if ('instruction_text' not in product or 
-            product['instruction_text'] is None):
-            continue
-        product_goals = []        
-        asin = product['asin']
-        attributes = product['instruction_attributes']
-        assert len(attributes) > 0
-
-        if product_prices is not None:
-            price = product_prices[asin]
-            price_range = [p for p in PRICE_RANGE if p > price][:4]
-            if len(price_range) >= 2:
-                _, price_upper = sorted(random.sample(price_range, 2))
-                price_text = \
-                    f', and price lower than {price_upper:.2f} dollars'
+class SyntheticGoalIndex(Sequence):
+    """The goals of every option combination of every product, made on access.
+
+    A product with options `color` x `size` has one goal per combination,
+    which quickly adds up to far more goals than products. Only the option
+    space of each product is kept: the k-th goal is decoded from it when
+    asked for, in the order `itertools.product` over the sorted option names
+    would give. Goal weights come from how many goals have each attribute.
+    """
+
+    def __init__(self, all_products, product_prices):
+        self._products = []
+        self._offsets = [0]
+        cnt_atts = defaultdict(int)
+        for product in all_products:
+            if ('instruction_text' not in product or
+                product['instruction_text'] is None):
+                continue
+            asin = product['asin']
+            attributes = product['instruction_attributes']
+            assert len(attributes) > 0
+
+            if product_prices is not None:
+                price = product_prices[asin]
+                price_range = [p for p in PRICE_RANGE if p > price][:4]
+                if len(price_range) >= 2:
+                    _, price_upper = sorted(random.sample(price_range, 2))
+                    price_text = \
+                        f', and price lower than {price_upper:.2f} dollars'
+                else:
+                    price_upper = 1000000
+                    price_text = ''
             else:
                 price_upper = 1000000
                 price_text = ''
-        else:
-            price_upper = 1000000
-            price_text = ''
-
-        instruction_text = product['instruction_text']
 
-        options = product['options']
-        option_names = sorted(options)
-        combinations = list(itertools.product(
-            *(options[option_name] for option_name in option_names)
-        ))
-        for combination in combinations:
-            goal_options = dict()
-            for i, o in enumerate(combination):
-#                option_text.append(f'{option_names[i]}: {o}')
-                goal_options[option_names[i]] = o
-            option_text = ', and '.join([
-                f'{k}: {v}' for k, v in goal_options.items()
-            ])
-            option_text = ' with ' + option_text if option_text else ''
-            product_goals.append({
-                'asin': asin,
-                'category': product['category'],
-                'query': product['query'],
-                'name': product['name'],
-                'product_category': product['product_category'],
-                'instruction_text': f'{instruction_text}{option_text}{price_text}',
-                'attributes': attributes,
+            options = product['options']
+            option_names = sorted(options)
+            option_values = [list(options[name]) for name in option_names]
+            count = math.prod(len(values) for values in option_values)
+            if count == 0:
+                continue
+            self._products.append({
+                'product': product,
                 'price_upper': price_upper,
-                'goal_options': goal_options,
-                'name': product['Title'],
+                'price_text': price_text,
+                'option_names': option_names,
+                'option_values': option_values,
             })
+            self._offsets.append(self._offsets[-1] + count)
             for att in attributes:
-                cnt_atts[att] += 1
-        goals += product_goals
-    for goal in goals:
-        goal['weight'] = sum(1. / cnt_atts[att] for att in goal['attributes']) / len(goal['attributes'])
-    return goals
+                cnt_atts[att] += count
+
+        # every goal of a product has the same weight
+        self._weights = [
+            sum(1. / cnt_atts[att] for att in entry['product']['instruction_attributes'])
+            / len(entry['product']['instruction_attributes'])
+            for entry in self._products
+        ]
+        self._cum_weights = list(itertools.accumulate(
+            weight * (end - start) for weight, start, end
+            in zip(self._weights, self._offsets, self._offsets[1:])
+        ))
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self[i] for i in range(*k.indices(len(self)))]
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('goal index out of range')
+        i = bisect.bisect_right(self._offsets, k) - 1
+        return self._goal(i, k - self._offsets[i])
+
+    def _goal(self, i, j):
+        entry = self._products[i]
+        product = entry['product']
+        # mixed radix, the last option varying fastest like itertools.product
+        combination = []
+        for values in reversed(entry['option_values']):
+            j, digit = divmod(j, len(values))
+            combination.append(values[digit])
+        goal_options = dict(zip(entry['option_names'], reversed(combination)))
+        option_text = ', and '.join([
+            f'{k}: {v}' for k, v in goal_options.items()
+        ])
+        option_text = ' with ' + option_text if option_text else ''
+        return {
+            'asin': product['asin'],
+            'category': product['category'],
+            'query': product['query'],
+            'name': product['Title'],
+            'product_category': product['product_category'],
+            'instruction_text': f"{product['instruction_text']}{option_text}{entry['price_text']}",
+            'attributes': product['instruction_attributes'],
+            'price_upper': entry['price_upper'],
+            'goal_options': goal_options,
+            'weight': self._weights[i],
+        }
+
+    def sample(self, k=1, weighted=False, rng=random):
+        """k goals drawn at random: distinct and uniform, or by their weight
+        (with replacement) if `weighted`."""
+        if not weighted:
+            return [self[i] for i in rng.sample(range(len(self)), k)]
+        goals = []
+        for _ in range(k):
+            i = bisect.bisect_right(self._cum_weights, rng.random() * self._cum_weights[-1])
+            i = min(i, len(self._products) - 1)
+            goals.append(self._goal(i, rng.randrange(self._offsets[i + 1] - self._offsets[i])))
+        return goals
+
+
+def get_synthetic_goals(all_products, product_prices):
+    return SyntheticGoalIndex(all_products, product_prices)
+
+
+class NounParser:
+    """The lowercased nouns of names, parsed once by a spaCy pipeline.
+
+    Rewards compare the nouns of product and goal names, and the same names
+    come back episode after episode, so parses are memoized (LRU).
+    `prime` parses the names not seen yet in batches with `nlp.pipe`.
+    """
+
+    def __init__(self, nlp, maxsize=NOUN_CACHE_SIZE):
+        self.nlp = nlp
+        self.maxsize = maxsize
+        self._nouns = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _parse_nouns(doc):
+        return tuple(t.text.lower() for t in doc if t.pos_ in NOUN_POS)
+
+    def _store(self, text, nouns):
+        with self._lock:
+            self._nouns[text] = nouns
+            self._nouns.move_to_end(text)
+            while len(self._nouns) > self.maxsize:
+                self._nouns.popitem(last=False)
+
+    def nouns(self, text):
+        with self._lock:
+            nouns = self._nouns.get(text)
+            if nouns is not None:
+                self._nouns.move_to_end(text)
+                return nouns
+        nouns = self._parse_nouns(self.nlp(text))
+        self._store(text, nouns)
+        return nouns
+
+    def prime(self, texts, batch_size=256):
+        with self._lock:
+            missing = list(dict.fromkeys(t for t in texts if t not in self._nouns))
+        for text, doc in zip(missing, self.nlp.pipe(missing, batch_size=batch_size)):
+            self._store(text, self._parse_nouns(doc))
+
+
+_noun_parsers = {}
+_noun_parsers_lock = threading.Lock()
+
+
+def get_noun_parser(nlp):
+    """The shared NounParser of a spaCy pipeline."""
+    if isinstance(nlp, NounParser):
+        return nlp
+    with _noun_parsers_lock:
+        # keyed by id, and holding on to the pipeline so the id stays its own
+        entry = _noun_parsers.get(id(nlp))
+        if entry is None or entry[0] is not nlp:
+            entry = _noun_parsers[id(nlp)] = (nlp, NounParser(nlp))
+        return entry[1]
 
 
 def get_type_reward(purchased_product, goal, nlp):
@@ -148,11 +273,9 @@ def get_type_reward(purchased_product, goal, nlp):
     purchased_type = purchased_product['name']
     desired_type = goal['name']
 
-    purchased_type_parse = nlp(purchased_type)
-    desired_type_parse = nlp(desired_type)
-
-    purchased_type_parse = [t.text.lower() for t in purchased_type_parse if t.pos_ in ('PNOUN', 'NOUN', 'PROPN')]
-    desired_type_parse = [t.text.lower() for t in desired_type_parse if t.pos_ in ('PNOUN', 'NOUN', 'PROPN')]
+    parser = get_noun_parser(nlp)
+    purchased_type_parse = parser.nouns(purchased_type)
+    desired_type_parse = parser.nouns(desired_type)
 
     n_intersect_type = len(
         set(purchased_type_parse) & set(desired_type_parse)
@@ -183,32 +306,47 @@ def get_type_reward(purchased_product, goal, nlp):
     )
 
 
+@lru_cache(maxsize=FUZZ_CACHE_SIZE)
+def fuzzy_match(a, b):
+    """Whether two attributes or options are the same, allowing for wording."""
+    return fuzz.token_set_ratio(a, b) > 85
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _lowered_text(title, bullet_points, description):
+    return (
+        title.lower(),
+        ' '.join(bullet_points).lower(),
+        description.lower(),
+    )
+
+
+def get_product_text(product):
+    """Lowercased Title, BulletPoints and Description of a product."""
+    return _lowered_text(
+        product['Title'],
+        tuple(product['BulletPoints']),
+        product['Description'],
+    )
+
+
 def get_attribute_reward(purchased_product, goal):
     """Determines whether purchased products shares same attributes as goal"""
     purchased_attrs = purchased_product['Attributes']
     goal_attrs = goal['attributes']
+    product_text = None
 
     num_attr_matches = 0
     for g_attr in goal_attrs:
-        matched = False
         # Check whether goal attribute found in purchased product attribute list
-        for p_attr in purchased_attrs:
-            score = fuzz.token_set_ratio(p_attr, g_attr)
-            if score > 85:
-                num_attr_matches += 1
-                matched = True
-                break
+        if any(fuzzy_match(p_attr, g_attr) for p_attr in purchased_attrs):
+            num_attr_matches += 1
+            continue
         # If not in purchased attrs, check Title, Bullet Points (Features), Desc
-        if (
-            not matched and
-            (
-                g_attr in purchased_product['Title'].lower() or
-                g_attr in ' '.join(purchased_product['BulletPoints']).lower() or
-                g_attr in purchased_product['Description'].lower()
-            )
-        ):
+        if product_text is None:
+            product_text = get_product_text(purchased_product)
+        if any(g_attr in text for text in product_text):
             num_attr_matches += 1
-            matched = True
     
     r_attr = num_attr_matches / len(goal_attrs)
     return r_attr, num_attr_matches
@@ -222,11 +360,8 @@ def get_option_reward(purchased_options, goal_options):
     # Perform fuzzy matching of each purchased option against each goal option
     num_option_matches = 0
     for g_option in goal_options:
-        for p_option in purchased_options:
-            score = fuzz.token_set_ratio(p_option, g_option)
-            if score > 85:
-                num_option_matches += 1
-                break
+        if any(fuzzy_match(p_option, g_option) for p_option in purchased_options):
+            num_option_matches += 1
     
     # Calculate option reward as fraction of goal options hit
     r_option = num_option_matches / len(goal_options) if len(goal_options) > 0 else None
@@ -275,3 +410,24 @@ def get_reward(purchased_product, goal, price, options, nlp, **kwargs):
             info['w_price'] = 1 / (len(goal['attributes']) + len(goal['goal_options']) + 1)
         return total_reward, info
     return total_reward
+
+
+def get_rewards(purchases, nlp, batch_size=256, **kwargs):
+    """`get_reward` of many (purchased_product, goal, price, options) at once.
+
+    The product and goal names are parsed together with `nlp.pipe` first,
+    which is much faster than parsing them one by one.
+    """
+    purchases = list(purchases)
+    parser = get_noun_parser(nlp)
+    parser.prime(
+        itertools.chain.from_iterable(
+            (purchased_product['name'], goal['name'])
+            for purchased_product, goal, _, _ in purchases
+        ),
+        batch_size=batch_size,
+    )
+    return [
+        get_reward(purchased_product, goal, price, options, parser, **kwargs)
+        for purchased_product, goal, price, options in purchases
+    ]
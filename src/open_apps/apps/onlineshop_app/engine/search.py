@@ -0,0 +1,496 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+"""
+Product search backends.
+
+`get_top_n_product_from_keywords` only needs the ASINs of the best matches
+for a query, so any `SearchBackend` can serve it:
+
+  - `LuceneBackend`: pyserini's LuceneSearcher over the indexes that
+    `run_indexing.sh` builds. Needs pyserini and Java 21.
+  - `BM25Backend`: the same ranking, in process. Its index is built from the
+    documents that `convert_product_file_format.py` writes, and
+    is a single file that is mapped read-only, in the layout of the product
+    catalog (see catalog.py):
+
+        header      magic, format version, document count, term count,
+                    metadata length
+        metadata    JSON: source signature, average document length
+        ids         fixed-width ASIN table, in document order
+        norms       uint8 encoded length of every document
+        terms       uint64 offset of every term, plus the end, then the
+                    sorted terms, newline-separated
+        postings    CSR matrix of term frequencies, one row per term:
+                    uint64 row pointers, then uint32 document numbers and
+                    uint32 frequencies
+
+Text is analyzed like Lucene's English analyzer (standard tokenizer,
+possessive and stop word removal, Porter stemmer), and documents are scored
+with Lucene's BM25, document length encoding included, so the two backends
+rank alike. Build an index with
+
+    python -m open_apps.apps.onlineshop_app.engine.search \\
+        --documents resources_1k --output indexes_1k_bm25.bin
+"""
+import argparse
+import bisect
+import glob
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+
+from .catalog import ASIN_WIDTH, AsinTable, CatalogError, align, source_signature
+
+MAGIC = b'OABM25\x00\x00'
+INDEX_VERSION = 1
+_HEADER = struct.Struct('<8sIIIQ')  # magic, version, documents, terms, metadata length
+
+# pyserini's defaults
+BM25_K1 = 0.9
+BM25_B = 0.4
+
+# Lucene's EnglishAnalyzer.ENGLISH_STOP_WORDS_SET
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for if in into is it no not of on or such '
+    'that the their then there these they this to was will with'.split()
+)
+_TOKEN = re.compile(r"\w+(?:(?:[.'’]|(?<=\d),(?=\d))\w+)*")
+
+
+class SearchBackend(ABC):
+    """Ranks the products for a keyword query."""
+
+    @abstractmethod
+    def search_asins(self, query, k):
+        """ASINs of the `k` best matches for `query`, best first."""
+
+
+class LuceneBackend(SearchBackend):
+    def __init__(self, index_dir):
+        from pyserini.search.lucene import LuceneSearcher
+        self.searcher = LuceneSearcher(index_dir)
+
+    def search_asins(self, query, k):
+        # the document ids of JsonCollection indexes are the ASINs
+        return [hit.docid for hit in self.searcher.search(query, k=k)]
+
+
+# --- analysis ---------------------------------------------------------------
+
+class PorterStemmer:
+    """Porter's stemming algorithm, as in Lucene's PorterStemFilter."""
+
+    def stem(self, word):
+        if len(word) <= 2:
+            return word
+        self.b = list(word)
+        self.k = len(word) - 1
+        self.j = 0
+        self._step1ab()
+        self._step1c()
+        self._step2()
+        self._step3()
+        self._step4()
+        self._step5()
+        return ''.join(self.b[:self.k + 1])
+
+    def _cons(self, i):
+        ch = self.b[i]
+        if ch in 'aeiou':
+            return False
+        if ch == 'y':
+            return i == 0 or not self._cons(i - 1)
+        return True
+
+    def _m(self):
+        """The number of vowel-consonant sequences in b[0..j]."""
+        n, i = 0, 0
+        while True:
+            if i > self.j:
+                return n
+            if not self._cons(i):
+                break
+            i += 1
+        i += 1
+        while True:
+            while True:
+                if i > self.j:
+                    return n
+                if self._cons(i):
+                    break
+                i += 1
+            i += 1
+            n += 1
+            while True:
+                if i > self.j:
+                    return n
+                if not self._cons(i):
+                    break
+                i += 1
+            i += 1
+
+    def _vowel_in_stem(self):
+        return any(not self._cons(i) for i in range(self.j + 1))
+
+    def _doublec(self, j):
+        return j >= 1 and self.b[j] == self.b[j - 1] and self._cons(j)
+
+    def _cvc(self, i):
+        if i < 2 or not self._cons(i) or self._cons(i - 1) or not self._cons(i - 2):
+            return False
+        return self.b[i] not in 'wxy'
+
+    def _ends(self, s):
+        length = len(s)
+        if length > self.k + 1 or ''.join(self.b[self.k - length + 1:self.k + 1]) != s:
+            return False
+        self.j = self.k - length
+        return True
+
+    def _setto(self, s):
+        self.b[self.j + 1:] = list(s)
+        self.k = self.j + len(s)
+
+    def _r(self, s):
+        if self._m() > 0:
+            self._setto(s)
+
+    def _step1ab(self):
+        b = self.b
+        if b[self.k] == 's':
+            if self._ends('sses'):
+                self.k -= 2
+            elif self._ends('ies'):
+                self._setto('i')
+            elif b[self.k - 1] != 's':
+                self.k -= 1
+        if self._ends('eed'):
+            if self._m() > 0:
+                self.k -= 1
+        elif (self._ends('ed') or self._ends('ing')) and self._vowel_in_stem():
+            self.k = self.j
+            if self._ends('at'):
+                self._setto('ate')
+            elif self._ends('bl'):
+                self._setto('ble')
+            elif self._ends('iz'):
+                self._setto('ize')
+            elif self._doublec(self.k):
+                if self.b[self.k] not in 'lsz':
+                    self.k -= 1
+            elif self._m() == 1 and self._cvc(self.k):
+                self.j = self.k
+                self._setto('e')
+        del self.b[self.k + 1:]
+
+    def _step1c(self):
+        if self._ends('y') and self._vowel_in_stem():
+            self.b[self.k] = 'i'
+
+    _STEP2 = {
+        'a': (('ational', 'ate'), ('tional', 'tion')),
+        'c': (('enci', 'ence'), ('anci', 'ance')),
+        'e': (('izer', 'ize'),),
+        'l': (('abli', 'able'), ('alli', 'al'), ('entli', 'ent'), ('eli', 'e'), ('ousli', 'ous')),
+        'o': (('ization', 'ize'), ('ation', 'ate'), ('ator', 'ate')),
+        's': (('alism', 'al'), ('iveness', 'ive'), ('fulness', 'ful'), ('ousness', 'ous')),
+        't': (('aliti', 'al'), ('iviti', 'ive'), ('biliti', 'ble')),
+    }
+    _STEP3 = {
+        'e': (('icate', 'ic'), ('ative', ''), ('alize', 'al')),
+        'i': (('iciti', 'ic'),),
+        'l': (('ical', 'ic'), ('ful', '')),
+        's': (('ness', ''),),
+    }
+    _STEP4 = {
+        'a': ('al',),
+        'c': ('ance', 'ence'),
+        'e': ('er',),
+        'i': ('ic',),
+        'l': ('able', 'ible'),
+        'n': ('ant', 'ement', 'ment', 'ent'),
+        's': ('ism',),
+        't': ('ate', 'iti'),
+        'u': ('ous',),
+        'v': ('ive',),
+        'z': ('ize',),
+    }
+
+    def _replace_suffix(self, rules):
+        for suffix, replacement in rules:
+            if self._ends(suffix):
+                self._r(replacement)
+                del self.b[self.k + 1:]
+                return
+
+    def _step2(self):
+        if self.k > 0:
+            self._replace_suffix(self._STEP2.get(self.b[self.k - 1], ()))
+
+    def _step3(self):
+        self._replace_suffix(self._STEP3.get(self.b[self.k], ()))
+
+    def _step4(self):
+        if self.k == 0:
+            return
+        ch = self.b[self.k - 1]
+        if ch == 'o':
+            if not (
+                (self._ends('ion') and self.j >= 0 and self.b[self.j] in 'st')
+                or self._ends('ou')
+            ):
+                return
+        elif not any(self._ends(suffix) for suffix in self._STEP4.get(ch, ())):
+            return
+        if self._m() > 1:
+            self.k = self.j
+            del self.b[self.k + 1:]
+
+    def _step5(self):
+        self.j = self.k
+        if self.b[self.k] == 'e':
+            a = self._m()
+            if a > 1 or (a == 1 and not self._cvc(self.k - 1)):
+                self.k -= 1
+        if self.b[self.k] == 'l' and self._doublec(self.k) and self._m() > 1:
+            self.k -= 1
+
+
+_stemmer = PorterStemmer()
+_stems = {}
+
+
+def analyze(text):
+    """Index terms of `text`, as Lucene's English analyzer produces them."""
+    terms = []
+    for token in _TOKEN.findall(text):
+        if len(token) >= 2 and token[-2] in "'’" and token[-1] in 'sS':
+            token = token[:-2]
+        token = token.lower()
+        if not token or token in STOP_WORDS:
+            continue
+        stem = _stems.get(token)
+        if stem is None:
+            stem = _stems[token] = _stemmer.stem(token)
+        terms.append(stem)
+    return terms
+
+
+# --- BM25 -------------------------------------------------------------------
+
+def _int_to_int4(i):
+    bits = i.bit_length()
+    if bits < 4:
+        return i
+    shift = bits - 4
+    return ((i >> shift) & 0x07) | ((shift + 1) << 3)
+
+
+def _int4_to_int(i):
+    bits, shift = i & 0x07, (i >> 3) - 1
+    return bits if shift == -1 else (bits | 0x08) << shift
+
+
+# Lucene's SmallFloat.intToByte4 / byte4ToInt: lengths stored in one byte,
+# exact below 24 and with 3 bits of precision above
+_FREE_VALUES = 255 - _int_to_int4(2 ** 31 - 1)
+LENGTH_TABLE = [
+    i if i < _FREE_VALUES else _FREE_VALUES + _int4_to_int(i - _FREE_VALUES)
+    for i in range(256)
+]
+
+
+def encode_length(length):
+    if length < _FREE_VALUES:
+        return length
+    return _FREE_VALUES + _int_to_int4(length - _FREE_VALUES)
+
+
+def build_bm25_index(documents, output):
+    """Index the `contents` of a documents jsonl file, or of every jsonl file
+    in a directory, in file name order. Returns the document count."""
+    if os.path.isdir(documents):
+        paths = sorted(glob.glob(os.path.join(documents, '*.jsonl')))
+    else:
+        paths = [documents]
+    ids, norms = [], array('B')
+    postings = defaultdict(lambda: (array('I'), array('I')))
+    total_length = 0
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                doc = json.loads(line)
+                if len(doc['id'].encode()) > ASIN_WIDTH:
+                    raise CatalogError(f"document id {doc['id']!r} is longer than {ASIN_WIDTH} bytes")
+                terms = analyze(doc['contents'])
+                total_length += len(terms)
+                number = len(ids)
+                ids.append(doc['id'])
+                norms.append(encode_length(len(terms)))
+                for term, tf in Counter(terms).items():
+                    docs, tfs = postings[term]
+                    docs.append(number)
+                    tfs.append(tf)
+
+    terms = sorted(postings)
+    term_blob = '\n'.join(terms).encode()
+    term_offsets = array('Q', [0])
+    for term in terms:
+        term_offsets.append(term_offsets[-1] + len(term.encode()) + 1)
+    indptr, docs, tfs = array('Q', [0]), array('I'), array('I')
+    for term in terms:
+        docs.extend(postings[term][0])
+        tfs.extend(postings[term][1])
+        indptr.append(len(docs))
+    metadata = json.dumps({
+        'sources': source_signature(paths),
+        'avgdl': total_length / len(ids) if ids else 0.0,
+    }).encode()
+
+    def pad(f):
+        f.write(b'\x00' * (align(f.tell()) - f.tell()))
+
+    tmp_path = f'{output}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, INDEX_VERSION, len(ids), len(terms), len(metadata)))
+        f.write(metadata)
+        pad(f)
+        f.write(b''.join(i.encode().ljust(ASIN_WIDTH, b'\x00') for i in ids))
+        f.write(norms.tobytes())
+        pad(f)
+        f.write(term_offsets.tobytes())
+        f.write(term_blob + b'\n')
+        pad(f)
+        f.write(indptr.tobytes())
+        f.write(docs.tobytes())
+        f.write(tfs.tobytes())
+    os.replace(tmp_path, output)
+    return len(ids)
+
+
+class _TermTable(Sequence):
+    """The sorted terms inside the mapped index."""
+
+    def __init__(self, buf, offsets, start):
+        self._buf, self._offsets, self._start = buf, offsets, start
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start = self._start + self._offsets[i]
+        return self._buf[start:self._start + self._offsets[i + 1] - 1].decode()
+
+
+class BM25Backend(SearchBackend):
+    """Lucene-compatible BM25 over a prebuilt, memory-mapped index."""
+
+    def __init__(self, path, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self._views = []
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise CatalogError(f'{path} is empty')
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+        avgdl = self.metadata['avgdl'] or 1.0
+        # the length part of the BM25 denominator for every encoded length
+        self._length_norm = [k1 * (1 - b + b * length / avgdl) for length in LENGTH_TABLE]
+
+    def _view(self, offset, count, fmt):
+        view = memoryview(self._mmap)[offset:offset + count * struct.calcsize(fmt)].cast(fmt)
+        self._views.append(view)
+        return view
+
+    def _parse(self):
+        buf = self._mmap
+        if len(buf) < _HEADER.size:
+            raise CatalogError(f'{self.path} is not a BM25 index')
+        magic, version, count, term_count, metadata_length = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise CatalogError(f'{self.path} is not a BM25 index')
+        if version != INDEX_VERSION:
+            raise CatalogError(f'{self.path} has index format {version}, expected {INDEX_VERSION}')
+        offset = _HEADER.size
+        self.metadata = json.loads(buf[offset:offset + metadata_length])
+        offset = align(offset + metadata_length)
+        self.ids = AsinTable(buf, offset, count)
+        offset += count * ASIN_WIDTH
+        self._norms = self._view(offset, count, 'B')
+        offset = align(offset + count)
+        term_offsets = self._view(offset, term_count + 1, 'Q')
+        offset += (term_count + 1) * 8
+        self.terms = _TermTable(buf, term_offsets, offset)
+        offset = align(offset + term_offsets[-1] + (0 if term_count else 1))
+        self._indptr = self._view(offset, term_count + 1, 'Q')
+        nnz = self._indptr[-1]
+        offset += (term_count + 1) * 8
+        self._docs = self._view(offset, nnz, 'I')
+        self._tfs = self._view(offset + nnz * 4, nnz, 'I')
+        if offset + nnz * 8 > len(buf):
+            raise CatalogError(f'{self.path} is truncated')
+
+    def _row(self, term):
+        i = bisect.bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        return self._indptr[i], self._indptr[i + 1]
+
+    def scores(self, query):
+        """BM25 score of every matching document, by document number."""
+        count = len(self.ids)
+        scores = defaultdict(float)
+        for term, boost in Counter(analyze(query)).items():
+            row = self._row(term)
+            if row is None:
+                continue
+            start, end = row
+            df = end - start
+            weight = boost * math.log(1 + (count - df + 0.5) / (df + 0.5))
+            norms, length_norm = self._norms, self._length_norm
+            for doc, tf in zip(self._docs[start:end], self._tfs[start:end]):
+                scores[doc] += weight * tf / (tf + length_norm[norms[doc]])
+        return scores
+
+    def search_asins(self, query, k):
+        scores = self.scores(query)
+        # ties go to the earlier document, as in Lucene
+        best = heapq.nsmallest(k, scores, key=lambda doc: (-scores[doc], doc))
+        return [self.ids[doc] for doc in best]
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a BM25 index for the onlineshop.')
+    parser.add_argument('--documents', required=True, help='documents jsonl file, or a directory of them')
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+    count = build_bm25_index(args.documents, args.output)
+    print(f'Indexed {count} documents into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
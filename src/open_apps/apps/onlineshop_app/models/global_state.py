@@ -7,10 +7,19 @@ LICENSE file in the root directory of this source tree.
 from omegaconf import OmegaConf, DictConfig, ListConfig
 from .cart import Cart
 from .order import Order
-from ..engine.engine import DEFAULT_FILE_PATH, DEBUG_PROD_SIZE
+from ..engine.engine import (
+    DEFAULT_FILE_PATH,
+    DEBUG_PROD_SIZE,
+    SearchResultCache,
+    build_product_index,
+)
 from ..engine.goal import get_goals
+from .store import SAVE_DELAY, OrderJournal, Snapshot
 from typing import List, Dict, Optional
+import atexit
 import json
+import logging
+import os
 class GlobalState:
     def __init__(self):
         self.search_engine = None
@@ -18,19 +27,35 @@ class GlobalState:
         self.product_item_dict = None
         self.product_prices = None
         self.attribute_to_asins = None
+        self.product_index = None
+        self.search_cache = SearchResultCache()
         self.SHOW_ATTRS_TAB = False
         self.cart = Cart()
         self.config = None
         self.orders = []
+        self._stores = {}  # path -> OrderJournal or Snapshot
+        atexit.register(self.flush)
 
-    def initialize(self):
+    def initialize(self, search_backend='lucene'):
         from ..engine.engine import load_products, init_search_engine
-        (self.all_products, self.product_item_dict, 
-         self.product_prices, self.attribute_to_asins) = load_products(
-            filepath=DEFAULT_FILE_PATH,
-            num_products=DEBUG_PROD_SIZE
+        from ..engine.catalog import CatalogError, ensure_catalog
+        try:
+            products = ensure_catalog(num_products=DEBUG_PROD_SIZE)
+        except (OSError, CatalogError) as e:
+            logging.warning(f"No usable product catalog ({e}), parsing the product files")
+            products = load_products(
+                filepath=DEFAULT_FILE_PATH,
+                num_products=DEBUG_PROD_SIZE
+            )
+        (self.all_products, self.product_item_dict,
+         self.product_prices, self.attribute_to_asins) = products
+        self.product_index = build_product_index(self.all_products, self.product_prices)
+        self.search_engine = init_search_engine(
+            num_products=DEBUG_PROD_SIZE, backend=search_backend
         )
-        self.search_engine = init_search_engine(num_products=DEBUG_PROD_SIZE)
+        self.search_cache.clear()
+        from ..templates.html_generator import clear_fragment_cache
+        clear_fragment_cache()
     def update_config(self, config):
         self.config = config
     def load_state_from_config(self):
@@ -43,31 +68,50 @@ class GlobalState:
         self.orders = [Order.from_dict(order) for order in orders] if orders else []
         self.save_cart()
         self.save_orders()
-    def save_orders(self, path=None):
+    def _store(self, cls, path, default_name):
         if path is None:
-            path = self.config.database_path + '/orders.json'
-        with open(path, 'w') as f:
-            json.dump([order.to_dict() for order in self.orders], f, indent=4)
+            path = os.path.join(self.config.database_path, default_name)
+        store = self._stores.get(path)
+        if store is None:
+            if cls is Snapshot:
+                store = Snapshot(path, getattr(self.config, 'save_delay', SAVE_DELAY))
+            else:
+                store = cls(path)
+            self._stores[path] = store
+        return store
+    def save_orders(self, path=None):
+        """Rewrite the order journal with the whole order history."""
+        journal = self._store(OrderJournal, path, 'orders.jsonl')
+        journal.rewrite([order.to_dict() for order in self.orders])
+    def add_order(self, order, path=None):
+        """Record a new order, appending it to the order journal."""
+        self.orders.append(order)
+        self._store(OrderJournal, path, 'orders.jsonl').append(order.to_dict())
     def load_orders(self, path=None):
-        if path is None:
-            path = self.config.database_path + '/orders.json'
+        journal = self._store(OrderJournal, path, 'orders.jsonl')
         try:
-            with open(path, 'r') as f:
-                for order in json.load(f):
-                    self.orders.append(Order.from_dict(order))
+            if not os.path.exists(journal.path):
+                # orders.json of older versions
+                legacy_path = os.path.join(os.path.dirname(journal.path), 'orders.json')
+                with open(legacy_path, 'r') as f:
+                    journal.rewrite(json.load(f))
+            self.orders = [Order.from_dict(order) for order in journal.load()]
         except Exception as e:
             self.orders = []
     def load_cart(self, path=None):
-        if path is None:
-            path = self.config.database_path + '/cart.json'
+        snapshot = self._store(Snapshot, path, 'cart.json')
+        snapshot.flush()
         try:
-            with open(path, 'r') as f:
+            with open(snapshot.path, 'r') as f:
                 self.cart = Cart.from_dict(json.load(f))
         except Exception as e:
             self.cart = Cart()
     def save_cart(self, path=None):
-        if path is None:
-            path = self.config.database_path + '/cart.json'
-        with open(path, 'w') as f:
-            json.dump(self.cart.to_dict(), f, indent=4)
-global_state = GlobalState()
\ No newline at end of file
+        """Schedule a snapshot of the cart, written behind (see flush)."""
+        self._store(Snapshot, path, 'cart.json').save(self.cart.to_dict())
+    def flush(self):
+        """Write pending cart snapshots now."""
+        for store in list(self._stores.values()):
+            if isinstance(store, Snapshot):
+                store.flush()
+global_state = GlobalState()
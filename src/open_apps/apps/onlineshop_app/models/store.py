@@ -0,0 +1,103 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+"""
+Write-behind persistence of the shop state in the database directory.
+
+  - `OrderJournal`: orders.jsonl, one order per line. Checking out appends
+    one line instead of rewriting the order history. A line torn by a crash
+    is dropped on load, and the journal is then compacted (rewritten
+    without it) so later orders are appended after a complete line.
+  - `Snapshot`: cart.json, written at most every `delay` seconds by a
+    timer, and at `flush`. Each write goes to a temporary file that is then
+    renamed over the snapshot, so a crash leaves the old or the new cart,
+    never a partial one.
+"""
+import json
+import logging
+import os
+import threading
+
+SAVE_DELAY = 0.5  # seconds between a change to the cart and its snapshot
+
+
+def atomic_write(path, text):
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class OrderJournal:
+    """Append-only journal of orders, as dicts."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """The orders in the journal, in the order they were appended."""
+        orders, torn = [], False
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        orders.append(json.loads(line))
+                    except ValueError:
+                        torn = True
+                    else:
+                        torn = torn or not line.endswith('\n')
+        except FileNotFoundError:
+            return []
+        if torn:
+            logging.warning(f'Dropping incomplete records from {self.path}')
+            self.rewrite(orders)
+        return orders
+
+    def append(self, order):
+        line = json.dumps(order) + '\n'
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def rewrite(self, orders):
+        """Replace the journal with `orders` (compaction, or a reset)."""
+        with self._lock:
+            atomic_write(self.path, ''.join(json.dumps(order) + '\n' for order in orders))
+
+
+class Snapshot:
+    """A JSON document written behind the changes to it, debounced."""
+
+    def __init__(self, path, delay=SAVE_DELAY):
+        self.path = path
+        self.delay = delay
+        self._pending = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def save(self, data):
+        """Schedule `data`, JSON serializable and not changed afterwards,
+        to be written. Saves until the write replace each other."""
+        with self._lock:
+            self._pending = data
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the pending data now, if any."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            data, self._pending = self._pending, None
+            if data is not None:
+                atomic_write(self.path, json.dumps(data, indent=4))
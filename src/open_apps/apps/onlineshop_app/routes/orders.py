@@ -118,15 +118,14 @@ async def checkout(name: str = Form(...), address: str = Form(...), card: str =
         address=address,
         date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
     )
-    # Add to order history
-    global_state.orders.append(order)
+    # Add to order history, appending it to the local database
+    global_state.add_order(order)
     
     # Remove selected items from cart
     for (asin, options_key) in selected_items.keys():
         global_state.cart.remove_item(asin, selected_items[(asin, options_key)]["options"])
 
-    # Save the orders and cart to a local database
-    global_state.save_orders()
+    # Save the cart to a local database
     global_state.save_cart()
     
     return RedirectResponse(url=f"/onlineshop/order-confirmation?orderid={order_id}", status_code=303)
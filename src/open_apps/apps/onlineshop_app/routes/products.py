@@ -6,7 +6,7 @@ LICENSE file in the root directory of this source tree.
 """
 from fastapi import APIRouter, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from ..templates.html_generator import generate_base_html
+from ..templates.html_generator import generate_base_html, render_page, render_product
 from ..models.global_state import global_state
 from typing import List, Dict, Optional
 import random
@@ -16,129 +16,14 @@ router = APIRouter()
 
 def generate_featured_product() -> Dict:
     """Select a random product to feature"""
-    all_products = list(global_state.product_item_dict.values())
-    return random.choice(all_products)
+    # pick by ASIN so a catalog-backed dict only decodes the chosen product
+    asins = list(global_state.product_item_dict)
+    return global_state.product_item_dict[random.choice(asins)]
 
 def generate_homepage() -> str:
     featured_product = generate_featured_product()
-
-    return generate_base_html(f"""
-        <div class="container mt-5">
-            <!-- Return to Apps Button -->
-            <div class="row mb-4">
-                <div class="col-12">
-                    <a href="/" class="btn btn-primary">
-                        <i class="fas fa-arrow-left"></i> Return to List of Apps
-                    </a>
-                </div>
-            </div>
-
-            <!-- Hero Section -->
-            <div class="row mb-5">
-                <div class="col-md-8 mx-auto text-center">
-                    <h1 class="display-4 mb-4">Welcome to {global_state.config.title}</h1>
-                    <p class="lead mb-4">{global_state.config.description}</p>
-                    <form action="/onlineshop/search" method="POST" class="d-flex justify-content-center">
-                        <div class="input-group" style="max-width: 600px;">
-                            <input type="text" class="form-control form-control-lg" 
-                                   name="search_query" 
-                                   placeholder="What are you looking for today?"
-                                   aria-label="Search products">
-                            <button class="btn btn-primary btn-lg" type="submit">
-                                <i class="fa fa-search"></i> Search
-                            </button>
-                        </div>
-                    </form>
-                </div>
-            </div>
-
-            <!-- Featured Product Section -->
-            <div class="row mb-5">
-                <div class="col-12 text-center mb-4">
-                    <h2 class="display-5 text-primary">{global_state.config.promotional_message}</h2>
-                </div>
-                <div class="col-md-10 mx-auto">
-                    <div class="card shadow-lg">
-                        <div class="row g-0">
-                            <div class="col-md-6">
-                                <div class="p-3 d-flex align-items-center justify-content-center" 
-                                     style="height: 100%;">
-                                    <img src="{featured_product.get('MainImage', '')}" 
-                                         class="img-fluid rounded" 
-                                         alt="{featured_product.get('Title', '')}"
-                                         style="max-height: 400px; object-fit: contain;">
-                                </div>
-                            </div>
-                            <div class="col-md-6">
-                                <div class="card-body p-4">
-                                    <h3 class="card-title mb-3">{featured_product.get('Title', '')}</h3>
-                                    <div class="mb-3">
-                                        <span class="h4 text-primary">{featured_product.get('Price', '')}</span>
-                                        <span class="ms-2 badge bg-success">Featured</span>
-                                    </div>
-                                    <p class="card-text">
-                                        {global_state.config.additional_info_to_item + featured_product.get('Description', '')[:200]}...
-                                    </p>
-                                    <div class="d-grid gap-2">
-                                        <a href="/onlineshop/item/{featured_product.get('asin', '')}" 
-                                           class="btn btn-primary btn-lg">
-                                            View Details
-                                        </a>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-        <!-- Search Categories Section -->
-        <div class="row">
-            <div class="col-12 text-center mb-4">
-                <h3>Popular Categories</h3>
-            </div>
-            <div class="col-md-10 mx-auto">
-                <div class="row g-4 justify-content-center">
-                    <div class="col-md-4">
-                        <div class="card text-center shadow-sm h-100 hover-shadow">
-                            <div class="card-body">
-                                <i class="fas fa-laptop fa-3x text-info mb-3"></i>
-                                <h5 class="card-title">Electronics</h5>
-                                <form action="/onlineshop/search" method="POST">
-                                    <input type="hidden" name="search_query" value="electronics">
-                                    <button type="submit" class="btn btn-outline-info">Browse</button>
-                                </form>
-                            </div>
-                        </div>
-                    </div>
-                    <div class="col-md-4">
-                        <div class="card text-center shadow-sm h-100 hover-shadow">
-                            <div class="card-body">
-                                <i class="fas fa-tshirt fa-3x text-success mb-3"></i>
-                                <h5 class="card-title">Fashion</h5>
-                                <form action="/onlineshop/search" method="POST">
-                                    <input type="hidden" name="search_query" value="fashion">
-                                    <button type="submit" class="btn btn-outline-success">Browse</button>
-                                </form>
-                            </div>
-                        </div>
-                    </div>
-                    <div class="col-md-4">
-                        <div class="card text-center shadow-sm h-100 hover-shadow">
-                            <div class="card-body">
-                                <i class="fas fa-home fa-3x text-warning mb-3"></i>
-                                <h5 class="card-title">Home & Kitchen</h5>
-                                <form action="/onlineshop/search" method="POST">
-                                    <input type="hidden" name="search_query" value="home kitchen">
-                                    <button type="submit" class="btn btn-outline-warning">Browse</button>
-                                </form>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-    """)
+    featured = render_product('featured_product.html', featured_product)
+    return generate_base_html(render_page('homepage.html', featured=featured))
 
 # Update the home route to use the new homepage
 @router.get("/", response_class=HTMLResponse)
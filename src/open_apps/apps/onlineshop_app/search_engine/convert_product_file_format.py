@@ -4,18 +4,50 @@ All rights reserved.
 This source code is licensed under the license found in the
 LICENSE file in the root directory of this source tree.
 """
-import sys
+"""
+Converts the product catalog into the documents the search indexes are built
+from, for every index size at once:
+
+    resources_100/   the first 100 products
+    resources_1k/    the first 1,000
+    resources_100k/  the first 100,000
+    resources/       all of them
+
+Products are streamed from the catalog (see engine/catalog.py) in shards of
+--shard-size products, converted in parallel by --threads processes, and
+each shard is written to every size it belongs to as documents-NNNNN.jsonl.
+
+A shard whose catalog records have not changed since the last run is not
+rewritten: resources_manifest.json keeps a fingerprint of every shard file.
+Adding products therefore only writes the last shards. Each resources*
+directory gets a resources*.stamp file that changes exactly when its
+documents do, which run_indexing.sh uses to skip up-to-date indexes.
+"""
+import argparse
+import glob
+import hashlib
 import json
-from tqdm import tqdm
-sys.path.insert(0, '../')
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-from engine.engine import load_products, DEFAULT_FILE_PATH
+from open_apps.apps.onlineshop_app.engine.catalog import (
+    DEFAULT_CATALOG_PATH,
+    Catalog,
+    ensure_catalog,
+)
 
-all_products, *_ = load_products(filepath=DEFAULT_FILE_PATH)
+HERE = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = 'resources_manifest.json'
+DOCUMENT_FORMAT = 1  # bump when product_document changes
+TIERS = {
+    'resources_100': 100,
+    'resources_1k': 1000,
+    'resources_100k': 100000,
+    'resources': None,
+}
 
 
-docs = []
-for p in tqdm(all_products, total=len(all_products)):
+def product_document(p):
     option_texts = []
     options = p.get('options', {})
     for option_name, option_contents in options.items():
@@ -32,21 +64,134 @@ for p in tqdm(all_products, total=len(all_products)):
         option_text,
     ]).lower()
     doc['product'] = p
-    docs.append(doc)
+    return doc
+
+
+def shard_name(shard):
+    return f'documents-{shard:05d}.jsonl'
+
+
+def join_shard(output_dir, tier, shard):
+    return os.path.join(output_dir, tier, shard_name(shard))
+
+
+def convert_shard(catalog_path, output_dir, shard, start, end, known):
+    """Write the documents of products start..end to every tier they belong to.
+
+    `known` maps each tier to the fingerprint of its current shard file;
+    tiers whose fingerprint is unchanged are not rewritten. Returns the new
+    fingerprints by tier.
+    """
+    catalog = Catalog(catalog_path)
+    try:
+        # the tiers are prefixes of the catalog: each one takes the shard
+        # up to its limit, and is fingerprinted over exactly those records
+        limits = {
+            tier: min(end, limit or end) for tier, limit in TIERS.items()
+            if limit is None or start < limit
+        }
+        fingerprints = {}
+        digest = hashlib.sha256(f'{DOCUMENT_FORMAT}:{start}'.encode())
+        i = start
+        for stop in sorted(set(limits.values())):
+            for i in range(i, stop):
+                digest.update(catalog.record_bytes(i))
+            i = stop
+            for tier, limit in limits.items():
+                if limit == stop:
+                    fingerprints[tier] = f'{digest.hexdigest()}:{stop - start}'
+
+        stale = [
+            tier for tier in limits
+            if known.get(tier) != fingerprints[tier]
+            or not os.path.exists(join_shard(output_dir, tier, shard))
+        ]
+        if stale:
+            lines = [
+                json.dumps(product_document(json.loads(catalog.record_bytes(i)))) + '\n'
+                for i in range(start, max(limits[tier] for tier in stale))
+            ]
+            for tier in stale:
+                with open(join_shard(output_dir, tier, shard), 'w') as f:
+                    f.writelines(lines[:limits[tier] - start])
+        return fingerprints
+    finally:
+        catalog.close()
+
+
+def convert(catalog_path=DEFAULT_CATALOG_PATH, output_dir=HERE, threads=None, shard_size=10000):
+    """Bring the resources* directories up to date with the catalog.
+
+    Returns the tiers whose documents changed.
+    """
+    catalog = Catalog(catalog_path)
+    count = len(catalog)
+    catalog.close()
+
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    for tier in TIERS:
+        os.makedirs(os.path.join(output_dir, tier), exist_ok=True)
+        manifest.setdefault(tier, {})
+
+    shards = range((count + shard_size - 1) // shard_size)
+    with ProcessPoolExecutor(max_workers=threads) as pool:
+        futures = {
+            shard: pool.submit(
+                convert_shard,
+                catalog_path,
+                output_dir,
+                shard,
+                shard * shard_size,
+                min(count, (shard + 1) * shard_size),
+                {tier: manifest[tier].get(shard_name(shard)) for tier in TIERS},
+            )
+            for shard in shards
+        }
+        results = {shard: future.result() for shard, future in futures.items()}
+
+    changed = []
+    for tier in TIERS:
+        files = {
+            shard_name(shard): fingerprints[tier]
+            for shard, fingerprints in results.items() if tier in fingerprints
+        }
+        # documents.jsonl of older versions, and shards past the end
+        for path in glob.glob(os.path.join(output_dir, tier, '*.jsonl')):
+            if os.path.basename(path) not in files:
+                os.remove(path)
+        stamp = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()
+        stamp_path = os.path.join(output_dir, f'{tier}.stamp')
+        if files != manifest[tier] or not os.path.exists(stamp_path):
+            changed.append(tier)
+            with open(stamp_path, 'w') as f:
+                f.write(stamp + '\n')
+        manifest[tier] = files
 
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return changed
 
-with open('./resources_100/documents.jsonl', 'w+') as f:
-    for doc in docs[:100]:
-        f.write(json.dumps(doc) + '\n')
 
-with open('./resources/documents.jsonl', 'w+') as f:
-    for doc in docs:
-        f.write(json.dumps(doc) + '\n')
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert the product catalog into search index documents.')
+    parser.add_argument('--catalog', default=DEFAULT_CATALOG_PATH)
+    parser.add_argument('--output-dir', default=HERE)
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    parser.add_argument('--shard-size', type=int, default=10000)
+    args = parser.parse_args()
+    if args.catalog == DEFAULT_CATALOG_PATH:
+        # build it from the downloaded products if that has not happened yet
+        ensure_catalog()[0].catalog.close()
+    changed = convert(args.catalog, args.output_dir, args.threads, args.shard_size)
+    print('Updated:', ', '.join(changed) if changed else 'nothing, all documents are up to date')
 
-with open('./resources_1k/documents.jsonl', 'w+') as f:
-    for doc in docs[:1000]:
-        f.write(json.dumps(doc) + '\n')
 
-# with open('./resources_100k/documents.jsonl', 'w+') as f:
-#     for doc in docs[:100000]:
-#         f.write(json.dumps(doc) + '\n')
\ No newline at end of file
+if __name__ == '__main__':
+    main()
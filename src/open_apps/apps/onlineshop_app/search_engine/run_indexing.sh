@@ -1,31 +1,30 @@
-python -m pyserini.index.lucene \
-  --collection JsonCollection \
-  --input resources_100 \
-  --index indexes_100 \
-  --generator DefaultLuceneDocumentGenerator \
-  --threads 1 \
-  --storePositions --storeDocvectors --storeRaw
+# Builds the search indexes of every size from the resources* directories
+# that convert_product_file_format.py writes. An index is only rebuilt when
+# its documents changed since it was last built, and then from scratch:
+# changed shards replace documents already indexed, which appending can't do.
+THREADS=${THREADS:-$(nproc 2>/dev/null || echo 1)}
 
-python -m pyserini.index.lucene \
-  --collection JsonCollection \
-  --input resources \
-  --index indexes \
-  --generator DefaultLuceneDocumentGenerator \
-  --threads 1 \
-  --storePositions --storeDocvectors --storeRaw
+for tier in _100 _1k _100k ""; do
+  if [ ! -f resources${tier}.stamp ]; then
+    continue
+  fi
+  if cmp -s resources${tier}.stamp indexes${tier}.stamp; then
+    echo "indexes${tier} is up to date"
+    continue
+  fi
 
-python -m pyserini.index.lucene \
-  --collection JsonCollection \
-  --input resources_1k \
-  --index indexes_1k \
-  --generator DefaultLuceneDocumentGenerator \
-  --threads 1 \
-  --storePositions --storeDocvectors --storeRaw
+  python -m pyserini.index.lucene \
+    --collection JsonCollection \
+    --input resources${tier} \
+    --index indexes${tier} \
+    --generator DefaultLuceneDocumentGenerator \
+    --threads "$THREADS" \
+    --storePositions --storeDocvectors --storeRaw || exit 1
 
-# python -m pyserini.index.lucene \
-#   --collection JsonCollection \
-#   --input resources_100k \
-#   --index indexes_100k \
-#   --generator DefaultLuceneDocumentGenerator \
-#   --threads 1 \
-#   --storePositions --storeDocvectors --storeRaw
\ No newline at end of file
+  # In-process BM25 index, for search_backend: bm25
+  python -m open_apps.apps.onlineshop_app.engine.search \
+    --documents resources${tier} \
+    --output indexes${tier}_bm25.bin || exit 1
+
+  cp resources${tier}.stamp indexes${tier}.stamp
+done
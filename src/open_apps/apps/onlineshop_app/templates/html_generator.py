@@ -4,117 +4,88 @@ All rights reserved.
 This source code is licensed under the license found in the
 LICENSE file in the root directory of this source tree.
 """
+"""
+Shop pages, rendered from the Jinja2 templates next to this file.
+
+Templates are compiled once. What does not change from request to request is
+rendered once and cached: the page chrome of `base.html` (per appearance
+settings and cart count), and the product cards (per ASIN and appearance).
+Cards that link back to the search embed the keywords, which are filled in
+to the cached card at request time. Values are inserted as they are, without
+HTML escaping, like the f-strings these templates replaced.
+"""
+import os
+from functools import lru_cache
+
+from jinja2 import Environment, FileSystemLoader
+
 from ..models.global_state import global_state
 
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+FRAGMENT_CACHE_SIZE = 4096  # rendered product cards
+# settings the templates use, with their defaults
+APPEARANCE = {
+    'title': None,
+    'description': None,
+    'promotional_message': None,
+    'additional_info_to_item': None,
+    'background_color': None,
+    'font_family': None,
+    'base_font_size': None,
+    'font_color': None,
+    'button_background_color': '#0d6efd',
+    'button_font_color': '#FFFFFF',
+    'highlight_font_color': '#0d6efd',
+}
+# stands in for a value that is filled in per request
+_SLOT = '\x00slot\x00'
+
+environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    keep_trailing_newline=True,
+    autoescape=False,
+)
+
+
+def appearance():
+    """The appearance settings of the shop, as a hashable variant."""
+    config = global_state.config
+    return tuple((key, getattr(config, key, default)) for key, default in APPEARANCE.items())
+
+
+@lru_cache(maxsize=64)
+def _chrome(variant, cart_count):
+    page = environment.get_template('base.html').render(
+        dict(variant), cart_count=cart_count, content=_SLOT
+    )
+    return tuple(page.split(_SLOT))
+
+
+@lru_cache(maxsize=FRAGMENT_CACHE_SIZE)
+def _fragment(template, asin, variant):
+    product = global_state.product_item_dict.get(asin, {})
+    html = environment.get_template(template).render(
+        dict(variant), product=product, keywords=_SLOT
+    )
+    return tuple(html.split(_SLOT))
+
+
+def clear_fragment_cache():
+    """Forget rendered products, when the products change."""
+    _fragment.cache_clear()
+
+
+def render_product(template, product, keywords=''):
+    """`template` rendered for `product`, from the fragment cache."""
+    return keywords.join(_fragment(template, product.get('asin', ''), appearance()))
+
+
+def render_page(template, **context):
+    return environment.get_template(template).render(dict(appearance()), **context)
+
+
 # HTML Templates
 def generate_base_html(content: str) -> str:
     cart_count = global_state.cart.get_total_quantity() if hasattr(global_state, 'cart') else 0
-    bg_color = global_state.config.background_color
-    font_family = global_state.config.font_family
-    base_font_size = global_state.config.base_font_size
-    font_color = global_state.config.font_color
-    button_background_color = getattr(global_state.config, 'button_background_color', '#0d6efd')
-    button_font_color = getattr(global_state.config, 'button_font_color', '#FFFFFF')
-    highlight_font_color = getattr(global_state.config, 'highlight_font_color', '#0d6efd')
-    return f"""
-    <!DOCTYPE html>
-    <html>
-        <head>
-            <title>{global_state.config.title}</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-            <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4/css/all.min.css" rel="stylesheet">
-            <style>
-                body {{
-                    font-family: "{font_family}";
-                    font-size: {base_font_size};
-                    background-color: {bg_color};
-                    color: {font_color};
-                }}
-                button, input, textarea, select {{
-                    font-family: inherit;
-                }}
-                h1, h2, h3, h4, h5, h6 {{
-                    font-family: inherit;
-                }}
-                .result-img {{
-                    max-width: 100%;
-                    height: auto;
-                }}
-                .item-page-img {{
-                    max-width: 100%;
-                    height: auto;
-                }}
-                .top-buffer {{
-                    margin-top: 20px;
-                }}
-                .option-btn {{
-                    margin: 2px;
-                }}
-                .option-btn.active {{
-                    background-color: #0d6efd;
-                    color: white;
-                }}
-                .review-item {{
-                    border-bottom: 1px solid #ddd;
-                    padding: 10px 0;
-                }}
-                .hover-shadow:hover {{
-                    transform: translateY(-3px);
-                    box-shadow: 0 4px 20px rgba(0,0,0,0.1) !important;
-                    transition: all 0.3s ease;
-                }}
-                .nav-tabs .nav-link {{
-                    color: #666;
-                    border: none;
-                    padding: 1rem 1.5rem;
-                }}
-                .nav-tabs .nav-link.active {{
-                    color: #0d6efd;
-                    border-bottom: 2px solid #0d6efd;
-                    background: none;
-                }}
-                .review-item {{
-                    border-bottom: 1px solid #eee;
-                    padding: 1rem 0;
-                }}
-                .review-item:last-child {{
-                    border-bottom: none;
-                }}
-                .btn-primary, .btn-outline-primary {{
-                    background-color: {button_background_color} !important;
-                    color: {button_font_color} !important;
-                }}
-                .text-primary {{
-                    color: {highlight_font_color} !important;
-                }}
-                .breadcrumb-item,
-                .breadcrumb-item a,
-                .breadcrumb-item.active {{
-                    color: {highlight_font_color} !important;
-                }}
-                .breadcrumb-item + .breadcrumb-item::before {{
-                    color: {highlight_font_color} !important;
-                }}
-            </style>
-        </head>
-        <body>
-            <nav class="navbar navbar-expand-lg navbar-light bg-light">
-                <div class="container">
-                    <a class="navbar-brand" href="/onlineshop">{global_state.config.title}</a>
-                    <div class="navbar-nav ms-auto">
-                        <a class="nav-link" href="/onlineshop/orders">
-                            <i class="fa fa-box"></i> Orders
-                        </a>
-                        <a class="nav-link" href="/onlineshop/cart">
-                            <i class="fa fa-shopping-cart"></i> Cart ({cart_count})
-                        </a>
-                    </div>
-                </div>
-            </nav>
-            {content}
-            <script src="https://ajax.googleapis.com/ajax/libs/jquery/3.5.1/jquery.min.js"></script>
-            <script src="https://stackpath.bootstrapcdn.com/bootstrap/4.3.1/js/bootstrap.bundle.min.js"></script>
-            <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
-        </body>
-    </html>
-    """
\ No newline at end of file
+    head, tail = _chrome(appearance(), cart_count)
+    return head + content + tail
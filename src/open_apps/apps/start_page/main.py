@@ -7,6 +7,10 @@ LICENSE file in the root directory of this source tree.
 # assets come from https://html5up.net/story
 from fasthtml.common import *
 import random
+import threading
+import anyio
+from starlette.responses import PlainTextResponse
+from starlette.routing import BaseRoute, Match, NoMatchFound
 try:
     from helper import (
         Wrapper,
@@ -56,6 +60,25 @@ AVAILABLE_APPS = {
     ),
 }
 
+# URL prefix of each app's routes, e.g. /todo, /todo/..., /todo_all
+APP_URL_PREFIXES = {
+    "messages": "/messages",
+    "todo": "/todo",
+    "calendar": "/calendar",
+    "codeeditor": "/codeeditor",
+    "map": "/maps",
+    "onlineshop": "/onlineshop",
+}
+
+# start page tiles whose key differs from the app's
+START_PAGE_APP_KEYS = {"maps": "map", "vault": "todo"}
+
+# apps served by this process (mounted or waiting for their first request),
+# and the modules of those already mounted, in mount order
+registered_apps = []
+loaded_apps = {}
+_mount_lock = threading.RLock()
+
 APP_MODULE_TO_NAME = {
     "open_apps.apps.todo_app": "todo",
     "open_apps.apps.calendar_app": "calendar",
@@ -79,11 +102,9 @@ def _drop_app_tables(module, apps_cfg) -> None:
     if sub_cfg is None or not hasattr(sub_cfg, "database_path"):
         return
     try:
-        from fastlite import database as fl_database
+        from open_apps.apps.storage import drop_tables, is_memory
 
-        db = fl_database(sub_cfg.database_path)
-        for table_name in db.table_names():
-            db[table_name].drop()
+        drop_tables(sub_cfg.database_path, memory=is_memory(sub_cfg))
     except Exception:
         # If the DB or fastlite is unavailable, fall through — the
         # set_environment call below will surface a clearer error.
@@ -102,27 +123,149 @@ def reset_all_apps(config: DictConfig):
     """
     import shutil
     from pathlib import Path
+    from open_apps.apps.storage import filesystem_root, is_memory
 
-    # Code editor: clean filesystem; tables don't apply.
-    if hasattr(config, "code_editor") and hasattr(config.code_editor, "database_path"):
-        folder = Path(config.code_editor.database_path)
-        if folder.exists():
-            shutil.rmtree(folder)
+    with _mount_lock:
+        # Apps not mounted yet are left alone: they seed their state when
+        # their first request mounts them.
+        # Code editor: clean filesystem; tables don't apply.
+        if (
+            "codeeditor" in loaded_apps
+            and hasattr(config, "code_editor")
+            and hasattr(config.code_editor, "database_path")
+        ):
+            folder = Path(filesystem_root(
+                config.code_editor.database_path, is_memory(config.code_editor)
+            ))
+            if folder.exists():
+                shutil.rmtree(folder)
 
-    for app_name, (module_path, getter_func) in AVAILABLE_APPS.items():
-        try:
-            module = __import__(module_path, fromlist=[getter_func])
-            if app_name != "codeeditor":
-                _drop_app_tables(module, config)
-            if hasattr(module, "set_environment"):
-                module.set_environment(config)
-        except Exception as e:
-            print(f"Warning: failed to reset {app_name}: {e}")
+        for app_name, module in loaded_apps.items():
+            try:
+                if app_name != "codeeditor":
+                    _drop_app_tables(module, config)
+                if hasattr(module, "set_environment"):
+                    module.set_environment(config)
+            except Exception as e:
+                print(f"Warning: failed to reset {app_name}: {e}")
+
+
+def export_app_storage(config: DictConfig, dest_dir) -> None:
+    """Copy every app's current sqlite/filesystem state under ``dest_dir``.
+
+    Mainly for apps running with ``storage: memory``, whose state never
+    reaches ``databases_dir``: call this at the end of an episode to keep
+    a copy for debugging. Files are named like their ``database_path``.
+
+    Args:
+        config: The full OpenApps DictConfig (typically ``cfg.apps``).
+        dest_dir: Directory to write the copies into.
+    """
+    from pathlib import Path
+    from open_apps.apps.storage import export_database, export_directory, is_memory
+
+    dest_dir = Path(dest_dir)
+    loaded_modules = {module.__name__ for module in loaded_apps.values()}
+    for module_path, cfg_key in APP_MODULE_TO_NAME.items():
+        if module_path not in loaded_modules:
+            continue
+        sub_cfg = getattr(config, cfg_key, None)
+        if sub_cfg is None or not hasattr(sub_cfg, "database_path"):
+            continue
+        dest = dest_dir / Path(sub_cfg.database_path).name
+        if cfg_key == "code_editor":
+            export_directory(sub_cfg.database_path, dest, memory=is_memory(sub_cfg))
+        else:
+            export_database(sub_cfg.database_path, dest, memory=is_memory(sub_cfg))
+
+
+def close_app_storage(config: DictConfig) -> None:
+    """Close the pooled SQLite connections of every app's database.
+
+    Args:
+        config: The full OpenApps DictConfig (typically ``cfg.apps``).
+    """
+    from open_apps.apps.storage import close
+
+    for cfg_key in APP_MODULE_TO_NAME.values():
+        sub_cfg = getattr(config, cfg_key, None)
+        if cfg_key == "code_editor" or sub_cfg is None:
+            continue
+        if hasattr(sub_cfg, "database_path"):
+            close(sub_cfg.database_path)
 
 
 def get_start_page_routes():
     return app.routes
 
+
+def _load_app(app_name: str, config: DictConfig) -> list:
+    """Import an app, run its set_environment and return its routes."""
+    module_path, getter_func = AVAILABLE_APPS[app_name]
+    module = __import__(module_path, fromlist=[getter_func])
+    # Set environment variables for the module
+    if hasattr(module, "set_environment"):
+        print(f"Setting environment for {app_name}")
+        module.set_environment(config)
+    # Get fresh routes with new config
+    routes = getattr(module, getter_func)()
+    loaded_apps[app_name] = module
+    return routes
+
+
+class LazyAppRoute(BaseRoute):
+    """Placeholder for an app that is mounted on its first request.
+
+    It matches every path under the app's URL prefix. The first request
+    imports the app and runs its set_environment (in a worker thread),
+    swaps the app's routes in where the placeholder was, and dispatches
+    the request again. A placeholder still routed after that (the app was
+    mounted already) answers 404, rather than matching itself again.
+    """
+
+    def __init__(self, app_name: str):
+        self.app_name = app_name
+        self.prefix = APP_URL_PREFIXES[app_name]
+
+    def matches(self, scope):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path == self.prefix or path.startswith((self.prefix + "/", self.prefix + "_")):
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    def url_path_for(self, name, /, **path_params):
+        raise NoMatchFound(name, path_params)
+
+    async def handle(self, scope, receive, send):
+        await anyio.to_thread.run_sync(mount_app, self.app_name)
+        if self in app.routes:
+            await PlainTextResponse("Not Found", status_code=404)(scope, receive, send)
+            return
+        await app.router(scope, receive, send)
+
+
+def mount_app(app_name: str) -> None:
+    """Mount a lazily registered app now (no-op if it is mounted already)."""
+    with _mount_lock:
+        if app_name in loaded_apps:
+            # drop placeholders left over from a re-init
+            app.routes[:] = [
+                route for route in app.routes
+                if not (isinstance(route, LazyAppRoute) and route.app_name == app_name)
+            ]
+            return
+        index = next(
+            i for i, route in enumerate(app.routes)
+            if isinstance(route, LazyAppRoute) and route.app_name == app_name
+        )
+        try:
+            routes = _load_app(app_name, app.config)
+        except (ImportError, AttributeError) as e:
+            print(f"Failed to load routes for {app_name}: {e}")
+            routes = []
+        app.routes[index : index + 1] = routes
+
 def initialize_routes_and_configure_task(config: DictConfig = None):
     global app, rt
     """Initialize all apps and configure the app with provided config."""
@@ -133,32 +276,42 @@ def initialize_routes_and_configure_task(config: DictConfig = None):
     if not app.config.onlineshop.enable:
         print("---> Online shop is disabled in the config.")
     else:
+        # only the Lucene search backend needs Java
+        search_backend = getattr(app.config.onlineshop, "search_backend", "lucene")
         print("Java version check:", get_java_version())
-        if java_version_high_enough:
+        if java_version_high_enough or search_backend != "lucene":
             print("---> Online shop turned on!!")
             AVAILABLE_APPS["onlineshop"] = (
                 "open_apps.apps.onlineshop_app",
                 "get_onlineshop_routes",
             )
-    if java_version_high_enough:
+    # only the OpenTripPlanner backend needs Java; the local planner runs anywhere
+    if not java_version_high_enough and getattr(app.config.maps, "routing_backend", "local") == "otp":
         if app.config.maps.allow_planning:
             print("---> Map planning is not available without Java 21 or higher.")
             print("Turning off the planning feature for now...")
             app.config.maps.allow_planning = False
 
-    for app_name, (module_path, getter_func) in AVAILABLE_APPS.items():
-        try:
-            module = __import__(module_path, fromlist=[getter_func])
-            # Set environment variables for the module
-            if hasattr(module, "set_environment"):
-                print(f"Setting environment for {app_name}")
-                module.set_environment(config)
-
-            # Get fresh routes with new config
-            route_getter = getattr(module, getter_func)
-            routes = route_getter()
-            app.routes.extend(routes)
+    apps_enabled = getattr(config, "apps_enabled", None)
+    if apps_enabled is not None:
+        unknown = set(apps_enabled) - set(AVAILABLE_APPS)
+        if unknown:
+            print(f"---> Ignoring unavailable apps in apps_enabled: {sorted(unknown)}")
+    lazy_load = getattr(config, "lazy_load", False)
 
+    # a re-init registers the apps again, don't list them twice
+    registered_apps.clear()
+    for app_name in AVAILABLE_APPS:
+        if apps_enabled is not None and app_name not in apps_enabled:
+            continue
+        registered_apps.append(app_name)
+        if lazy_load:
+            # an app mounted before a re-init keeps its routes
+            if app_name not in loaded_apps:
+                app.routes.append(LazyAppRoute(app_name))
+            continue
+        try:
+            app.routes.extend(_load_app(app_name, config))
         except ImportError as e:
             print(f"Failed to load routes for {app_name}: {e}")
         except AttributeError as e:
@@ -203,6 +356,12 @@ def get():
             # Skip the shopping app if disabled
             if app_name == "onlineshop" and not app.config.onlineshop.enable:
                 continue
+            # Skip apps left out of apps_enabled
+            if (
+                getattr(app.config, "apps_enabled", None) is not None
+                and START_PAGE_APP_KEYS.get(app_name, app_name) not in registered_apps
+            ):
+                continue
             # Get the app URL
             app_url = f"/{app_name}" if app_name != "vault" else "/todo"
             
@@ -0,0 +1,230 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+
+Shared SQLite connection manager for the FastHTML apps.
+
+The todo, calendar, messenger and maps apps each used to open a fresh
+``fastlite.database(...)`` handle in ``set_environment`` (and
+``_drop_app_tables`` yet another one on reset). This module keeps one
+long-lived writer connection per database file instead, tuned for
+concurrent agent traffic and reward probing:
+
+  - WAL journaling with ``synchronous=NORMAL``, so readers never block
+    on the writer and commits don't fsync the main database file.
+  - a ``busy_timeout`` so a writer racing another connection waits
+    instead of failing with ``SQLITE_BUSY``.
+  - a larger apsw statement cache, so the handful of queries each
+    request handler runs are prepared once and reused.
+  - a separate read-only connection per file for the ``*_all`` reward
+    endpoints, so reward probes read a consistent WAL snapshot and never
+    contend with agent writes.
+
+Connections are keyed by resolved path and live until :func:`close` (or
+:func:`close_all`, which also runs at interpreter exit); resets drop and
+re-create tables through the same writer connection.
+
+Each app can also opt into ``storage: memory`` (the default is
+``disk``). Its database then lives in a named shared-cache in-memory
+SQLite database, kept alive by the pooled writer, and the code editor's
+filesystem moves to a tmpfs directory. Nothing touches ``databases_dir``
+until :func:`export_database` / :func:`export_directory` copy the state
+out, e.g. at the end of an episode for debugging.
+"""
+
+from __future__ import annotations
+
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import apsw
+from fastlite import Database
+
+
+__all__ = [
+    "STORAGE_MODES",
+    "storage_mode",
+    "is_memory",
+    "get_database",
+    "get_readonly_database",
+    "drop_tables",
+    "filesystem_root",
+    "export_database",
+    "export_directory",
+    "close",
+    "close_all",
+]
+
+
+# How long (ms) a connection waits on a locked database before raising.
+BUSY_TIMEOUT_MS = 5000
+# Prepared statements cached per connection (apsw's default is 100).
+STATEMENT_CACHE_SIZE = 256
+# Values accepted for an app's ``storage`` config key.
+STORAGE_MODES = ("disk", "memory")
+
+_lock = threading.Lock()
+_writers: dict[str, Database] = {}
+_readers: dict[str, Database] = {}
+
+
+def storage_mode(app_cfg) -> str:
+    """Return the ``storage`` mode configured for an app (``disk`` if unset)."""
+    mode = getattr(app_cfg, "storage", None) or "disk"
+    if mode not in STORAGE_MODES:
+        raise ValueError(
+            f"Invalid storage mode {mode!r}; expected one of {STORAGE_MODES}"
+        )
+    return mode
+
+
+def is_memory(app_cfg) -> bool:
+    return storage_mode(app_cfg) == "memory"
+
+
+def _key(path) -> str:
+    return str(Path(path).resolve())
+
+
+def _digest(path) -> str:
+    return hashlib.sha1(_key(path).encode()).hexdigest()[:16]
+
+
+def _memory_uri(path) -> str:
+    # Named per database_path so parallel environments in one process
+    # never share state, and shared-cache so every connection opened on
+    # the same name sees the same database.
+    return f"file:openapps_{_digest(path)}?mode=memory&cache=shared"
+
+
+def _connect(path: str, flags: int) -> apsw.Connection:
+    conn = apsw.Connection(path, flags=flags, statementcachesize=STATEMENT_CACHE_SIZE)
+    conn.setbusytimeout(BUSY_TIMEOUT_MS)
+    return conn
+
+
+def get_database(path, memory: bool = False) -> Database:
+    """Return the shared read-write connection for the database at ``path``.
+
+    On disk, the file (and its parent directory) is created on first use
+    and switched to WAL mode. With ``memory=True`` ``path`` only names
+    the database; it lives as long as this connection does.
+    """
+    key = _key(path)
+    with _lock:
+        db = _writers.get(key)
+        if db is None:
+            flags = apsw.SQLITE_OPEN_READWRITE | apsw.SQLITE_OPEN_CREATE
+            if memory:
+                conn = _connect(_memory_uri(key), flags | apsw.SQLITE_OPEN_URI)
+                db = Database(conn)
+            else:
+                Path(key).parent.mkdir(parents=True, exist_ok=True)
+                db = Database(_connect(key, flags))
+                db.enable_wal()
+                # Safe under WAL: an app crash never loses commits, only
+                # an OS crash can drop the last few.
+                db.execute("PRAGMA synchronous=NORMAL;")
+            _writers[key] = db
+    return db
+
+
+def get_readonly_database(path, memory: bool = False) -> Database:
+    """Return a shared read-only connection for the database at ``path``.
+
+    Used by the reward endpoints. Opening it also opens the writer, so
+    the file exists and is in WAL mode before the read-only handle
+    attaches to it. In-memory databases have no WAL snapshot to read
+    from (shared-cache readers would hit table locks instead), so they
+    are read through the writer.
+    """
+    key = _key(path)
+    writer = get_database(key, memory=memory)
+    if memory:
+        return writer
+    with _lock:
+        db = _readers.get(key)
+        if db is None:
+            db = Database(_connect(key, apsw.SQLITE_OPEN_READONLY))
+            _readers[key] = db
+    return db
+
+
+def drop_tables(path, memory: bool = False) -> None:
+    """Drop every table in the database at ``path`` via the shared writer."""
+    db = get_database(path, memory=memory)
+    for table_name in db.table_names():
+        # IF EXISTS: dropping a virtual (FTS) table also drops its
+        # shadow tables, which are still in the list we iterate over.
+        db.execute(f"DROP TABLE IF EXISTS [{table_name}]")
+
+
+def filesystem_root(path, memory: bool = False) -> str:
+    """Return the directory that backs a filesystem-style app (code editor).
+
+    On disk this is ``path`` itself. In memory mode it is a directory on
+    tmpfs (``/dev/shm`` where available) derived from ``path``.
+    """
+    if not memory:
+        return str(path)
+    base = "/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+    return os.path.join(base, f"openapps_{_digest(path)}", Path(path).name)
+
+
+def export_database(path, dest, memory: bool = False) -> None:
+    """Copy the database at ``path`` to the file ``dest`` (online backup)."""
+    source = get_database(path, memory=memory)
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    target = apsw.Connection(str(dest))
+    try:
+        with target.backup("main", source.conn, "main") as backup:
+            backup.step(-1)
+    finally:
+        target.close()
+
+
+def export_directory(path, dest, memory: bool = False) -> None:
+    """Copy a filesystem-style app's directory tree to ``dest``."""
+    root = filesystem_root(path, memory=memory)
+    if os.path.isdir(root):
+        shutil.copytree(root, dest, dirs_exist_ok=True)
+
+
+def _close(db) -> None:
+    try:
+        db.close()
+    except apsw.Error:
+        pass
+
+
+def close(path) -> None:
+    """Close the pooled connections of the database at ``path`` (reader first).
+
+    An in-memory database is discarded with its writer.
+    """
+    key = _key(path)
+    with _lock:
+        for pool in (_readers, _writers):
+            db = pool.pop(key, None)
+            if db is not None:
+                _close(db)
+
+
+def close_all() -> None:
+    """Close every pooled connection (readers first)."""
+    with _lock:
+        for pool in (_readers, _writers):
+            for db in pool.values():
+                _close(db)
+            pool.clear()
+
+
+atexit.register(close_all)
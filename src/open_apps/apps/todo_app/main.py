@@ -9,6 +9,7 @@ from dataclasses import dataclass
 import json
 from typing import List
 from src.open_apps.apps.start_page.helper import create_logo_header
+from open_apps.apps.storage import get_database, get_readonly_database, is_memory
 
 
 @dataclass
@@ -26,10 +27,13 @@ def set_environment(config):
     """Set environment variables for the todo app"""
     global app, logo_title_container, styles
     app.config = config
-    db = database(config.todo.database_path)
-    global todos
+    memory = is_memory(config.todo)
+    db = get_database(config.todo.database_path, memory=memory)
+    global todos, todos_readonly
     # create a new table if it doesn't exist
     todos = db.create(Todo, pk="id")
+    # reward probes read through their own connection, see apps/storage.py
+    todos_readonly = get_readonly_database(config.todo.database_path, memory=memory).t.todo
 
     print("Populating initial todos from config") # config.todo.init_todos should be a list of (title, done) tuples
     for idx, (title, done) in enumerate(config.todo.init_todos):
@@ -229,7 +233,7 @@ def count():
 @app.get("/todo_all")
 def get_all():
     """Used for rewards"""
-    todo_list: List[dict] = [todo.__dict__ for todo in todos()]
+    todo_list: List[dict] = todos_readonly()
     return Response(json.dumps(todo_list), headers={"Content-Type": "application/json"})
 
 def get_todo_routes():
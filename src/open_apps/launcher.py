@@ -13,6 +13,7 @@ task, and agent.
 # Standard library imports
 from subprocess import PIPE
 import subprocess
+from datetime import datetime
 from pathlib import Path
 import shutil
 import os
@@ -20,12 +21,11 @@ import socket
 import signal
 
 # Third-party imports
+# browsergym, wandb, git, killport, fasthtml and the apps are heavy to import
+# and only needed by some launch paths: they are imported where they are used
+# (see tests/test_startup.py).
 from omegaconf import DictConfig, OmegaConf
-import browsergym
-from fasthtml.common import serve
-import wandb
 import yaml
-import git
 from typing import Optional
 from time import sleep
 import hydra
@@ -33,18 +33,10 @@ import urllib.request
 import time
 import urllib.parse  # Add this import
 from open_apps.utils import merge_plus_keys
-from browsergym.experiments import ExpArgs, get_exp_result
 
 
 # Project-specific imports
-from open_apps.apps.start_page.main import (
-    initialize_routes_and_configure_task,
-)
-import socket
-from killport import kill_ports
 import random
-from open_apps.tasks.add_tasks_to_browsergym import register_tasks_with_browsergym
-from open_apps.tasks.tasks import Task
 
 try:
     # Register the custom 'now' resolver
@@ -117,6 +109,8 @@ class OpenAppsLauncher:
         # increase timeout per wandb folks' suggestion
         # to avoid FAIR cluster network issues
         os.environ["WANDB_INIT_TIMEOUT"] = "60"
+        import wandb
+
         run_name = f"openapps"
         logger = wandb.init(
             **self.config.wandb,
@@ -128,6 +122,8 @@ class OpenAppsLauncher:
 
     def get_git_hash(self) -> Optional[str]:
         try:
+            import git
+
             repo = git.Repo(Path(__file__).parent.parent.parent.resolve())
             sha = repo.head.object.hexsha
             print("git hash", sha)
@@ -196,6 +192,11 @@ class OpenAppsLauncher:
         return port_range
 
     def launch_apps(self):
+        from fasthtml.common import serve
+        from open_apps.apps.start_page.main import (
+            initialize_routes_and_configure_task,
+        )
+
         print("Browser Gym will start at this localhost: ", self.web_app_host)
 
         initialize_routes_and_configure_task(self.config.apps)
@@ -277,6 +278,8 @@ class AgentLauncher(OpenAppsLauncher):
         super().__init__(config)
 
     def _log_agent_results_to_wandb(self, exp_record: dict, exp_result):
+        import wandb
+
         keys_to_save = [
             "n_steps",
             "cum_reward",
@@ -319,6 +322,11 @@ class AgentLauncher(OpenAppsLauncher):
         sleep(20)  # seconds
 
     def setup_browsergym_task(self):
+        from open_apps.tasks.add_tasks_to_browsergym import (
+            register_tasks_with_browsergym,
+        )
+        from open_apps.tasks.tasks import Task
+
         # specifies goal and logic for reward
         task_name = self.config.task_name
         task_configs = self.config.tasks[task_name]
@@ -332,6 +340,8 @@ class AgentLauncher(OpenAppsLauncher):
 
     def launch_agent(self):
         """Launches the agent to perform the task in the OpenApps environment."""
+        from browsergym.experiments import ExpArgs, get_exp_result
+
         self.agent_args = hydra.utils.instantiate(self.config.agent)
         self.browser_gym_task = self.setup_browsergym_task()
 
@@ -359,6 +369,8 @@ class AgentLauncher(OpenAppsLauncher):
 
     def cleanup(self, apps_process: subprocess.Popen):
         if self.config.use_wandb:
+            import wandb
+
             wandb.finish()
         apps_process.terminate()
         apps_process.wait()
@@ -367,6 +379,8 @@ class AgentLauncher(OpenAppsLauncher):
             print("Apps process is still running, stopping OpenApps...")
             apps_process.kill()
             time.sleep(4)
+            from killport import kill_ports
+
             kill_ports(ports=[self.web_app_port])
             print("OpenApps successfully stopped.")
 
@@ -407,6 +421,8 @@ class AgentLauncher(OpenAppsLauncher):
 
 
 if __name__ == "__main__":
+    import git
+
     repo = git.Repo(Path(__file__).parent.parent.parent.resolve())
     sha = repo.head.object.hexsha
     print("git hash", sha)
@@ -59,6 +59,16 @@ def main() -> None:
         choices=["stdio", "sse", "http"],
         help="MCP transport (http = streamable-http).",
     )
+    p.add_argument(
+        "--only",
+        action="store_true",
+        help="Serve just --app (apps.apps_enabled); other apps are never loaded.",
+    )
+    p.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Load each app on its first request instead of at startup (apps.lazy_load).",
+    )
     p.add_argument("--host", default="127.0.0.1", help="Bind host for HTTP/SSE.")
     p.add_argument("--port", type=int, default=8000, help="Bind port for HTTP/SSE.")
     args = p.parse_args()
@@ -66,6 +76,8 @@ def main() -> None:
     os.environ["OPENAPPS_APP"] = args.app
     os.environ["OPENAPPS_MCP_HOST"] = args.host
     os.environ["OPENAPPS_MCP_PORT"] = str(args.port)
+    os.environ["OPENAPPS_ONLY"] = "1" if args.only else ""
+    os.environ["OPENAPPS_LAZY"] = "1" if args.lazy else ""
 
     # stdio uses stdout as the JSONRPC channel: shield it from app prints.
     if args.transport == "stdio":
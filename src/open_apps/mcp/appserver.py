@@ -33,9 +33,11 @@ from omegaconf import DictConfig, OmegaConf, open_dict
 
 from open_apps import config_dir
 from open_apps.apps.start_page.main import (
-    AVAILABLE_APPS,
     app as _fasthtml_app,
+    close_app_storage,
+    export_app_storage,
     initialize_routes_and_configure_task,
+    registered_apps as _registered_apps,
     reset_all_apps,
 )
 from open_apps.mcp.registry import config_dir_for, url_path_for
@@ -73,7 +75,7 @@ def _load_hydra_config(
 
 
 def _wait_until_healthy(
-    base_url: str, timeout: float = 60.0, poll_interval: float = 1.0
+    base_url: str, timeout: float = 60.0, poll_interval: float = 0.1
 ) -> None:
     start = time.monotonic()
     last_error: Any = None
@@ -206,6 +208,14 @@ class AppServer:
 
         shutil.rmtree(new_tmp_logs, ignore_errors=True)
 
+    def export_storage(self, dest_dir: str) -> None:
+        """Copy the apps' sqlite/filesystem state to ``dest_dir``.
+
+        Needed to inspect an episode run with ``storage: memory``, whose
+        state is gone once the process exits.
+        """
+        export_app_storage(self.config.apps, dest_dir)
+
     def get_state(self) -> dict:
         """Probe the running server for the current cross-app state."""
         return get_current_state(self.base_url)
@@ -218,11 +228,11 @@ class AppServer:
         """App keys actually registered this process (Java-aware, post-init).
 
         ``onlineshop`` is only present if config-enabled AND Java 21+ is
-        installed; map planning is likewise gated. Reflects the live
-        ``AVAILABLE_APPS`` after ``initialize_routes_and_configure_task``,
-        not the static registry.
+        installed; map planning is likewise gated. Apps left out of
+        ``apps.apps_enabled`` are not registered. With ``apps.lazy_load``
+        an app is listed before its first request has mounted it.
         """
-        return list(AVAILABLE_APPS.keys())
+        return list(_registered_apps)
 
     def close(self) -> None:
         try:
@@ -230,4 +240,5 @@ class AppServer:
             self._thread.join(timeout=5.0)
         except Exception:
             pass
+        close_app_storage(self.config.apps)
         shutil.rmtree(self._tmp_logs, ignore_errors=True)
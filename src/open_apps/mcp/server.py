@@ -14,7 +14,9 @@ Observations are returned vision-first: a screenshot image content block
 plus a JSON metadata blob ``{url, reward, done, step_count, action_desc}``.
 
 Configure via env (set by ``__main__``): ``OPENAPPS_APP`` (which app to
-serve), ``OPENAPPS_MCP_HOST`` / ``OPENAPPS_MCP_PORT`` (HTTP/SSE bind).
+serve), ``OPENAPPS_MCP_HOST`` / ``OPENAPPS_MCP_PORT`` (HTTP/SSE bind),
+``OPENAPPS_ONLY`` / ``OPENAPPS_LAZY`` (serve just that app / mount apps
+on first request).
 """
 
 from __future__ import annotations
@@ -49,7 +51,12 @@ def _require() -> Session:
 async def _lifespan(_server):
     global _session
     app_name = os.environ.get("OPENAPPS_APP", "todo")
-    _session = Session(app_name)
+    overrides = []
+    if os.environ.get("OPENAPPS_ONLY"):
+        overrides.append(f"apps.apps_enabled=[{app_name}]")
+    if os.environ.get("OPENAPPS_LAZY"):
+        overrides.append("apps.lazy_load=True")
+    _session = Session(app_name, extra_overrides=overrides)
     await _session.start()
     try:
         yield
@@ -36,14 +36,17 @@ def get_current_state(url: str) -> dict:
     Returns:
         Dict keyed by app name (todo, calendar, map, messenger,
         codeeditor, online_shop) whose values are the JSON the
-        corresponding ``/<app>_all`` endpoints return.
+        corresponding ``/<app>_all`` endpoints return. The code editor
+        is probed in manifest mode (paths, sizes, mtimes and content
+        hashes, no contents); fetch contents from
+        ``/codeeditor_contents?path=...`` if a task needs them.
     """
     state: dict = {}
     state["todo"] = safe_get_json(url + "/todo_all")
     state["calendar"] = safe_get_json(url + "/calendar_all")
     state["map"] = safe_get_json(url + "/maps/landmarks")
     state["messenger"] = safe_get_json(url + "/messages_all")
-    state["codeeditor"] = safe_get_json(url + "/codeeditor_all")
+    state["codeeditor"] = safe_get_json(url + "/codeeditor_all?mode=manifest")
     try:
         state["online_shop"] = safe_get_json(url + "/onlineshop_all")
     except Exception:
@@ -20,6 +20,8 @@ from open_apps.tasks import load_task
 from starlette.testclient import TestClient
 from hydra import initialize, compose
 from pathlib import Path
+from datetime import date
+from types import SimpleNamespace
 import json
 from open_apps.apps.start_page.main import (
     app,
@@ -70,6 +72,46 @@ class TestApps:
         response_json = response.json()
         assert isinstance(response_json, list)
 
+    def test_messages_send(self, client):
+        """a send appends the message and the auto-reply to the conversation"""
+        before = {c["user"]: c["messages"] for c in client.get("/messages_all").json()}
+        response = client.post(
+            "/messages/send", data={"msg": "See you there", "interlocutor": "Bob"}
+        )
+        assert response.status_code == 200
+
+        after = {c["user"]: c["messages"] for c in client.get("/messages_all").json()}
+        assert after["Bob"][:-2] == before["Bob"]
+        assert after["Bob"][-2][:2] == ["See you there", "you"]
+        assert after["Bob"][-1][1] == "Bob"
+
+    def test_messages_index_rows_follow_new_messages(self, client):
+        from open_apps.apps.messenger_app import main as messenger_main
+
+        client.get("/messages")
+        for text in ["First row update", "Second row update"]:
+            client.post("/messages/send", data={"msg": text, "interlocutor": "Bob"})
+            page = client.get("/messages").text
+        # one entry per conversation, replaced when its message count changes
+        users = {c["user"] for c in client.get("/messages_all").json()}
+        assert set(messenger_main._conversation_row_cache) == users
+        count, _ = messenger_main._conversation_row_cache["Bob"]
+        assert count == len(
+            next(c for c in client.get("/messages_all").json() if c["user"] == "Bob")["messages"]
+        )
+        assert page.count('href="/messages/Bob"') == 1
+
+    def test_messages_search(self, client):
+        client.post(
+            "/messages/send", data={"msg": "Meet at the Boathouse", "interlocutor": "Bob"}
+        )
+        response = client.get("/messages/Bob/search", params={"q": "boathouse"})
+        assert response.status_code == 200
+        assert "search-result-item" in response.text
+
+        response = client.get("/messages/Bob/search", params={"q": "qqqzzz"})
+        assert "No results" in response.text
+
     def test_todo(self, client):
         response = client.get("/todo")
         assert response.status_code == 200
@@ -78,14 +120,152 @@ class TestApps:
         response = client.get("/calendar")
         assert response.status_code == 200
 
+    def test_calendar_rss(self, client):
+        response = client.get("/calendar/rss")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/rss+xml")
+
+        # conditional GET with the cached feed's ETag
+        response = client.get(
+            "/calendar/rss", headers={"If-None-Match": response.headers["etag"]}
+        )
+        assert response.status_code == 304
+
     def test_codeeditor(self, client):
         response = client.get("/codeeditor")
         assert response.status_code == 200
 
+    def test_codeeditor_manifest(self, client):
+        """manifest mode, diff since a generation and the contents endpoint"""
+        manifest = client.get("/codeeditor_all", params={"mode": "manifest"}).json()
+        generation = manifest["generation"]
+        client.post("/codeeditor/save/manifest_test.py", json={"content": "x = 1"})
+
+        changes = client.get("/codeeditor_all", params={"since": generation}).json()
+        assert [f["path"] for f in changes["changed"]] == ["manifest_test.py"]
+        assert changes["generation"] > generation
+
+        contents = client.get(
+            "/codeeditor_contents", params={"path": "manifest_test.py"}
+        ).json()
+        assert contents == {"manifest_test.py": "x = 1"}
+
+    def test_codeeditor_changes_since(self, client):
+        """an add, a modify and a delete through the routes, then since="""
+        generation = client.get("/codeeditor_all", params={"mode": "manifest"}).json()["generation"]
+        client.post("/codeeditor/save/since_test.py", json={"content": "a = 1"})
+        client.post("/codeeditor/save/since_test.py", json={"content": "a = 2"})
+        client.post("/codeeditor/save/since_gone.py", json={"content": "b = 1"})
+        middle = client.get("/codeeditor_all", params={"since": generation}).json()
+        assert [f["path"] for f in middle["changed"]] == ["since_gone.py", "since_test.py"]
+        client.post("/codeeditor/delete/since_gone.py")
+
+        changes = client.get("/codeeditor_all", params={"since": middle["generation"]}).json()
+        assert changes["changed"] == []
+        assert changes["deleted"] == ["since_gone.py"]
+        changes = client.get("/codeeditor_all", params={"since": generation}).json()
+        assert [f["path"] for f in changes["changed"]] == ["since_test.py"]
+        assert changes["deleted"] == ["since_gone.py"]
+
+        manifest = client.get("/codeeditor_all", params={"mode": "manifest"}).json()
+        names = [child["name"] for child in manifest["children"]]
+        assert "since_test.py" in names and "since_gone.py" not in names
+        client.post("/codeeditor/delete/since_test.py")
+
     def test_map(self, client):
         response = client.get("/maps")
         assert response.status_code == 200
 
+    def test_map_landmarks_bulk_and_bbox(self, client):
+        all_before = client.get("/maps/landmarks").json()
+        places = [
+            {"name": f"Bulk {i}", "coords": [10 + i * 0.001, 20 + i * 0.001]}
+            for i in range(3)
+        ]
+        response = client.post("/maps/landmarks/bulk", json=places + places[:1])
+        assert response.json() == {
+            "added": ["Bulk 0", "Bulk 1", "Bulk 2"],
+            "skipped": ["Bulk 0"],
+        }
+
+        in_box = client.get("/maps/landmarks", params={"bbox": "19.9,9.9,20.0015,10.0015"})
+        assert [l["name"] for l in in_box.json()] == ["Bulk 0", "Bulk 1"]
+
+        response = client.post(
+            "/maps/landmarks/bulk_delete", json={"names": ["Bulk 0", "Bulk 1", "Bulk 2"]}
+        )
+        assert len(response.json()["deleted"]) == 3
+        assert client.get("/maps/landmarks").json() == all_before
+
+    def test_map_landmarks_read_from_table(self, client):
+        from open_apps.apps.map_app import main as map_main
+
+        client.get("/maps")
+        # a row the grid has not seen still reaches the reward state
+        map_main.landmarks.insert(
+            {"name": "Table only", "lat": 1.0, "lng": 2.0, "icon": "star", "color": "red"}
+        )
+        try:
+            assert {
+                "name": "Table only",
+                "coords": [1.0, 2.0],
+                "markerStyle": {"icon": "star", "color": "red"},
+            } in client.get("/maps/landmarks").json()
+            in_box = client.get("/maps/landmarks", params={"bbox": "1.9,0.9,2.1,1.1"})
+            assert in_box.json() == []
+        finally:
+            map_main.landmarks.delete("Table only")
+
+    def test_map_where(self, client):
+        """/maps/where is answered offline from the bundled gazetteer"""
+        response = client.get("/maps/where", params={"q": "brooklin bridge"})
+        assert response.json()["name"] == "Brooklyn Bridge"
+
+        response = client.get("/maps/where", params={"q": "Times Square"})
+        assert response.json()["display_name"].startswith("Times Square")
+        assert "osm_id" in response.json()
+
+    def test_geocoder_falls_back_to_remote(self):
+        import asyncio
+        import requests
+        from open_apps.apps.map_app.geocoder import Geocoder, Place, load_gazetteer
+
+        class Remote:
+            def __init__(self):
+                self.down = False
+
+            def search(self, query, limit):
+                if self.down:
+                    raise requests.exceptions.ConnectionError()
+                return [Place("Remote " + query, 1.0, 2.0, osm_id=42)]
+
+        remote = Remote()
+        geocoder = Geocoder(load_gazetteer(), remote=remote)
+        search = lambda q: asyncio.run(geocoder.search(q))
+        assert search("Times Square")[0].name == "Times Square"
+        assert search("Nowhere at all")[0].osm_id == 42
+        remote.down = True
+        assert search("Somewhere else entirely") == []
+
+    def test_map_route(self, client):
+        """the local planner answers in OTP's planConnection shape"""
+        params = {
+            "from_lat": 40.7061,
+            "from_lon": -73.9969,
+            "to_lat": 40.8075,
+            "to_lon": -73.9626,
+            "date": "2025-06-01",
+            "time": "14:30:00",
+        }
+        plan = client.get("/maps/route", params=params).json()
+        itineraries = plan["data"]["planConnection"]["edges"]
+        legs = itineraries[0]["node"]["legs"]
+        assert "SUBWAY" in [leg["mode"] for leg in legs]
+        assert legs[0]["from"]["name"] == "Origin"
+        assert legs[-1]["to"]["name"] == "Destination"
+        # the walking-only alternative
+        assert [leg["mode"] for leg in itineraries[-1]["node"]["legs"]] == ["WALK"]
+
     def test_onlineshop(self, client):
         if get_java_version().startswith("21"):
             response = client.get("/onlineshop")
@@ -95,6 +275,122 @@ class TestApps:
             pytest.skip("Java version is not 21 or higher, skipping onlineshop test.")
 
 
+def make_event(date, recurring, title="event"):
+    from open_apps.apps.calendar_app.main import Event
+
+    return Event(id=None, title=title, date=date, description="", recurring=recurring)
+
+
+def dates(instances):
+    return [event.date for event in instances]
+
+
+class TestCalendarRecurrence:
+    def test_weekly_across_month_and_year(self):
+        from open_apps.apps.calendar_app.recurrence import RecurrenceIndex
+
+        index = RecurrenceIndex([make_event("2024-01-29", "weekly")])  # a Monday
+        assert dates(index.events_for_month(2024, 2)) == [
+            "2024-02-05", "2024-02-12", "2024-02-19", "2024-02-26",
+        ]
+        # the original date is left to the direct query
+        assert dates(index.events_between(date(2024, 1, 25), date(2024, 2, 10))) == [
+            "2024-02-05",
+        ]
+        assert dates(index.events_between(date(2024, 12, 28), date(2025, 1, 8))) == [
+            "2024-12-30", "2025-01-06",
+        ]
+
+    def test_monthly_only_where_the_day_exists(self):
+        from open_apps.apps.calendar_app.recurrence import RecurrenceIndex
+
+        index = RecurrenceIndex([make_event("2024-01-31", "monthly")])
+        assert dates(index.events_for_month(2024, 2)) == []
+        assert dates(index.events_for_month(2024, 3)) == ["2024-03-31"]
+        assert dates(index.events_for_month(2023, 12)) == ["2023-12-31"]
+        assert dates(index.events_for_month(2024, 1)) == []
+        assert dates(index.events_between(date(2024, 11, 15), date(2025, 2, 15))) == [
+            "2024-12-31", "2025-01-31",
+        ]
+
+    def test_yearly_across_years(self):
+        from open_apps.apps.calendar_app.recurrence import RecurrenceIndex
+
+        index = RecurrenceIndex(
+            [make_event("2024-02-29", "yearly", "leap"), make_event("2023-12-31", "yearly", "eve")]
+        )
+        assert dates(index.events_for_month(2025, 2)) == []
+        assert dates(index.events_for_month(2028, 2)) == ["2028-02-29"]
+        assert dates(index.events_for_month(2020, 12)) == ["2020-12-31"]
+        found = index.events_between(date(2024, 12, 15), date(2025, 1, 15))
+        assert [(e.title, e.date) for e in found] == [("eve", "2024-12-31")]
+        # stored order first, then date order within an event
+        found = index.events_between(date(2027, 1, 1), date(2028, 12, 31))
+        assert [(e.title, e.date) for e in found] == [
+            ("leap", "2028-02-29"), ("eve", "2027-12-31"), ("eve", "2028-12-31"),
+        ]
+
+    def test_caches_follow_add_edit_and_delete(self, client):
+        from open_apps.apps.calendar_app import main as calendar_main
+
+        assert client.get("/calendar").status_code == 200  # mounts the app
+        assert "cache test" not in [e.title for e in calendar_main.get_events_for_month(2031, 5)]
+
+        response = client.post(
+            "/calendar/create_event/save_text",
+            data={"title": "cache test", "date": "2031-04-10", "recurring": "monthly"},
+            follow_redirects=False,
+        )
+        assert response.status_code == 303
+        may = [e for e in calendar_main.get_events_for_month(2031, 5) if e.title == "cache test"]
+        assert dates(may) == ["2031-05-10"]
+        # callers get their own list, changing it leaves the cache as is
+        calendar_main.get_events_for_month(2031, 5).clear()
+        assert calendar_main.get_events_for_month(2031, 5)
+
+        event = calendar_main.events("title=?", ["cache test"])[0]
+        event.date = "2031-04-12"
+        calendar_main.events.update(event)
+        calendar_main.invalidate_event_caches()
+        may = [e for e in calendar_main.get_events_for_month(2031, 5) if e.title == "cache test"]
+        assert dates(may) == ["2031-05-12"]
+
+        response = client.post(f"/calendar/event/{event.id}/delete", follow_redirects=False)
+        assert response.status_code == 303
+        assert "cache test" not in [e.title for e in calendar_main.get_events_for_month(2031, 5)]
+
+    def test_rss_conditional_get(self, client):
+        from open_apps.apps.calendar_app import main as calendar_main
+
+        assert client.get("/calendar").status_code == 200
+        feed = calendar_main.get_rss_feed()
+        assert calendar_main.get_rss_feed() is feed
+
+        def headers(**values):
+            return SimpleNamespace(headers={k.replace("_", "-"): v for k, v in values.items()})
+
+        assert calendar_main.is_not_modified(headers(if_none_match=feed["etag"]), feed)
+        assert calendar_main.is_not_modified(headers(if_none_match=f'"x", {feed["etag"]}'), feed)
+        assert calendar_main.is_not_modified(headers(if_none_match="*"), feed)
+        assert not calendar_main.is_not_modified(headers(if_none_match='"x"'), feed)
+        assert calendar_main.is_not_modified(
+            headers(if_modified_since=feed["last_modified"]), feed
+        )
+        assert not calendar_main.is_not_modified(
+            headers(if_modified_since="Mon, 01 Jan 2001 00:00:00 GMT"), feed
+        )
+        assert not calendar_main.is_not_modified(headers(if_modified_since="garbage"), feed)
+        assert not calendar_main.is_not_modified(headers(), feed)
+
+        response = client.get(
+            "/calendar/rss", headers={"If-Modified-Since": feed["last_modified"]}
+        )
+        assert response.status_code == 304
+        # a change to the events drops the cached feed
+        calendar_main.invalidate_event_caches()
+        assert calendar_main.get_rss_feed() is not feed
+
+
 class TestTasks:
     def test_homepage(self, client):
         response = client.get("/")
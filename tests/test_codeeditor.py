@@ -0,0 +1,206 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+"""
+Tests for the code editor's file tree index and workspace seeding.
+"""
+
+import hashlib
+import os
+import shutil
+
+import pytest
+
+from open_apps.apps.codeeditor_app.file_index import FileTreeIndex
+from open_apps.apps.codeeditor_app.main import create_file_system
+from open_apps.apps.codeeditor_app.workspace import detach, seed_workspace, template_dir_for
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("print('hi')\n")
+    (tmp_path / "src" / "util.py").write_text("x = 1\n")
+    (tmp_path / "README.md").write_text("# readme\n")
+    return str(tmp_path)
+
+
+def walk_manifest(root):
+    """The manifest entries of a full walk of the directory."""
+    entries = {}
+    for folder, _, files in os.walk(root):
+        for name in files:
+            full_path = os.path.join(folder, name)
+            stat = os.stat(full_path)
+            with open(full_path, "rb") as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            entries[os.path.relpath(full_path, root)] = {
+                "path": os.path.relpath(full_path, root),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "hash": digest,
+            }
+    return entries
+
+
+def manifest_files(tree):
+    found = {}
+    for child in tree["children"]:
+        if child["type"] == "folder":
+            found.update(manifest_files(child))
+        else:
+            found[child["path"]] = {k: child[k] for k in ("path", "size", "mtime", "hash")}
+    return found
+
+
+def test_manifest_matches_full_walk(root):
+    index = FileTreeIndex(root)
+    assert manifest_files(index.tree(manifest=True)) == walk_manifest(root)
+    tree = index.tree()
+    assert [child["name"] for child in tree["children"]] == ["README.md", "src"]
+    assert tree["children"][0]["content"] == "# readme\n"
+
+
+def test_manifest_caches_digests_only(root):
+    index = FileTreeIndex(root)
+    index.tree(manifest=True)
+    assert all(node.content is None for node in index.files())
+    assert set(index._digests) == {"README.md", "src/main.py", "src/util.py"}
+
+    # unchanged files are not hashed again after a rebuild
+    index._digests["README.md"] = index._digests["README.md"][:2] + ("cached",)
+    index.rebuild()
+    assert index.file_hash(index.get("README.md")) == "cached"
+    with open(os.path.join(root, "README.md"), "a") as f:
+        f.write("more\n")
+    index.rebuild()
+    assert manifest_files(index.tree(manifest=True)) == walk_manifest(root)
+
+
+def test_changes_since(root):
+    index = FileTreeIndex(root)
+    start = index.generation
+
+    # add
+    with open(os.path.join(root, "src", "new.py"), "w") as f:
+        f.write("y = 2\n")
+    index.write_file("src/new.py", "y = 2\n")
+    changes = index.changes_since(start)
+    assert [f["path"] for f in changes["changed"]] == ["src/new.py"]
+    assert changes["deleted"] == []
+    after_add = changes["generation"]
+
+    # modify
+    with open(os.path.join(root, "src", "util.py"), "w") as f:
+        f.write("x = 3\n")
+    index.write_file("src/util.py", "x = 3\n")
+    changes = index.changes_since(after_add)
+    assert [f["path"] for f in changes["changed"]] == ["src/util.py"]
+    assert changes["changed"][0]["hash"] == hashlib.sha1(b"x = 3\n").hexdigest()
+    after_modify = changes["generation"]
+
+    # delete
+    os.remove(os.path.join(root, "README.md"))
+    index.remove("README.md")
+    changes = index.changes_since(after_modify)
+    assert changes == {"generation": index.generation, "changed": [], "deleted": ["README.md"]}
+
+    # from the start, a later re-added path is changed rather than deleted
+    changes = index.changes_since(start)
+    assert [f["path"] for f in changes["changed"]] == ["src/new.py", "src/util.py"]
+    assert changes["deleted"] == ["README.md"]
+    assert index.changes_since(index.generation)["changed"] == []
+
+    assert manifest_files(index.tree(manifest=True)) == walk_manifest(root)
+
+
+def test_rebuild_reports_everything(root):
+    index = FileTreeIndex(root)
+    start = index.generation
+    index.rebuild()
+    changes = index.changes_since(start)
+    assert [f["path"] for f in changes["changed"]] == ["README.md", "src/main.py", "src/util.py"]
+    assert changes["deleted"] == []
+
+
+FILE_SYSTEM = [
+    {"name": "src", "type": "folder", "content": [
+        {"name": "main.py", "type": "file", "content": "print('hi')\n"},
+    ]},
+    {"name": "README.md", "type": "file", "content": "# readme\n"},
+]
+
+
+def read_tree(root):
+    """Relative path -> content of every file under ``root``."""
+    found = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path) as f:
+                found[os.path.relpath(path, root)] = f.read()
+    return found
+
+
+@pytest.fixture
+def create():
+    """``create_file_system``, counting the templates it builds."""
+    calls = []
+
+    def create(base_path, file_system):
+        calls.append(base_path)
+        create_file_system(base_path, file_system)
+
+    create.calls = calls
+    return create
+
+
+def test_seed_and_reset(tmp_path, create):
+    workspace = str(tmp_path / "workspace")
+    seed_workspace(workspace, FILE_SYSTEM, create)
+    assert read_tree(workspace) == {"README.md": "# readme\n", "src/main.py": "print('hi')\n"}
+    seeded = read_tree(workspace)
+    # workspace files can be written like any other file
+    assert os.access(os.path.join(workspace, "README.md"), os.W_OK)
+
+    # a reset removes the workspace and seeds it again, from the cached template
+    with open(os.path.join(workspace, "new.txt"), "w") as f:
+        f.write("new\n")
+    shutil.rmtree(workspace)
+    seed_workspace(workspace, FILE_SYSTEM, create)
+    assert read_tree(workspace) == seeded
+    assert len(create.calls) == 1
+
+    # a second workspace reuses the same template
+    other = str(tmp_path / "other")
+    seed_workspace(other, FILE_SYSTEM, create)
+    assert read_tree(other) == seeded
+    assert len(create.calls) == 1
+    assert os.path.samefile(os.path.join(workspace, "README.md"), os.path.join(other, "README.md"))
+
+
+def test_edits_do_not_leak_into_template(tmp_path, create):
+    workspace = str(tmp_path / "workspace")
+    seed_workspace(workspace, FILE_SYSTEM, create)
+    template = template_dir_for(workspace, FILE_SYSTEM)
+    seeded = read_tree(template)
+
+    # the save route detaches the file first: the template stays as is
+    path = os.path.join(workspace, "src", "main.py")
+    detach(path)
+    with open(path, "w") as f:
+        f.write("print('saved')\n")
+    assert read_tree(template) == seeded
+
+    # a write through the link is caught, and the template rebuilt on reset
+    with open(os.path.join(workspace, "README.md"), "a") as f:
+        f.write("edited\n")
+    shutil.rmtree(workspace)
+    seed_workspace(workspace, FILE_SYSTEM, create)
+    assert len(create.calls) == 2
+    assert read_tree(template) == seeded
+    assert read_tree(workspace) == seeded
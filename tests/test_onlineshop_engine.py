@@ -0,0 +1,520 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+"""
+Tests for the onlineshop engine, on a small generated product set.
+"""
+
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+from importlib.util import find_spec
+
+import pytest
+
+from open_apps.apps.onlineshop_app.engine.catalog import (
+    Catalog,
+    CatalogError,
+    build_catalog,
+    ensure_catalog,
+    load_catalog,
+)
+from open_apps.apps.onlineshop_app.engine.engine import (
+    SearchResultCache,
+    build_product_index,
+    get_product_per_page,
+    get_top_n_product_from_keywords,
+    load_products,
+)
+from open_apps.apps.onlineshop_app.engine.goal import (
+    get_goals,
+    get_reward,
+    get_rewards,
+)
+from open_apps.apps.onlineshop_app.engine.search import (
+    BM25Backend,
+    LuceneBackend,
+    PorterStemmer,
+    analyze,
+    SearchBackend,
+    build_bm25_index,
+)
+from open_apps.apps.onlineshop_app.search_engine import convert_product_file_format
+from open_apps.apps.start_page.helper import get_java_version
+
+
+def make_product(i):
+    return {
+        "asin": f"B0000000{i:02d}",
+        "category": "beauty" if i % 2 else "garden",
+        "query": f"Query {i % 3} ",
+        "product_category": "Beauty › Skin Care",
+        "name": f"Product {i}",
+        "full_description": f"Description of product {i}",
+        "small_description": [f"Bullet {i}"],
+        "pricing": "$12.99" if i % 2 else "$5.00 - $7.50",
+        "customization_options": {
+            "Color": [{"value": "Red/Blue", "image": "red.jpg"}, {"value": "Green"}],
+        }
+        if i % 3 == 0
+        else None,
+        "images": [f"https://example.com/{i}.jpg"],
+    }
+
+
+@pytest.fixture
+def product_files(tmp_path):
+    products = [make_product(i) for i in range(12)]
+    products.append(make_product(3))  # duplicate ASIN, dropped
+    paths = {
+        "filepath": tmp_path / "items.json",
+        "attr_path": tmp_path / "items_ins.json",
+        "human_attr_path": tmp_path / "items_human_ins.json",
+    }
+    paths["filepath"].write_text(json.dumps(products))
+    paths["attr_path"].write_text(
+        json.dumps(
+            {p["asin"]: {"attributes": [f"attr {i % 4}"]} for i, p in enumerate(products)}
+        )
+    )
+    paths["human_attr_path"].write_text(
+        json.dumps({products[0]["asin"]: [{"instruction": "buy it"}]})
+    )
+    return {name: str(path) for name, path in paths.items()}
+
+
+def test_catalog_matches_load_products(product_files, tmp_path):
+    catalog_path = str(tmp_path / "catalog.bin")
+    assert build_catalog(catalog_path, **product_files) == 12
+
+    random.seed(0)
+    expected = load_products(**product_files)
+    random.seed(0)
+    loaded = load_catalog(catalog_path, sources=product_files.values())
+
+    all_products, product_item_dict, product_prices, attribute_to_asins = loaded
+    assert list(all_products) == expected[0]
+    assert all_products[-1] == expected[0][-1]
+    assert dict(product_item_dict) == expected[1]
+    assert product_prices == expected[2]
+    assert attribute_to_asins == expected[3]
+    assert attribute_to_asins["no such attribute"] == set()
+    assert "B000000099" not in product_item_dict
+    # records are decoded once and shared, like the dicts of load_products
+    assert all_products[0] is product_item_dict[all_products[0]["asin"]]
+
+
+def test_catalog_rejects_stale_or_foreign_files(product_files, tmp_path):
+    catalog_path = str(tmp_path / "catalog.bin")
+    build_catalog(catalog_path, **product_files)
+
+    with pytest.raises(CatalogError):
+        load_catalog(catalog_path, num_products=5, sources=product_files.values())
+
+    with open(product_files["attr_path"], "a") as f:
+        f.write("\n")
+    with pytest.raises(CatalogError):
+        load_catalog(catalog_path, sources=product_files.values())
+
+    with pytest.raises(CatalogError):
+        load_catalog(product_files["filepath"])
+
+    with pytest.raises(OSError):
+        load_catalog(str(tmp_path / "missing.bin"))
+
+
+def test_catalog_lookups_and_record_cache(product_files, tmp_path):
+    catalog_path = str(tmp_path / "catalog.bin")
+    build_catalog(catalog_path, **product_files)
+    expected, *_ = load_products(**product_files)
+
+    catalog = Catalog(catalog_path, cache_size=2)
+    for i, product in enumerate(expected):
+        assert catalog.position(product["asin"]) == i
+        assert catalog.product(i) == product
+    with pytest.raises(KeyError):
+        catalog.position("B000000000x")
+    assert len(catalog._cache) == 2
+    catalog.close()
+
+
+def test_ensure_catalog_builds_once(product_files, tmp_path):
+    catalog_path = str(tmp_path / "catalog.bin")
+    all_products, *_ = ensure_catalog(catalog_path, **product_files)
+    assert len(all_products) == 12
+    built = os.stat(catalog_path).st_mtime_ns
+
+    ensure_catalog(catalog_path, **product_files)
+    assert os.stat(catalog_path).st_mtime_ns == built
+
+    # a stale catalog is rebuilt
+    with open(product_files["filepath"], "a") as f:
+        f.write("\n")
+    ensure_catalog(catalog_path, **product_files)
+    assert os.stat(catalog_path).st_mtime_ns != built
+
+
+DOCUMENTS = [
+    ("B000000001", "red running shoes for women"),
+    ("B000000002", "blue running shorts"),
+    ("B000000003", "women's leather shoes, red and brown"),
+    ("B000000004", "garden hose, 50 feet"),
+    ("B000000005", "running running running socks"),
+]
+
+
+@pytest.fixture
+def documents(tmp_path):
+    path = tmp_path / "documents.jsonl"
+    with open(path, "w") as f:
+        for asin, contents in DOCUMENTS:
+            f.write(json.dumps({"id": asin, "contents": contents}) + "\n")
+    return str(path)
+
+
+def test_analyze():
+    stemmer = PorterStemmer()
+    for word, stem in [
+        ("caresses", "caress"),
+        ("ponies", "poni"),
+        ("hopping", "hop"),
+        ("relational", "relat"),
+        ("generalizations", "gener"),
+        ("adoption", "adopt"),
+        ("controll", "control"),
+    ]:
+        assert stemmer.stem(word) == stem
+    assert analyze("The Women's Running-Shoes, 3.5 inch") == [
+        "women",
+        "run",
+        "shoe",
+        "3.5",
+        "inch",
+    ]
+
+
+def test_bm25_backend(documents, tmp_path):
+    index_path = str(tmp_path / "index_bm25.bin")
+    assert build_bm25_index(documents, index_path) == 5
+    backend = BM25Backend(index_path)
+
+    # lengths are below Lucene's lossy length encoding, so BM25 is exact
+    lengths = [len(analyze(contents)) for _, contents in DOCUMENTS]
+    avgdl = sum(lengths) / len(lengths)
+
+    def bm25(tf, df, length):
+        idf = math.log(1 + (5 - df + 0.5) / (df + 0.5))
+        return idf * tf / (tf + 0.9 * (1 - 0.4 + 0.4 * length / avgdl))
+
+    scores = backend.scores("running shoes")
+    assert scores[0] == pytest.approx(bm25(1, 3, lengths[0]) + bm25(1, 2, lengths[0]))
+    assert scores[4] == pytest.approx(bm25(3, 3, lengths[4]))
+    assert set(scores) == {0, 1, 2, 4}
+
+    assert backend.search_asins("running shoes", k=2) == ["B000000001", "B000000003"]
+    assert backend.search_asins("red shoe", k=10) == ["B000000001", "B000000003"]
+    assert backend.search_asins("the", k=10) == []
+    assert backend.search_asins("hose", k=10) == ["B000000004"]
+    backend.close()
+
+
+def test_keyword_search_with_bm25(product_files, tmp_path):
+    products, product_item_dict, *_ = load_products(**product_files)
+    path = tmp_path / "documents.jsonl"
+    with open(path, "w") as f:
+        for p in products:
+            contents = " ".join([p["Title"], p["Description"], p["BulletPoints"][0]])
+            f.write(json.dumps({"id": p["asin"], "contents": contents.lower()}) + "\n")
+    build_bm25_index(str(path), str(tmp_path / "index_bm25.bin"))
+    backend = BM25Backend(str(tmp_path / "index_bm25.bin"))
+
+    found = get_top_n_product_from_keywords(
+        ["product", "7"], backend, products, product_item_dict
+    )
+    assert found[0]["asin"] == "B000000007"
+    backend.close()
+
+
+@pytest.mark.skipif(
+    find_spec("pyserini") is None or not get_java_version().startswith("21"),
+    reason="the Lucene backend needs pyserini and Java 21",
+)
+def test_bm25_matches_lucene(documents, tmp_path):
+    subprocess.run(
+        [
+            sys.executable, "-m", "pyserini.index.lucene",
+            "--collection", "JsonCollection",
+            "--input", os.path.dirname(documents),
+            "--index", str(tmp_path / "lucene"),
+            "--generator", "DefaultLuceneDocumentGenerator",
+            "--threads", "1",
+            "--storeRaw",
+        ],
+        check=True,
+    )
+    build_bm25_index(documents, str(tmp_path / "index_bm25.bin"))
+    lucene = LuceneBackend(str(tmp_path / "lucene"))
+    bm25 = BM25Backend(str(tmp_path / "index_bm25.bin"))
+    for query in ["running shoes", "red", "women's shoes", "garden hose feet"]:
+        assert bm25.search_asins(query, k=5) == lucene.search_asins(query, k=5)
+    bm25.close()
+
+
+def test_convert_documents_incrementally(product_files, tmp_path):
+    catalog_path = str(tmp_path / "catalog.bin")
+    build_catalog(catalog_path, **product_files)
+    output_dir = tmp_path / "search_engine"
+    output_dir.mkdir()
+    (output_dir / "resources").mkdir()
+    (output_dir / "resources" / "documents.jsonl").write_text("")
+
+    def convert():
+        return convert_product_file_format.convert(
+            catalog_path, str(output_dir), threads=2, shard_size=5
+        )
+
+    def read_documents(tier):
+        files = sorted((output_dir / tier).glob("*.jsonl"))
+        return [json.loads(line) for f in files for line in f.read_text().splitlines()]
+
+    def modified():
+        return {
+            path: path.stat().st_mtime_ns
+            for path in output_dir.glob("resources*/*.jsonl")
+        }
+
+    tiers = list(convert_product_file_format.TIERS)
+    assert convert() == tiers
+    products, *_ = load_products(**product_files)
+    expected = [convert_product_file_format.product_document(p) for p in products]
+    for tier in tiers:
+        assert read_documents(tier) == json.loads(json.dumps(expected))
+        assert len(list((output_dir / tier).glob("*.jsonl"))) == 3
+    # the single file of older versions is replaced by the shards
+    assert not (output_dir / "resources" / "documents.jsonl").exists()
+
+    before = modified()
+    stamp = (output_dir / "resources.stamp").read_text()
+    assert convert() == []
+    assert modified() == before
+    assert (output_dir / "resources.stamp").read_text() == stamp
+
+    # a new product only rewrites the last shard
+    items = json.loads(open(product_files["filepath"]).read())
+    items.append(make_product(12))
+    with open(product_files["filepath"], "w") as f:
+        json.dump(items, f)
+    build_catalog(catalog_path, **product_files)
+    assert convert() == tiers
+    after = modified()
+    rewritten = {path.name for path in after if after[path] != before[path]}
+    assert rewritten == {"documents-00002.jsonl"}
+    assert (output_dir / "resources.stamp").read_text() != stamp
+    assert [doc["id"] for doc in read_documents("resources")][-1] == "B000000012"
+
+    index_path = str(tmp_path / "index_bm25.bin")
+    assert build_bm25_index(str(output_dir / "resources"), index_path) == 13
+
+
+class CountingBackend(SearchBackend):
+    def __init__(self, asins):
+        self.asins = asins
+        self.queries = []
+
+    def search_asins(self, query, k):
+        self.queries.append(query)
+        return self.asins[:k]
+
+
+def test_search_result_cache(product_files):
+    products, product_item_dict, _, attribute_to_asins = load_products(**product_files)
+    backend = CountingBackend([p["asin"] for p in reversed(products)])
+    cache = SearchResultCache(maxsize=2)
+
+    def search(*keywords):
+        return cache.ranked_asins(
+            list(keywords), backend, products, product_item_dict, attribute_to_asins
+        )
+
+    first = search("red", "shoes")
+    assert get_product_per_page(first, 2) == first[10:12]
+    # other pages, and the same query spelled differently, hit the cache
+    assert search("Red ", "shoes") is first
+    assert backend.queries == ["red shoes"]
+    assert search("<c>", "beauty") == tuple(
+        p["asin"] for p in products if p["category"] == "beauty"
+    )
+    # the least recent query is evicted
+    search("garden")
+    search("red", "shoes")
+    assert backend.queries == ["red shoes", "garden", "red shoes"]
+    # catalog records are not touched
+    assert "search_keywords" not in product_item_dict[first[0]]
+
+
+@pytest.mark.parametrize("from_catalog", [False, True])
+def test_filtered_search_uses_product_index(product_files, tmp_path, from_catalog):
+    if from_catalog:
+        catalog_path = str(tmp_path / "catalog.bin")
+        build_catalog(catalog_path, **product_files)
+        loaded = load_catalog(catalog_path, sources=product_files.values())
+    else:
+        loaded = load_products(**product_files)
+    products, product_item_dict, product_prices, attribute_to_asins = loaded
+    index = build_product_index(products, product_prices)
+
+    def search(*keywords, index=index):
+        found = get_top_n_product_from_keywords(
+            list(keywords), None, products, product_item_dict, attribute_to_asins, index
+        )
+        return [p["asin"] for p in found]
+
+    # each filter alone finds what the catalog scan finds
+    for keywords in [("<a>", "attr", "1"), ("<c>", "beauty"), ("<q>", "query 2")]:
+        assert search(*keywords) == search(*keywords, index=None)
+        assert search(*keywords)
+    assert search("<c>", "toys") == []
+
+    beauty = set(search("<c>", "beauty"))
+    attr_1 = set(search("<a>", "attr", "1"))
+    assert search("<c>", "beauty", "<a>", "attr", "1") == [
+        p["asin"] for p in products if p["asin"] in beauty & attr_1
+    ]
+
+    cheap = search("<p>", "", "10")
+    assert cheap == [p["asin"] for p in products if product_prices[p["asin"]] <= 10]
+    assert 0 < len(cheap) < len(products)
+    assert search("<p>", "10", "*") == [
+        p["asin"] for p in products if product_prices[p["asin"]] >= 10
+    ]
+
+
+class Token:
+    def __init__(self, text):
+        self.text = text
+        self.pos_ = "NOUN" if text[0].isupper() else "X"
+
+
+class CountingNLP:
+    """Stands in for a spaCy pipeline: capitalized words are nouns."""
+
+    def __init__(self):
+        self.parsed = []
+        self.batches = []
+
+    def __call__(self, text):
+        self.parsed.append(text)
+        return [Token(word) for word in text.split()]
+
+    def pipe(self, texts, batch_size):
+        texts = list(texts)
+        self.batches.append(texts)
+        return [[Token(word) for word in text.split()] for text in texts]
+
+
+def test_rewards_parse_each_name_once(product_files):
+    products, product_item_dict, *_ = load_products(**product_files)
+    goal = {
+        "query": "Query 0 ",
+        "product_category": "Beauty › Skin Care",
+        "name": "Product Pack 5",
+        "attributes": ["attr 1", "description of product 5", "waterproof"],
+        "price_upper": 10.0,
+        "goal_options": {"color": "red/blue"},
+    }
+    product = product_item_dict["B000000005"]
+    nlp = CountingNLP()
+    reward, info = get_reward(
+        product, goal, 12.99, {"color": "Red/Blue"}, nlp, verbose=True
+    )
+    # nouns "Product" of "Product Pack 5" match; 2 of 3 attributes, the option
+    # but not the price
+    assert info["title_score"] == 0.5
+    assert info["r_type"] == 1.0
+    assert info["r_att"] == pytest.approx(2 / 3)
+    assert info["r_option"] == 1.0
+    assert reward == pytest.approx(3 / 5)
+    assert nlp.parsed == ["Product 5", "Product Pack 5"]
+
+    assert get_reward(product, goal, 12.99, {"color": "Red/Blue"}, nlp) == reward
+    assert len(nlp.parsed) == 2
+
+    other = CountingNLP()
+    purchases = [(p, goal, 5.0, {}) for p in products]
+    rewards = get_rewards(purchases, other)
+    assert rewards == [get_reward(*purchase, nlp) for purchase in purchases]
+    assert other.parsed == []
+    # one batch, of every distinct name
+    assert len(other.batches) == 1
+    assert sorted(other.batches[0]) == sorted([p["name"] for p in products] + ["Product Pack 5"])
+
+
+def test_synthetic_goals_are_made_on_access():
+    products = [
+        {
+            "asin": f"B0000000{i:02d}",
+            "category": "beauty",
+            "query": "query",
+            "name": f"name {i}",
+            "Title": f"Product {i}",
+            "product_category": "Beauty › Skin Care",
+            "instruction_text": f"i need product {i}",
+            "instruction_attributes": ["soft"] if i % 2 else ["soft", "vegan"],
+            "options": {
+                "size": ["small", "large", "x-large"][: i + 1],
+                "color": ["red", "blue"],
+            }
+            if i < 3
+            else {},
+        }
+        for i in range(5)
+    ]
+    products.append({**products[0], "asin": "B000000099", "instruction_text": None})
+    prices = {p["asin"]: 5.0 + 30 * i for i, p in enumerate(products)}
+
+    random.seed(0)
+    goals = get_goals(products, prices, human_goals=False)
+    random.seed(0)
+    expected = []
+    for p in products[:5]:
+        price_range = [x for x in [10.0 * i for i in range(1, 100)] if x > prices[p["asin"]]][:4]
+        _, price_upper = sorted(random.sample(price_range, 2))
+        names = sorted(p["options"])
+        for combination in itertools.product(*(p["options"][n] for n in names)):
+            options = dict(zip(names, combination))
+            option_text = ", and ".join(f"{k}: {v}" for k, v in options.items())
+            expected.append(
+                {
+                    "asin": p["asin"],
+                    "name": p["Title"],
+                    "instruction_text": p["instruction_text"]
+                    + (" with " + option_text if option_text else "")
+                    + f", and price lower than {price_upper:.2f} dollars",
+                    "price_upper": price_upper,
+                    "goal_options": options,
+                }
+            )
+
+    assert len(goals) == len(expected) == 2 + 4 + 6 + 1 + 1
+    for goal, want in zip(goals, expected):
+        assert {k: goal[k] for k in want} == want
+    assert goals[-1] == goals[len(goals) - 1]
+    with pytest.raises(IndexError):
+        goals[len(goals)]
+
+    # weights count each attribute over all goals, as when materialized
+    soft, vegan = len(goals), 2 + 6 + 1
+    assert goals[0]["weight"] == pytest.approx((1 / soft + 1 / vegan) / 2)
+    assert goals[2]["weight"] == pytest.approx(1 / soft)
+
+    sampled = goals.sample(5, rng=random.Random(0))
+    assert len({(g["asin"], g["instruction_text"]) for g in sampled}) == 5
+    assert all(g in list(goals) for g in goals.sample(5, weighted=True, rng=random.Random(0)))
@@ -0,0 +1,80 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+"""
+Tests for the onlineshop page templates and their fragment cache.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from open_apps.apps.onlineshop_app.main import generate_search_results
+from open_apps.apps.onlineshop_app.models.cart import Cart
+from open_apps.apps.onlineshop_app.models.global_state import global_state
+from open_apps.apps.onlineshop_app.templates import html_generator
+
+
+def make_product(i):
+    return {
+        "asin": f"B0000000{i:02d}",
+        "Title": f"Product {i}",
+        "MainImage": f"https://example.com/{i}.jpg",
+        "Price": "$12.99",
+        "Description": f"Description of product {i}",
+    }
+
+
+@pytest.fixture
+def shop(monkeypatch):
+    products = {p["asin"]: p for p in map(make_product, range(3))}
+    monkeypatch.setattr(global_state, "product_item_dict", products)
+    monkeypatch.setattr(global_state, "cart", Cart())
+    monkeypatch.setattr(
+        global_state,
+        "config",
+        SimpleNamespace(
+            title="Shop",
+            background_color="#F0F8FF",
+            font_family="Arial",
+            base_font_size="16px",
+            font_color="#333333",
+        ),
+    )
+    html_generator.clear_fragment_cache()
+    yield list(products.values())
+    html_generator.clear_fragment_cache()
+
+
+def test_search_results_are_composed_from_cached_cards(shop):
+    page = generate_search_results(shop, "red,shoes", 1, 3)
+    assert page.count('class="col-lg-12 mb-4"') == 3
+    assert page.count("/onlineshop/item/B000000001?keywords=red,shoes") == 3
+    assert 'Search Results for "red shoes"' in page
+    assert "Cart (0)" in page
+    assert html_generator._fragment.cache_info().misses == 3
+
+    other = generate_search_results(shop[:2], "blue", 1, 2)
+    assert html_generator._fragment.cache_info().misses == 3
+    assert "/onlineshop/item/B000000001?keywords=blue" in other
+    assert "keywords=red" not in other
+
+    # a new appearance renders new cards and chrome
+    global_state.config.font_color = "#000000"
+    restyled = generate_search_results(shop, "red,shoes", 1, 3)
+    assert html_generator._fragment.cache_info().misses == 6
+    assert "color: #000000;" in restyled
+    assert restyled.replace("#000000", "#333333") == page
+
+
+def test_chrome_shows_current_cart(shop):
+    global_state.cart.add_item("B000000001", {}, 2)
+    assert "Cart (2)" in html_generator.generate_base_html("<p>hi</p>")
+    global_state.cart.add_item("B000000002", {}, 1)
+    page = html_generator.generate_base_html("<p>hi</p>")
+    assert "Cart (3)" in page
+    assert "<p>hi</p>" in page
@@ -0,0 +1,101 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+"""
+Tests for the write-behind persistence of the onlineshop cart and orders.
+"""
+
+import json
+import time
+from types import SimpleNamespace
+
+from open_apps.apps.onlineshop_app.models.global_state import GlobalState
+from open_apps.apps.onlineshop_app.models.order import Order
+from open_apps.apps.onlineshop_app.models.store import OrderJournal, Snapshot
+
+
+def make_order(i):
+    return Order(
+        order_id=f"order{i}",
+        items={(f"B0000000{i:02d}", "{}"): {"quantity": 1, "options": {}}},
+        total=9.99,
+        name="Jane",
+        address="1 Main St",
+        date="2025-01-01 00:00:00",
+    )
+
+
+def make_state(tmp_path, save_delay=60):
+    state = GlobalState()
+    state.update_config(
+        SimpleNamespace(database_path=str(tmp_path), save_delay=save_delay)
+    )
+    return state
+
+
+def test_orders_are_appended(tmp_path):
+    state = make_state(tmp_path)
+    state.add_order(make_order(0))
+    state.add_order(make_order(1))
+    lines = (tmp_path / "orders.jsonl").read_text().splitlines()
+    assert [json.loads(line)["order_id"] for line in lines] == ["order0", "order1"]
+
+    loaded = make_state(tmp_path)
+    loaded.load_orders()
+    assert [o.to_dict() for o in loaded.orders] == [o.to_dict() for o in state.orders]
+
+    # a reset replaces the history
+    state.orders = [make_order(2)]
+    state.save_orders()
+    loaded.load_orders()
+    assert [o.order_id for o in loaded.orders] == ["order2"]
+
+
+def test_torn_journal_is_compacted(tmp_path):
+    journal = OrderJournal(str(tmp_path / "orders.jsonl"))
+    journal.append({"order_id": "a"})
+    with open(journal.path, "a") as f:
+        f.write('{"order_id": "b", "ite')
+    assert journal.load() == [{"order_id": "a"}]
+    journal.append({"order_id": "c"})
+    assert journal.load() == [{"order_id": "a"}, {"order_id": "c"}]
+
+
+def test_legacy_orders_are_migrated(tmp_path):
+    (tmp_path / "orders.json").write_text(json.dumps([make_order(0).to_dict()]))
+    state = make_state(tmp_path)
+    state.load_orders()
+    assert [o.order_id for o in state.orders] == ["order0"]
+    assert (tmp_path / "orders.jsonl").exists()
+
+
+def test_cart_snapshot_is_debounced(tmp_path):
+    state = make_state(tmp_path)
+    cart_path = tmp_path / "cart.json"
+    for i in range(3):
+        state.cart.add_item(f"B0000000{i:02d}", {"size": "small"})
+        state.save_cart()
+    assert not cart_path.exists()
+
+    state.flush()
+    assert json.loads(cart_path.read_text()) == state.cart.to_dict()
+    assert [p.name for p in tmp_path.iterdir()] == ["cart.json"]
+
+    loaded = make_state(tmp_path)
+    loaded.load_cart()
+    assert loaded.cart.to_dict() == state.cart.to_dict()
+
+
+def test_snapshot_is_written_by_timer(tmp_path):
+    snapshot = Snapshot(str(tmp_path / "cart.json"), delay=0.05)
+    snapshot.save([1])
+    snapshot.save([1, 2])
+    deadline = time.monotonic() + 10
+    while not (tmp_path / "cart.json").exists():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert json.loads((tmp_path / "cart.json").read_text()) == [1, 2]
@@ -0,0 +1,235 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+"""
+Startup budget tests: import time of the entry points and time to the first
+healthy response of launch.py, AppServer and open-apps-mcp.
+
+Every measurement runs in a fresh interpreter so nothing is already imported.
+Budgets are in seconds and can be tuned for slower machines with
+OPENAPPS_IMPORT_BUDGET (default 3) and OPENAPPS_STARTUP_BUDGET (default 30).
+Set OPENAPPS_STARTUP_REPORT to a file path to append the measurements there as
+JSON lines, including the slowest imports from ``python -X importtime``.
+"""
+
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from importlib.util import find_spec
+from pathlib import Path
+
+import pytest
+
+
+REPO_ROOT = Path(__file__).parent.parent
+IMPORT_BUDGET = float(os.environ.get("OPENAPPS_IMPORT_BUDGET", 3))
+STARTUP_BUDGET = float(os.environ.get("OPENAPPS_STARTUP_BUDGET", 30))
+
+# only needed to run an agent, never to serve the apps
+AGENT_ONLY_MODULES = ["browsergym", "wandb", "git", "playwright", "gymnasium"]
+APP_MODULE = re.compile(r"open_apps\.apps\.(?!start_page)\w+\.main")
+
+
+def report(name: str, **measurements):
+    path = os.environ.get("OPENAPPS_STARTUP_REPORT")
+    if path:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"check": name, **measurements}) + "\n")
+
+
+def child_env() -> dict:
+    # the configs interpolate ${oc.env:USER}
+    return {"USER": "openapps", **os.environ}
+
+
+def import_profile(module: str) -> dict:
+    """Seconds per module (cumulative) from ``python -X importtime``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=child_env(),
+        check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+        if match:
+            profile[match.group(3)] = int(match.group(1)) / 1e6
+    return profile
+
+
+def slowest(profile: dict, n: int = 10) -> dict:
+    return dict(sorted(profile.items(), key=lambda item: -item[1])[:n])
+
+
+def wait_until_healthy(url: str, process: subprocess.Popen, timeout: float) -> float:
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=3) as response:
+                if response.status < 500:
+                    return time.monotonic() - start
+        except OSError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not become healthy within {timeout}s")
+
+
+@pytest.mark.parametrize(
+    "module", ["open_apps.launcher", "open_apps.mcp", "open_apps.mcp.appserver"]
+)
+def test_import_budget(module):
+    profile = import_profile(module)
+    report(f"import {module}", seconds=profile[module], slowest=slowest(profile))
+
+    heavy = [
+        name for name in profile if name.split(".")[0] in AGENT_ONLY_MODULES
+    ]
+    assert not heavy, f"{module} imports agent-only modules: {heavy}"
+    apps = [name for name in profile if APP_MODULE.match(name)]
+    assert not apps, f"{module} imports app modules: {apps}"
+    assert profile[module] < IMPORT_BUDGET, slowest(profile)
+
+
+@pytest.mark.parametrize("lazy_load", [False, True])
+def test_appserver_startup(lazy_load):
+    script = f"""
+import json, sys, time
+start = time.monotonic()
+from open_apps.mcp.appserver import AppServer
+server = AppServer("todo", extra_overrides=["apps.lazy_load={lazy_load}"])
+elapsed = time.monotonic() - start
+mounted = sorted(name for name in sys.modules if name.startswith("open_apps.apps."))
+server.close()
+print(json.dumps({{"seconds": elapsed, "modules": mounted}}))
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        env=child_env(),
+        timeout=STARTUP_BUDGET * 2,
+        check=True,
+    )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    report(f"AppServer lazy_load={lazy_load}", seconds=measured["seconds"])
+
+    assert measured["seconds"] < STARTUP_BUDGET
+    if lazy_load:
+        # the health check hits the start page, which needs no app mounted
+        assert not [name for name in measured["modules"] if APP_MODULE.match(name)]
+
+
+def test_lazy_apps_mount_on_first_request():
+    script = """
+import json, sys, urllib.error, urllib.request
+from open_apps.apps.start_page import main as start_page
+from open_apps.mcp.appserver import AppServer
+server = AppServer("todo", extra_overrides=["apps.lazy_load=True"])
+registered = server.registered_apps()
+start_page.initialize_routes_and_configure_task(server.config.apps)
+server.reset()
+before = sorted(start_page.loaded_apps)
+def status(path):
+    try:
+        with urllib.request.urlopen(server.base_url + path) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+first = status("/calendar")
+server.reset()
+apps = sorted(name for name in sys.modules if name.startswith("open_apps.apps.") and name.endswith(".main"))
+# a re-init after the app was mounted keeps serving it
+start_page.initialize_routes_and_configure_task(server.config.apps)
+remounted = [status("/calendar/nope"), status("/calendar")]
+server.close()
+print(json.dumps({
+    "registered": registered,
+    "reinit": server.registered_apps(),
+    "before": before,
+    "status": first,
+    "remounted": remounted,
+    "after": sorted(start_page.loaded_apps),
+    "modules": [name for name in apps if "start_page" not in name],
+}))
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        text=True,
+        env=child_env(),
+        timeout=STARTUP_BUDGET * 2,
+        check=True,
+    )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert "calendar" in measured["registered"]
+    assert measured["reinit"] == measured["registered"]
+    # a reset leaves apps that were never requested unloaded
+    assert measured["before"] == []
+    assert measured["status"] == 200
+    assert measured["after"] == ["calendar"]
+    assert measured["modules"] == ["open_apps.apps.calendar_app.main"]
+    assert measured["remounted"] == [404, 200]
+
+
+def test_launch_startup(tmp_path):
+    log = tmp_path / "launch.log"
+    start = time.monotonic()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            str(REPO_ROOT / "launch.py"),
+            f"logs_dir={tmp_path}",
+            "use_wandb=False",
+            f"hydra.run.dir={tmp_path}",
+        ],
+        cwd=tmp_path,  # fasthtml writes its .sesskey to the working directory
+        stdout=log.open("w"),
+        stderr=subprocess.STDOUT,
+        env=child_env(),
+        start_new_session=True,
+    )
+    try:
+        while not (match := re.search(r"Using port (\d+)", log.read_text())):
+            assert process.poll() is None, log.read_text()
+            assert time.monotonic() - start < STARTUP_BUDGET, log.read_text()
+            time.sleep(0.05)
+        wait_until_healthy(
+            f"http://localhost:{match.group(1)}/", process, STARTUP_BUDGET
+        )
+        seconds = time.monotonic() - start
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    report("launch.py", seconds=seconds)
+    assert seconds < STARTUP_BUDGET
+
+
+@pytest.mark.skipif(
+    find_spec("mcp") is None or find_spec("playwright") is None,
+    reason="open-apps-mcp needs the mcp and playwright packages",
+)
+def test_mcp_server_import_budget():
+    # the server's first response waits on a browser; its own share of
+    # startup is importing the server module
+    profile = import_profile("open_apps.mcp.server")
+    report(
+        "import open_apps.mcp.server",
+        seconds=profile["open_apps.mcp.server"],
+        slowest=slowest(profile),
+    )
+    assert not [name for name in profile if APP_MODULE.match(name)]
+    assert profile["open_apps.mcp.server"] < IMPORT_BUDGET
@@ -0,0 +1,90 @@
+"""
+Copyright (c) Meta Platforms, Inc. and affiliates.
+All rights reserved.
+This source code is licensed under the license found in the
+LICENSE file in the root directory of this source tree.
+"""
+
+"""
+Tests for the shared SQLite connection pool of the apps (open_apps.apps.storage).
+"""
+
+import os
+import shutil
+
+import pytest
+
+from open_apps.apps import storage
+
+
+@pytest.fixture(autouse=True)
+def close_pool():
+    yield
+    storage.close_all()
+
+
+def test_connections_are_pooled_until_closed(tmp_path):
+    path = tmp_path / "app.db"
+    writer = storage.get_database(path)
+    reader = storage.get_readonly_database(path)
+    assert storage.get_database(str(path)) is writer
+    assert storage.get_readonly_database(path) is reader
+
+    other = storage.get_database(tmp_path / "other.db")
+    storage.close(path)
+    assert storage._key(path) not in storage._writers
+    assert storage._key(path) not in storage._readers
+    assert storage.get_database(path) is not writer
+    # other databases keep their connection
+    assert storage.get_database(tmp_path / "other.db") is other
+
+    storage.close_all()
+    assert not storage._writers and not storage._readers
+
+
+def test_memory_databases_are_isolated(tmp_path):
+    first = storage.get_database(tmp_path / "first.db", memory=True)
+    second = storage.get_database(tmp_path / "second.db", memory=True)
+    first.execute("CREATE TABLE items (name TEXT)")
+    first.execute("INSERT INTO items VALUES ('a')")
+    assert first.table_names() == ["items"]
+    assert second.table_names() == []
+    # nothing reaches the disk
+    assert list(tmp_path.iterdir()) == []
+    # reads of a memory database go through its writer
+    assert storage.get_readonly_database(tmp_path / "first.db", memory=True) is first
+
+
+def test_memory_database_export_round_trips(tmp_path):
+    db = storage.get_database(tmp_path / "app.db", memory=True)
+    db.execute("CREATE TABLE items (name TEXT)")
+    db.execute("INSERT INTO items VALUES ('a'), ('b')")
+
+    dest = tmp_path / "export" / "app.db"
+    storage.export_database(tmp_path / "app.db", dest, memory=True)
+    copy = storage.get_database(dest)
+    assert [row["name"] for row in copy.query("SELECT name FROM items")] == ["a", "b"]
+
+
+def test_drop_tables_in_memory(tmp_path):
+    db = storage.get_database(tmp_path / "app.db", memory=True)
+    db.execute("CREATE TABLE items (name TEXT)")
+    db.execute("CREATE VIRTUAL TABLE notes USING fts5(body)")
+    storage.drop_tables(tmp_path / "app.db", memory=True)
+    assert db.table_names() == []
+
+
+def test_memory_filesystem_round_trips(tmp_path):
+    path = tmp_path / "codeeditor"
+    root = storage.filesystem_root(path, memory=True)
+    assert root != storage.filesystem_root(tmp_path / "other", memory=True)
+    assert storage.filesystem_root(path) == str(path)
+    try:
+        os.makedirs(os.path.join(root, "src"))
+        with open(os.path.join(root, "src", "main.py"), "w") as f:
+            f.write("print('hi')\n")
+        storage.export_directory(path, tmp_path / "export", memory=True)
+        assert (tmp_path / "export" / "src" / "main.py").read_text() == "print('hi')\n"
+        assert not path.exists()
+    finally:
+        shutil.rmtree(os.path.dirname(root), ignore_errors=True)